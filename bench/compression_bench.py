@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+
+""" Measure the bytes sent to Graylog and the CPU cost of sending
+    GELF messages with different compression methods and levels.
+
+    Messages are Slow Log-like GELF messages, built from the queries
+    of the fingerprint corpus. Some of them contain long multi-row
+    INSERTs. They are sent to local stand-in receivers: a UDP socket
+    and an HTTP server, which count the bytes they receive.
+    CPU time is measured in the sending thread only, so it includes
+    serialisation of the request and compression, but not the receivers.
+
+    Usage:
+
+    bench/compression_bench.py [--messages N] [--levels 1,6,9] [--threshold BYTES]
+"""
+
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import http.server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib_consumer.gelf_message import GELF_Message
+from lib_consumer.gelf_compressor import GELF_Compressor
+from lib_consumer.graylog_client_udp import Graylog_Client_UDP
+from lib_consumer.graylog_client_http import Graylog_Client_HTTP
+
+
+class UDP_Receiver:
+    """ Count datagrams and bytes received on a local UDP port. """
+
+    def __init__(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.settimeout(0.5)
+        self.port = self._sock.getsockname()[1]
+        self.datagrams = 0
+        self.bytes = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._running = True
+        self._thread.start()
+
+    def _run(self):
+        while self._running:
+            try:
+                datagram = self._sock.recv(65535)
+            except socket.timeout:
+                continue
+            self.datagrams = self.datagrams + 1
+            self.bytes = self.bytes + len(datagram)
+
+    def reset(self):
+        """ Wait for the pending datagrams, then reset the counters. """
+        time.sleep(0.2)
+        self.datagrams = 0
+        self.bytes = 0
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._sock.close()
+
+
+class HTTP_Receiver:
+    """ Count requests and body bytes received by a local HTTP server. """
+
+    def __init__(self):
+        receiver = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                receiver.requests = receiver.requests + 1
+                receiver.bytes = receiver.bytes + len(body)
+                self.send_response(202)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = 0
+        self.bytes = 0
+        self._server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def reset(self):
+        self.requests = 0
+        self.bytes = 0
+
+    def close(self):
+        self._server.shutdown()
+        self._thread.join()
+
+
+def load_messages(count):
+    """ Return a list of encoded GELF messages. """
+    corpus_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fingerprint_corpus.jsonl')
+    queries = [ ]
+    with open(corpus_path, 'r') as corpus_file:
+        for line in corpus_file:
+            if line.strip():
+                queries.append(json.loads(line)['query'])
+
+    messages = [ ]
+    for i in range(count):
+        query = queries[i % len(queries)]
+        if i % 4 == 0:
+            query = 'INSERT INTO t (id, name, created) VALUES ' + ', '.join(
+                "({}, 'name {}', '2022-01-01 10:{:02d}:00')".format(n, n, n % 60) for n in range(200)
+            )
+        message = GELF_Message(
+            { },
+            '1.1',
+            str(1640995200 + i),
+            'db-1',
+            'MariaDB Slow Log',
+            'NOTE',
+            {
+                'query': query,
+                'query_time': '0.000{}'.format(i % 1000),
+                'rows_examined': str(i % 5000),
+                'user': 'app',
+                'schema': 'shop'
+            }
+        )
+        messages.append(message.to_bytes())
+    return messages
+
+def measure(client, receiver, messages):
+    """ Send all messages and return (cpu microseconds per message, received bytes). """
+    receiver.reset()
+    start = time.thread_time()
+    for message in messages:
+        client.send(message)
+    if isinstance(client, Graylog_Client_HTTP):
+        client.flush()
+    elapsed = time.thread_time() - start
+    if isinstance(receiver, UDP_Receiver):
+        time.sleep(0.2)
+    return (elapsed / len(messages) * 1000000, receiver.bytes)
+
+
+def main():
+    """ Run the benchmark. """
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument(
+        '--messages',
+        type=int,
+        default=2000,
+        help='Number of messages sent for every configuration.'
+    )
+    arg_parser.add_argument(
+        '--levels',
+        default='1,6,9',
+        help='Comma-separated list of compression levels.'
+    )
+    arg_parser.add_argument(
+        '--threshold',
+        type=int,
+        default=GELF_Compressor.DEFAULT_THRESHOLD,
+        help='Messages shorter than this number of bytes are not compressed.'
+    )
+    arg_parser.add_argument(
+        '--http-batch-size',
+        type=int,
+        default=1,
+        help='Number of messages in an HTTP request.'
+    )
+    args = arg_parser.parse_args()
+
+    messages = load_messages(args.messages)
+    raw_bytes = sum(len(message) for message in messages)
+    print('{} messages, {:.0f} bytes on average'.format(len(messages), raw_bytes / len(messages)))
+
+    configurations = [ ('none', 0) ]
+    for method in GELF_Compressor.METHODS:
+        for level in args.levels.split(','):
+            configurations.append((method, int(level)))
+
+    udp_receiver = UDP_Receiver()
+    http_receiver = HTTP_Receiver()
+
+    print('{:<6} {:>5}  {:>10} {:>10} {:>8}  {:>10} {:>10} {:>8}'.format(
+        'method', 'level', 'UDP B/msg', 'UDP us/msg', 'ratio', 'HTTP B/msg', 'HTTP us/msg', 'ratio'
+    ))
+    for method, level in configurations:
+        compressor = None
+        if method != 'none':
+            compressor = GELF_Compressor(method, level, args.threshold)
+        udp_client = Graylog_Client_UDP('127.0.0.1', udp_receiver.port, compressor=compressor)
+        udp_time, udp_bytes = measure(udp_client, udp_receiver, messages)
+        udp_client.close()
+
+        # Graylog only accepts gzip over HTTP
+        http_compressor = None
+        if method == 'gzip':
+            http_compressor = compressor
+        if method == 'zlib':
+            http_line = '{:>10} {:>10} {:>8}'.format('-', '-', '-')
+        else:
+            http_client = Graylog_Client_HTTP(
+                '127.0.0.1',
+                http_receiver.port,
+                batch_max_messages=args.http_batch_size,
+                compressor=http_compressor
+            )
+            http_time, http_bytes = measure(http_client, http_receiver, messages)
+            http_line = '{:>10.0f} {:>10.1f} {:>8.2f}'.format(
+                http_bytes / len(messages), http_time, raw_bytes / http_bytes
+            )
+
+        print('{:<6} {:>5}  {:>10.0f} {:>10.1f} {:>8.2f}  {}'.format(
+            method, level, udp_bytes / len(messages), udp_time, raw_bytes / udp_bytes, http_line
+        ))
+
+    udp_receiver.close()
+    http_receiver.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+#EOF
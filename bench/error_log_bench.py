@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+
+""" Measure the speed of the Error Log parser on a synthetic Error Log.
+
+    The Error Log is generated with lines in the MariaDB 10.x format,
+    lines in the legacy format and continuation lines, one second apart.
+    By default it is 2 GiB big, and it is deleted at the end.
+
+    The parser is compared with the tokenizer that the consumer used
+    before, on the first lines of the file only, as it is much slower.
+    Block_Reader is compared with readline() on a text file, without
+    parsing the lines.
+
+    Usage:
+
+    bench/error_log_bench.py [--size BYTES] [--file PATH] [--keep] [--legacy-lines N]
+"""
+
+
+import os
+import sys
+import time
+import datetime
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib_consumer.error_log_parser import Error_Log_Parser
+from lib_consumer.block_reader import Block_Reader
+
+
+#: Messages written in the synthetic Error Log, as (level, text)
+MESSAGES = (
+    ('[Note]', 'InnoDB: Buffer pool(s) load completed at 211104  9:41:34'),
+    ('[Note]', "Aborted connection 12 to db: 'shop' user: 'app' host: '10.0.0.7' (Got timeout reading communication packets)"),
+    ('[Warning]', "Access denied for user 'root'@'localhost' (using password: YES)"),
+    ('[ERROR]', 'InnoDB: Operating system error number 2 in a file operation.'),
+    ('[Note]', 'WSREP: Read nil XID from storage engines, skipping position init'),
+    ('[Note]', 'Starting crash recovery...'),
+)
+#: Lines that continue the previous entry
+CONTINUATION = 'InnoDB: Some operating system error numbers are described at https://mariadb.com/kb/en/library/operating-system-error-codes/'
+
+
+def generate(path, size):
+    """ Write a synthetic Error Log of about the specified size. """
+    moment = datetime.datetime(2021, 11, 4, 9, 41, 34)
+    second = datetime.timedelta(seconds=1)
+    written = 0
+    with open(path, 'w') as log_file:
+        while written < size:
+            lines = [ ]
+            for i in range(10000):
+                level, text = MESSAGES[i % len(MESSAGES)]
+                if i % 50 == 0:
+                    line = moment.strftime('%y%m%d %H:%M:%S') + ' ' + level + ' ' + text
+                else:
+                    line = moment.strftime('%Y-%m-%d %H:%M:%S') + ' ' + str(i % 64) + ' ' + level + ' ' + text
+                lines.append(line)
+                if level == '[ERROR]':
+                    lines.append(CONTINUATION)
+                moment = moment + second
+            chunk = '\n'.join(lines) + '\n'
+            log_file.write(chunk)
+            written = written + len(chunk)
+
+def legacy_get_next_word(line, offset=0, to_end=False):
+    """ The tokenizer used before Error_Log_Parser. """
+    index = 0
+    word = ''
+    word_started = False
+    for char in line:
+        index += 1
+        if index < offset:
+            continue
+        if char.isspace() and to_end == False:
+            if word_started:
+                break
+            else:
+                continue
+        word_started = True
+        word += char
+    if to_end == True:
+        word = word.strip()
+    return { "word": word, "index": index }
+
+def legacy_parse(line):
+    """ The parsing logic used before Error_Log_Parser, for comparison. """
+    next_word = legacy_get_next_word(line)
+    date_part = next_word['word']
+    next_word = legacy_get_next_word(line, next_word['index'])
+    time_part = next_word['word']
+    try:
+        time_list = time_part.split(':')
+        date_time = date_part + ' ' + time_list[0].zfill(2) + ':' + time_list[1].zfill(2) + ':' + time_list[2].zfill(2)
+        date_time = datetime.datetime.strptime(date_time, '%Y-%m-%d %H:%M:%S').timetuple()
+        timestamp = int(time.mktime(date_time))
+        next_word = legacy_get_next_word(line, next_word['index'])
+        next_word = legacy_get_next_word(line, next_word['index'])
+        level = next_word['word']
+        next_word = legacy_get_next_word(line, next_word['index'], True)
+        return (timestamp, level, next_word['word'])
+    except (ValueError, IndexError):
+        try:
+            time_list = time_part.split(':')
+            date_time = date_part + ' ' + time_list[0].zfill(2) + ':' + time_list[1].zfill(2) + ':' + time_list[2].zfill(2)
+            date_time = datetime.datetime.strptime(date_time, '%y%m%d %H:%M:%S').timetuple()
+            timestamp = int(time.mktime(date_time))
+            next_word = legacy_get_next_word(line, next_word['index'])
+            level = next_word['word']
+            next_word = legacy_get_next_word(line, next_word['index'], True)
+            return (timestamp, level, next_word['word'])
+        except (ValueError, IndexError):
+            return None
+
+def measure(path, parse_function, max_lines=None):
+    """ Parse the file line by line, like the consumer does.
+        Return (lines, bytes, entries, seconds).
+    """
+    lines = 0
+    size = 0
+    entries = 0
+    start = time.perf_counter()
+    with open(path, 'r') as log_file:
+        for line in log_file:
+            if max_lines is not None and lines >= max_lines:
+                break
+            lines = lines + 1
+            size = size + len(line)
+            if parse_function(line.rstrip()) is not None:
+                entries = entries + 1
+    return (lines, size, entries, time.perf_counter() - start)
+
+def measure_readline(path):
+    """ Read the file with readline(), like the consumer used to do.
+        Return (lines, bytes, entries, seconds).
+    """
+    lines = 0
+    size = 0
+    start = time.perf_counter()
+    with open(path, 'r') as log_file:
+        line = log_file.readline()
+        while line:
+            lines = lines + 1
+            size = size + len(line)
+            line.rstrip()
+            line = log_file.readline()
+    return (lines, size, 0, time.perf_counter() - start)
+
+def measure_block_reader(path):
+    """ Read the file with Block_Reader.
+        Return (lines, bytes, entries, seconds).
+    """
+    lines = 0
+    start = time.perf_counter()
+    reader = Block_Reader(path)
+    line = reader.readline(allow_partial=True)
+    while line is not None:
+        lines = lines + 1
+        line.rstrip()
+        line = reader.readline(allow_partial=True)
+    size = reader.tell()
+    reader.close()
+    return (lines, size, 0, time.perf_counter() - start)
+
+def report(name, result):
+    """ Print the speed of a parser. """
+    lines, size, entries, seconds = result
+    print('{}: {} lines ({} entries), {:.1f} MiB in {:.1f} s: {:.0f} lines/s, {:.1f} MiB/s, {:.2f} us/line'.format(
+        name, lines, entries, size / 1048576, seconds,
+        lines / seconds, size / 1048576 / seconds, seconds / lines * 1000000
+    ))
+
+
+def main():
+    """ Generate the Error Log and run the benchmark. """
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument(
+        '--size',
+        type=int,
+        default=2 * 1024 * 1024 * 1024,
+        help='Size of the synthetic Error Log, in bytes.'
+    )
+    arg_parser.add_argument(
+        '--file',
+        default=None,
+        help='Use this Error Log instead of generating one.'
+    )
+    arg_parser.add_argument(
+        '--keep',
+        action='store_true',
+        help='Don\'t delete the generated Error Log.'
+    )
+    arg_parser.add_argument(
+        '--legacy-lines',
+        type=int,
+        default=200000,
+        help='Number of lines parsed with the old tokenizer. Zero skips it.'
+    )
+    args = arg_parser.parse_args()
+
+    path = args.file
+    if path is None:
+        log_file, path = tempfile.mkstemp(prefix='error-log-bench-', suffix='.log')
+        os.close(log_file)
+        print('Generating ' + path)
+        generate(path, args.size)
+
+    try:
+        parser = Error_Log_Parser()
+        if args.legacy_lines > 0:
+            legacy = measure(path, legacy_parse, args.legacy_lines)
+            report('legacy tokenizer', legacy)
+            sample = measure(path, parser.parse, args.legacy_lines)
+            report('Error_Log_Parser', sample)
+            print('speedup: {:.1f}x'.format(legacy[3] / sample[3]))
+        report('readline', measure_readline(path))
+        report('Block_Reader', measure_block_reader(path))
+        report('Error_Log_Parser, whole file', measure(path, parser.parse))
+    finally:
+        if args.file is None and not args.keep:
+            os.unlink(path)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+#EOF
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+
+""" Check that the native query fingerprinting produces the same
+    output as pt-fingerprint, and compare their speed.
+
+    The corpus is a JSON Lines file. Each line contains a query and
+    its expected fingerprint, as returned by pt-fingerprint:
+
+    {"query": "SELECT 1", "fingerprint": "select ?"}
+
+    With --pt-fingerprint, pt-fingerprint is also measured as a new
+    process for every query and as a long-running process.
+
+    Usage:
+
+    bench/fingerprint_bench.py [--corpus FILE] [--iterations N] [--pt-fingerprint PATH]
+"""
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib_consumer.query_fingerprint import Query_Fingerprint
+from lib_consumer.pt_fingerprint_coprocess import PT_Fingerprint_Coprocess
+
+
+def load_corpus(path):
+    """ Return the corpus as a list of (query, fingerprint) tuples. """
+    corpus = [ ]
+    with open(path, 'r') as corpus_file:
+        for line in corpus_file:
+            if line.strip():
+                entry = json.loads(line)
+                corpus.append((entry['query'], entry['fingerprint']))
+    return corpus
+
+def pt_fingerprint(path, query):
+    """ Fingerprint a query by running pt-fingerprint, like the consumer
+        used to do for every Slow Log entry.
+    """
+    output = subprocess.run(
+        [path, '--query', query],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        universal_newlines=True
+    ).stdout
+    # pt-fingerprint terminates its output with a newline
+    return output[:-1] if output.endswith('\n') else output
+
+def check(corpus, fingerprint_function, name):
+    """ Compare the fingerprints with the expected ones.
+        Print the mismatches and return their number.
+    """
+    mismatches = 0
+    for query, expected in corpus:
+        result = fingerprint_function(query)
+        if result != expected:
+            mismatches = mismatches + 1
+            print('MISMATCH (' + name + '): ' + repr(query))
+            print('    expected: ' + repr(expected))
+            print('    got:      ' + repr(result))
+    print(name + ': ' + str(len(corpus) - mismatches) + '/' + str(len(corpus)) + ' queries match')
+    return mismatches
+
+def measure(corpus, fingerprint_function, iterations):
+    """ Return the average time in microseconds to fingerprint a query. """
+    start = time.perf_counter()
+    for i in range(iterations):
+        for query, expected in corpus:
+            fingerprint_function(query)
+    elapsed = time.perf_counter() - start
+    return elapsed / (iterations * len(corpus)) * 1000000
+
+def main():
+    """ Run the conformance check and the benchmark. """
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument(
+        '--corpus',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fingerprint_corpus.jsonl'),
+        help='Path of the corpus file.'
+    )
+    arg_parser.add_argument(
+        '--iterations',
+        type=int,
+        default=100,
+        help='How many times the corpus is fingerprinted by the native implementation.'
+    )
+    arg_parser.add_argument(
+        '--pt-fingerprint',
+        default=None,
+        help='Path of pt-fingerprint. If specified, it is also checked and measured.'
+    )
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    native = Query_Fingerprint()
+
+    mismatches = check(corpus, native.fingerprint, 'native')
+    native_time = measure(corpus, native.fingerprint, args.iterations)
+    print('native: {:.1f} us/query'.format(native_time))
+
+    if args.pt_fingerprint:
+        fingerprint_function = lambda query: pt_fingerprint(args.pt_fingerprint, query)
+        mismatches = mismatches + check(corpus, fingerprint_function, 'pt-fingerprint')
+        subprocess_time = measure(corpus, fingerprint_function, 1)
+        print('pt-fingerprint: {:.1f} us/query'.format(subprocess_time))
+        print('speedup: {:.0f}x'.format(subprocess_time / native_time))
+
+        coprocess = PT_Fingerprint_Coprocess(native, args.pt_fingerprint)
+        mismatches = mismatches + check(corpus, coprocess.fingerprint, 'pt-fingerprint coprocess')
+        coprocess_time = measure(corpus, coprocess.fingerprint, args.iterations)
+        print('pt-fingerprint coprocess: {:.1f} us/query'.format(coprocess_time))
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            coprocess.fingerprint_many([ query for query, expected in corpus ])
+        pipelined_time = (time.perf_counter() - start) / (args.iterations * len(corpus)) * 1000000
+        print('pt-fingerprint coprocess, pipelined: {:.1f} us/query'.format(pipelined_time))
+        coprocess.close()
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+#EOF
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+
+""" Check how the catch-up mode splits a Slow Log into ranges, and
+    measure the speed of the parallel backfill.
+
+    A synthetic Slow Log is generated, with entries that have a
+    # Time: line and entries that don't, and queries on several lines.
+    By default it is 256 MiB big, and it is deleted at the end.
+
+    The first bytes of the file are split with every range size up to
+    --max-range-size, and every range except the first one must start
+    at # Time:, or at a # User@Host: line that doesn't follow a
+    # Time: line. Then the whole file is processed by the line by line
+    parser and by Slow_Log_Backfill, and their messages must be the same.
+
+    Usage:
+
+    bench/slow_log_backfill_bench.py [--size BYTES] [--file PATH] [--keep]
+        [--processes N] [--check-size BYTES] [--max-range-size BYTES]
+"""
+
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib_consumer.catch_up_scanner import Catch_Up_Scanner
+from lib_consumer.slow_log_backfill import Slow_Log_Backfill
+from lib_consumer.slow_log_parser import Slow_Log_Parser
+from lib_consumer.slow_log_formatter import Slow_Log_Formatter
+from lib_consumer.timestamp_decoder import Timestamp_Decoder
+from lib_consumer.gelf_template import GELF_Template
+from lib_consumer.query_fingerprint import Query_Fingerprint
+from lib_consumer.fingerprint_cache import Fingerprint_Cache
+
+
+#: Queries written in the synthetic Slow Log
+QUERIES = (
+    'SELECT * FROM t1 WHERE a = "x" AND b = 5;',
+    'select * from orders\nwhere id in (1,2,3);',
+    'UPDATE t SET a = 1 WHERE id = 42;',
+    'INSERT INTO log (msg) VALUES (\'a\'), (\'b\');',
+)
+#: Settings of the formatters, as in the consumer
+SETTINGS = {
+    'timezone': 'UTC',
+    'gelf_version': '1.1',
+    'hostname': 'bench',
+    'gelf_fields': { },
+    'fingerprint_cache_size': 1000,
+    'short_message_length': 50,
+    'debug': { 'GELF_MESSAGES': False }
+}
+
+
+def generate(path, size):
+    """ Write a synthetic Slow Log of about the specified size.
+        One entry in three has a # Time: line.
+    """
+    moment = 1672574400
+    written = 0
+    with open(path, 'w') as log_file:
+        i = 0
+        while written < size:
+            lines = [ ]
+            for j in range(10000):
+                if i % 3 == 0:
+                    moment = moment + 1
+                    lines.append(time.strftime('# Time: %y%m%d %H:%M:%S', time.gmtime(moment)))
+                lines.append('# User@Host: app[app] @ web' + str(i % 7) + ' [10.0.0.' + str(i % 7) + ']')
+                lines.append('# Thread_id: ' + str(i) + '  Schema: shop  QC_hit: No')
+                lines.append('# Query_time: 1.5  Lock_time: 0.1  Rows_sent: 10  Rows_examined: 1000')
+                lines.append('SET timestamp=' + str(moment) + ';')
+                lines.append(QUERIES[i % len(QUERIES)])
+                i = i + 1
+            chunk = '\n'.join(lines) + '\n'
+            log_file.write(chunk)
+            written = written + len(chunk)
+
+def check_range_start(data, start):
+    """ Return whether a range can start at this offset: at # Time:,
+        or at # User@Host: if the previous line is not # Time:.
+    """
+    if data.startswith(b'# Time: ', start):
+        return True
+    if not data.startswith(b'# User@Host: ', start):
+        return False
+    previous_line = data[data.rfind(b'\n', 0, start - 1) + 1:start]
+    return not previous_line.startswith(b'# Time: ')
+
+def check_ranges(path, check_size, max_range_size):
+    """ Split the first check_size bytes of the file with every range
+        size up to max_range_size. Return the number of wrong splits.
+    """
+    with open(path, 'rb') as log_file:
+        data = log_file.read(check_size)
+    data = data[:data.rfind(b'\n') + 1]
+    check_path = path + '.check'
+    with open(check_path, 'wb') as log_file:
+        log_file.write(data)
+
+    errors = 0
+    try:
+        scanner = Catch_Up_Scanner(check_path)
+        for size in range(1, max_range_size + 1):
+            ranges = list(scanner.get_ranges(Catch_Up_Scanner.SLOW_LOG_ENTRY_START, size))
+            covered = ranges[0][0] == 0 and ranges[-1][1] == len(data)
+            for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+                covered = covered and end == next_start
+            wrong = [ start for start, end in ranges[1:] if not check_range_start(data, start) ]
+            if not covered or wrong:
+                errors = errors + 1
+                print('range size {}: {}'.format(size, 'ranges start at ' + str(wrong[:5]) if wrong else 'ranges don\'t cover the file'))
+        scanner.close()
+    finally:
+        os.unlink(check_path)
+    return errors
+
+def measure_serial(path):
+    """ Parse and format the whole file line by line.
+        Return (messages, seconds).
+    """
+    start = time.perf_counter()
+    parser = Slow_Log_Parser(Timestamp_Decoder(SETTINGS['timezone']))
+    formatter = Slow_Log_Formatter(
+        GELF_Template(SETTINGS['gelf_version'], SETTINGS['hostname'], SETTINGS['gelf_fields']),
+        Fingerprint_Cache(Query_Fingerprint(), SETTINGS['fingerprint_cache_size']),
+        SETTINGS['short_message_length']
+    )
+    messages = [ ]
+    with open(path, 'r') as log_file:
+        for line in log_file:
+            entry = parser.feed(line.rstrip())
+            if entry is not None:
+                messages.append(formatter.format(entry, SETTINGS['debug']).to_bytes())
+    entry = parser.flush()
+    if entry is not None:
+        messages.append(formatter.format(entry, SETTINGS['debug']).to_bytes())
+    return (messages, time.perf_counter() - start)
+
+def measure_backfill(path, processes):
+    """ Parse and format the whole file with Slow_Log_Backfill.
+        Return (messages, seconds).
+    """
+    start = time.perf_counter()
+    scanner = Catch_Up_Scanner(path)
+    backfill = Slow_Log_Backfill(processes, dict(SETTINGS, path=path))
+    messages = [ ]
+    ranges = scanner.get_ranges(Catch_Up_Scanner.SLOW_LOG_ENTRY_START, Slow_Log_Backfill.RANGE_SIZE)
+    for results in backfill.process(ranges):
+        messages.extend(message for message, position in results)
+    backfill.close()
+    scanner.close()
+    return (messages, time.perf_counter() - start)
+
+
+def main():
+    """ Generate the Slow Log, check the ranges and run the benchmark. """
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    arg_parser.add_argument(
+        '--size',
+        type=int,
+        default=256 * 1024 * 1024,
+        help='Size of the synthetic Slow Log, in bytes.'
+    )
+    arg_parser.add_argument(
+        '--file',
+        default=None,
+        help='Use this Slow Log instead of generating one.'
+    )
+    arg_parser.add_argument(
+        '--keep',
+        action='store_true',
+        help='Don\'t delete the generated Slow Log.'
+    )
+    arg_parser.add_argument(
+        '--processes',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Number of backfill processes.'
+    )
+    arg_parser.add_argument(
+        '--check-size',
+        type=int,
+        default=16384,
+        help='Number of bytes split into ranges by the check.'
+    )
+    arg_parser.add_argument(
+        '--max-range-size',
+        type=int,
+        default=2048,
+        help='Maximum range size used by the check.'
+    )
+    args = arg_parser.parse_args()
+
+    path = args.file
+    if path is None:
+        log_file, path = tempfile.mkstemp(prefix='slow-log-bench-', suffix='.log')
+        os.close(log_file)
+        print('Generating ' + path)
+        generate(path, args.size)
+
+    try:
+        errors = check_ranges(path, args.check_size, args.max_range_size)
+        print('range sizes checked: {}, wrong: {}'.format(args.max_range_size, errors))
+
+        serial, serial_seconds = measure_serial(path)
+        backfill, backfill_seconds = measure_backfill(path, args.processes)
+        if serial != backfill:
+            errors = errors + 1
+            print('backfill messages differ from the line by line parser')
+        size = os.path.getsize(path) / 1048576
+        print('line by line: {} messages, {:.1f} MiB in {:.1f} s'.format(len(serial), size, serial_seconds))
+        print('backfill, {} processes: {} messages, {:.1f} MiB in {:.1f} s'.format(args.processes, len(backfill), size, backfill_seconds))
+        print('speedup: {:.1f}x'.format(serial_seconds / backfill_seconds))
+    finally:
+        if args.file is None and not args.keep:
+            os.unlink(path)
+
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+#EOF
@@ -2,11 +2,35 @@
 
 
 from .eventlog import Eventlog
+from .gelf_serializer import GELF_Serializer
 from .gelf_message import GELF_Message
+from .gelf_template import GELF_Template
+from .gelf_compressor import GELF_Compressor
 from .graylog_client import Graylog_Client
 from .graylog_client_udp import Graylog_Client_UDP
 from .graylog_client_tcp import Graylog_Client_TCP
 from .graylog_client_http import Graylog_Client_HTTP
+from .graylog_client_async_udp import Graylog_Client_Async_UDP
+from .graylog_client_async_tcp import Graylog_Client_Async_TCP
+from .graylog_client_async_http import Graylog_Client_Async_HTTP
+from .query_fingerprint import Query_Fingerprint
+from .fingerprint_cache import Fingerprint_Cache
+from .pt_fingerprint_coprocess import PT_Fingerprint_Coprocess
+from .timestamp_decoder import Timestamp_Decoder
+from .source_identity import Source_Identity, Source_Position
+from .block_reader import Block_Reader
+from .catch_up_scanner import Catch_Up_Scanner
+from .inotify_watcher import Inotify_Watcher
+from .error_log_parser import Error_Log_Parser, Error_Log_Record
+from .multiline_assembler import Multiline_Assembler
+from .error_log_formatter import Error_Log_Formatter
+from .slow_log_parser import Slow_Log_Parser, Slow_Log_Entry
+from .slow_log_formatter import Slow_Log_Formatter
+from .slow_log_backfill import Slow_Log_Backfill
+from .log_source import Log_Source
 from .request_counters import Request_Counters
+from .send_pipeline import Send_Pipeline
+from .token_bucket import Token_Bucket
+from .async_runtime import Async_Runtime
 
 #EOF
\ No newline at end of file
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+
+""" Consume sourcelogs and send messages from an asyncio event loop.
+"""
+
+
+from typing import Optional
+
+from .inotify_watcher import Inotify_Watcher
+from .send_pipeline import Send_Pipeline
+
+
+class Async_Runtime:
+    """ Read Log_Source objects and send their messages to Graylog
+        from a single asyncio event loop.
+
+        The inotify descriptor is watched by the event loop, so the
+        reader wakes up as soon as a sourcelog changes. Every message
+        is sent by a task, so several messages can be sent at the same
+        time, up to max_in_flight: when this limit is reached, reading
+        pauses. Positions are committed in order, as with sender
+        threads, by a Send_Pipeline.
+
+        Clients are the async Graylog clients, by protocol ('udp',
+        'tcp', 'http'): a message is sent with the first client that
+        accepts it. Rate limits are applied by the reader, so messages
+        are started in order.
+
+        SIGINT and SIGTERM stop the runtime: the messages that are
+        being sent are waited for, then run() returns. SIGHUP calls
+        on_rotate().
+    """
+
+
+    import asyncio
+    import signal
+    import time
+
+
+    ##  Constants
+    ##  =========
+
+    #: Maximum lines read from a source before letting tasks run
+    _LINES_PER_READ = 1000
+    #: With inotify, seconds to wait for events when nothing is pending
+    _INOTIFY_IDLE_WAIT = 60
+    #: Seconds to wait for the messages that are being sent, on stop
+    _STOP_TIMEOUT = 10
+
+
+    ##  Variables
+    ##  =========
+
+    #: Log_Source objects to consume
+    _sources = None
+    #: Inotify_Watcher of the sources, or None to poll them
+    _watcher = None
+    #: Async Graylog clients, by protocol, or None
+    _clients = None
+    #: Send_Pipeline that commits the positions in order
+    _send_pipeline = None
+    #: Function that records a (Log_Source, Source_Position) tuple
+    _commit_function = None
+    #: Whether to follow the sourcelogs after their end
+    _follow = None
+    #: Seconds between polls, or between checks with inotify when
+    #: messages are pending
+    _eof_wait = None
+    #: Maximum number of messages sent at the same time
+    _max_in_flight = None
+    #: Token_Bucket for messages per second, or None
+    _message_rate_limit = None
+    #: Token_Bucket for bytes per second, or None
+    _byte_rate_limit = None
+    #: Debug flags
+    _debug = None
+    #: Function called on SIGHUP
+    _on_rotate = None
+
+    #: Bounds the messages that are being sent
+    _in_flight = None
+    #: Tasks that are sending a message
+    _tasks = None
+    #: Messages put by the source that is being consumed, as
+    #: (message, position) tuples
+    _read_messages = None
+    #: inotify events not handled yet, by watch descriptor
+    _events = None
+    #: Set to wake up the reader
+    _wake = None
+    #: Set when a stop was requested
+    _stopping = False
+    #: Whether rate limits are delaying messages
+    _throttled = False
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, sources: list, watcher: Optional[Inotify_Watcher], clients: dict, commit_function, settings: dict):
+        """ Prepare the runtime. Nothing is read before run().
+            settings is a dictionary with these keys: follow, eof_wait
+            (in seconds), max_in_flight, message_rate_limit,
+            byte_rate_limit, debug, on_rotate.
+        """
+        self._sources = sources
+        self._watcher = watcher
+        self._clients = clients
+        self._commit_function = commit_function
+        self._follow = settings['follow']
+        self._eof_wait = settings['eof_wait']
+        self._max_in_flight = settings['max_in_flight']
+        self._message_rate_limit = settings['message_rate_limit']
+        self._byte_rate_limit = settings['byte_rate_limit']
+        self._debug = settings['debug']
+        self._on_rotate = settings['on_rotate']
+        self._tasks = set()
+        self._read_messages = [ ]
+        self._events = { }
+
+    def run(self) -> None:
+        """ Consume the sources until their end if we don't follow
+            them, or until a stop is requested.
+            Raise an exception if a client can't be opened.
+        """
+        self.asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        """ Open the clients, consume the sources, then wait for the
+            messages that are being sent and close the clients.
+        """
+        loop = self.asyncio.get_running_loop()
+        self._in_flight = self.asyncio.Semaphore(self._max_in_flight)
+        self._wake = self.asyncio.Event()
+        # Positions are (Log_Source, Source_Position) tuples
+        self._send_pipeline = Send_Pipeline(
+            self._start_send,
+            self._commit_function,
+            threads=0,
+            commit_key=lambda position: position[0]
+        )
+
+        loop.add_signal_handler(self.signal.SIGINT, self.stop)
+        loop.add_signal_handler(self.signal.SIGTERM, self.stop)
+        loop.add_signal_handler(self.signal.SIGHUP, self._on_rotate)
+        if self._watcher is not None:
+            loop.add_reader(self._watcher.fileno(), self._read_events)
+        try:
+            for client in self._clients.values():
+                if client is not None:
+                    await client.open()
+            await self._consume()
+            await self._wait_for_tasks()
+        finally:
+            if self._watcher is not None:
+                loop.remove_reader(self._watcher.fileno())
+            for signum in (self.signal.SIGINT, self.signal.SIGTERM, self.signal.SIGHUP):
+                loop.remove_signal_handler(signum)
+            for client in self._clients.values():
+                if client is None:
+                    continue
+                closing = client.close()
+                if self.asyncio.iscoroutine(closing):
+                    await closing
+
+    def stop(self) -> None:
+        """ Stop reading, and wake up the reader if it's waiting. """
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+
+    def _read_events(self) -> None:
+        """ Called by the event loop when the inotify descriptor is
+            readable. Record the events and wake up the reader.
+        """
+        for wd, event_mask in self._watcher.read_events().items():
+            self._events[wd] = self._events.get(wd, 0) | event_mask
+        self._wake.set()
+
+    def _has_pending_messages(self) -> bool:
+        """ Return whether some messages were not sent yet,
+            or their position was not written in the Eventlog.
+        """
+        if self._send_pipeline.get_pending() > 0:
+            return True
+        for source in self._sources:
+            lag_messages, lag_seconds = source.get_eventlog().get_lag()
+            if lag_messages > 0:
+                return True
+        return False
+
+    async def _consume(self) -> None:
+        """ Reader loop. All the sources are read until their end, then
+            only the sources that may have new contents are read again.
+        """
+        for source in self._sources:
+            source.resume()
+
+        ready = self._sources
+        while not self._stopping:
+            for source in ready:
+                await self._consume_source(source)
+
+            if not self._follow or self._stopping:
+                break
+            for source in self._sources:
+                source.get_eventlog().checkpoint_if_old()
+            ready = await self._wait_for_sources()
+
+    async def _consume_source(self, source) -> None:
+        """ Read the new lines of a source, and send its messages.
+            Other tasks run every _LINES_PER_READ lines.
+        """
+        put = lambda message, position: self._read_messages.append((message, position))
+        while not self._stopping:
+            has_more = source.consume(put, self._follow, self._LINES_PER_READ)
+            read_messages = self._read_messages
+            self._read_messages = [ ]
+            for message, position in read_messages:
+                if self._stopping:
+                    # Not committed, so it will be sent again on restart
+                    return
+                await self._queue_message(message, (source, position))
+            if not has_more:
+                return
+            await self.asyncio.sleep(0)
+
+    async def _limit_rate(self, size: int) -> None:
+        """ Wait until a message of size bytes can be sent without
+            exceeding the rate limits.
+        """
+        wait = 0.0
+        if self._message_rate_limit:
+            wait = max(wait, self._message_rate_limit.reserve(1))
+        if self._byte_rate_limit:
+            wait = max(wait, self._byte_rate_limit.reserve(size))
+        throttled = wait > 0
+        if throttled != self._throttled:
+            self._throttled = throttled
+            if self._debug['RATE_LIMIT']:
+                print('Rate limit: ' + ('throttling' if throttled else 'not throttling'))
+        if throttled:
+            await self.asyncio.sleep(wait)
+
+    async def _queue_message(self, message, position) -> None:
+        """ Start sending a message, waiting if too many messages are
+            being sent or the rate limits are exceeded.
+        """
+        if isinstance(message, bytes):
+            message_bytes = message
+        else:
+            message_bytes = message.to_bytes()
+        await self._limit_rate(len(message_bytes))
+        await self._in_flight.acquire()
+        self._send_pipeline.put(message_bytes, position)
+
+    def _start_send(self, message_bytes: bytes, on_sent) -> None:
+        """ Called by the send pipeline: create a task that sends
+            the message.
+        """
+        task = self.asyncio.get_running_loop().create_task(self._send(message_bytes, on_sent))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, message_bytes: bytes, on_sent) -> None:
+        """ Send a message to Graylog, trying UDP, TCP and HTTP in this
+            order. Call on_sent when the message is sent, or when no
+            client could send it. In that case the message is skipped,
+            so the Eventlog can move forward.
+            If the task is cancelled on stop, on_sent is not called,
+            so the message will be sent again on restart.
+        """
+        try:
+            if self._debug['GELF_MESSAGES']:
+                print(message_bytes.decode('utf-8'))
+
+            if self._clients.get('udp'):
+                try:
+                    self._clients['udp'].send(message_bytes)
+                    on_sent()
+                    return
+                except Exception:
+                    pass
+
+            if self._clients.get('tcp'):
+                try:
+                    await self._clients['tcp'].send(message_bytes)
+                    on_sent()
+                    return
+                except Exception:
+                    pass
+
+            if self._clients.get('http'):
+                try:
+                    await self._clients['http'].send(message_bytes)
+                    on_sent()
+                    return
+                except Exception:
+                    pass
+
+            on_sent()
+        finally:
+            self._in_flight.release()
+
+    async def _wait_for_tasks(self) -> None:
+        """ Wait for the messages that are being sent. On stop, wait
+            _STOP_TIMEOUT seconds at most, then cancel the remaining
+            sends.
+        """
+        if not self._tasks:
+            return
+        timeout = self._STOP_TIMEOUT if self._stopping else None
+        done, pending = await self.asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await self.asyncio.wait(pending)
+
+    async def _wait_for_sources(self) -> list:
+        """ Wait until some sources may have new contents, and return
+            them.
+            With inotify, the sources that changed are returned. Every
+            eof_wait seconds all sources are returned, if a sourcelog
+            is missing or messages must be sent; otherwise, every
+            _INOTIFY_IDLE_WAIT seconds. Without inotify, all sources
+            are returned every eof_wait seconds.
+            Sources with an Error Log entry that must be sent are
+            returned when it's time to send it.
+        """
+        timeout = self._INOTIFY_IDLE_WAIT
+        if self._watcher is None or self._has_pending_messages():
+            timeout = max(self._eof_wait, 0)
+        for source in self._sources:
+            if source.is_missing():
+                # Events about the old file don't tell us when the new
+                # file is created
+                timeout = max(self._eof_wait, 0)
+        full_timeout = timeout
+        for source in self._sources:
+            flush_wait = source.get_flush_wait()
+            if flush_wait is not None:
+                timeout = max(min(timeout, flush_wait), 0)
+
+        timed_out = False
+        if not self._events and not self._stopping:
+            try:
+                await self.asyncio.wait_for(self._wake.wait(), timeout)
+            except self.asyncio.TimeoutError:
+                timed_out = True
+        self._wake.clear()
+        events = self._events
+        self._events = { }
+        if timed_out and timeout >= full_timeout:
+            return self._sources
+
+        ready = [ ]
+        for source in self._sources:
+            flush_wait = source.get_flush_wait()
+            if source.get_watch() in events or (flush_wait is not None and flush_wait <= 0):
+                ready.append(source)
+        return ready
+
+#EOF
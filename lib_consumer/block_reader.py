@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+
+""" Read lines from a log with large binary reads.
+"""
+
+
+from typing import Optional
+
+
+class Block_Reader:
+    """ Read a log in large blocks and split it into lines.
+
+        Blocks are read into a buffer that is reused for the whole life
+        of the reader. The last newline of the data read is found with
+        a bytes search, and all the complete lines before it are split
+        at once. The reader knows the exact byte offset where every
+        line starts and ends, so the Eventlog can record positions that
+        are safe to restart from.
+
+        A line is only returned when its newline was written. A partial
+        line at the end of the file stays in the buffer until the rest
+        is written, unless the caller asks for it explicitly.
+    """
+
+
+    ##  Constants
+    ##  =========
+
+    #: Default size of a read, in bytes
+    DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+
+    ##  Variables
+    ##  =========
+
+    #: Path of the log
+    _path = None
+    #: Unbuffered binary file
+    _file = None
+    #: Size of a read
+    _block_size = None
+    #: Data read from the file. Valid data is between _start and _end
+    _buffer = None
+    #: Start of the data that was not split into lines yet
+    _start = 0
+    #: End of the valid data in the buffer
+    _end = 0
+    #: File offset of the beginning of the buffer
+    _buffer_offset = 0
+    #: Complete lines split from the buffer
+    _lines = ()
+    #: Whether _lines are already decoded strings, without \r
+    _decoded = False
+    #: Index of the next line to return in _lines
+    _line_index = 0
+    #: File offset where the next line starts
+    _next_offset = 0
+    #: File offset where the last returned line starts
+    _line_start = 0
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, path: str, block_size: int = DEFAULT_BLOCK_SIZE):
+        """ Open the log. Raise an exception if it can't be opened. """
+        self._path = path
+        self._block_size = block_size
+        self._file = open(path, 'rb', buffering=0)
+        self._buffer = bytearray(block_size)
+
+    def close(self) -> None:
+        """ Close the log. """
+        self._file.close()
+
+    def get_path(self) -> str:
+        """ Return the path of the log. """
+        return self._path
+
+    def fileno(self) -> int:
+        """ Return the file descriptor of the log. """
+        return self._file.fileno()
+
+    def seek(self, offset: int) -> None:
+        """ Continue reading from the specified offset,
+            which should be the beginning of a line.
+        """
+        self._file.seek(offset)
+        self._buffer_offset = offset
+        self._start = 0
+        self._end = 0
+        self._lines = ()
+        self._line_index = 0
+        self._next_offset = offset
+        self._line_start = offset
+
+    def tell(self) -> int:
+        """ Return the offset after the last returned line. """
+        return self._next_offset
+
+    def get_line_start(self) -> int:
+        """ Return the offset where the last returned line starts. """
+        return self._line_start
+
+    def _fill(self) -> int:
+        """ Read a block into the buffer, after the valid data.
+            Return the number of bytes read.
+        """
+        if self._start > 0:
+            # Move the partial line to the beginning of the buffer
+            size = self._end - self._start
+            self._buffer[0:size] = self._buffer[self._start:self._end]
+            self._buffer_offset = self._buffer_offset + self._start
+            self._start = 0
+            self._end = size
+        if self._end == len(self._buffer):
+            # The partial line fills the buffer: grow it
+            self._buffer.extend(bytes(self._block_size))
+        read = self._file.readinto(memoryview(self._buffer)[self._end:])
+        if not read:
+            return 0
+        # Only the new data can contain the last newline
+        last_newline = self._buffer.rfind(b'\n', self._end, self._end + read)
+        if last_newline > -1:
+            lines = self._buffer[self._start:last_newline]
+            self._decoded = lines.isascii() and b'\r' not in lines
+            if self._decoded:
+                # Most logs are ASCII: decode all the lines at once.
+                # The length of each line is still its length in bytes.
+                self._lines = lines.decode('ascii').split('\n')
+            else:
+                self._lines = lines.split(b'\n')
+            self._line_index = 0
+            self._start = last_newline + 1
+        self._end = self._end + read
+        return read
+
+    def readline(self, allow_partial: bool = False) -> Optional[str]:
+        """ Return the next line without the newline, or None if no
+            complete line is available.
+            If allow_partial is True, the data after the last newline
+            is returned as a line when the end of the file is reached.
+        """
+        index = self._line_index
+        while index >= len(self._lines):
+            # Read until a block completes a line
+            if not self._fill():
+                if allow_partial and self._end > self._start:
+                    return self._get_partial_line()
+                return None
+            index = self._line_index
+        line = self._lines[index]
+        self._line_index = index + 1
+        # This method is called for every line: keep it short
+        self._line_start = offset = self._next_offset
+        self._next_offset = offset + len(line) + 1
+        if self._decoded:
+            return line
+        if line[-1:] == b'\r':
+            line = line[:-1]
+        return line.decode('utf-8', 'replace')
+
+    def _get_partial_line(self) -> str:
+        """ Return the data after the last newline as a line. """
+        line = self._buffer[self._start:self._end]
+        self._start = self._end
+        self._line_start = self._next_offset
+        self._next_offset = self._next_offset + len(line)
+        return line.rstrip(b'\r').decode('utf-8', 'replace')
+
+#EOF
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+
+""" Split a large backlog of a log into entries using a memory map.
+"""
+
+
+from typing import Iterator, List, Tuple
+
+
+class Catch_Up_Scanner:
+    """ Map a log from an offset to its current end, and find where
+        the entries start without reading it line by line.
+
+        Entry boundaries are searched in the mapped region with a bytes
+        pattern, so lines are only decoded when the caller asks for
+        them, and the continuation lines that the caller doesn't need
+        are never copied.
+
+        The region ends after the last newline, so an entry that is
+        still being written is left to the line by line reader.
+    """
+
+
+    import os
+    import re
+    import mmap
+
+
+    ##  Constants
+    ##  =========
+
+    # Patterns start with the newline that precedes the entry, because
+    # searches for a pattern that starts with a literal are much faster
+
+    #: First line of an Error Log entry: a date and a time,
+    #: in MariaDB 10.x format or legacy format
+    ERROR_LOG_ENTRY_START = re.compile(
+        rb'\n[ \t]*(?:\d{4}-\d{1,2}-\d{1,2}|\d{6})[ \t]+\d{1,2}:\d{1,2}:\d{1,2}'
+    )
+    #: First line of a Slow Log entry: # Time:, or # User@Host:
+    #: when the time is the same as the previous entry
+    SLOW_LOG_ENTRY_START = re.compile(
+        rb'\n# (?:Time: [^\n]*\n# )?User@Host: '
+    )
+    #: Bytes read to match a pattern at the beginning of the file
+    _MAX_ENTRY_START_LENGTH = 4096
+
+
+    ##  Variables
+    ##  =========
+
+    #: Path of the log
+    _path = None
+    #: mmap of the whole log, or None if there is nothing to read
+    _map = None
+    #: Offset where the scan starts
+    _start = None
+    #: Offset after the last complete line
+    _end = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, path: str, start: int = 0):
+        """ Map the log, from start to its current end.
+            Raise an exception if it can't be opened or mapped.
+        """
+        self._path = path
+        self._start = start
+        self._end = start
+        with open(path, 'rb') as log_file:
+            size = self.os.fstat(log_file.fileno()).st_size
+            if size <= start:
+                return
+            # mmap offsets must be aligned to pages: map the whole
+            # file and start scanning at the offset
+            self._map = self.mmap.mmap(log_file.fileno(), size, access=self.mmap.ACCESS_READ)
+        if hasattr(self._map, 'madvise'):
+            self._map.madvise(self.mmap.MADV_SEQUENTIAL)
+        self._end = self._map.rfind(b'\n', start, size) + 1
+        if self._end < start:
+            self._end = start
+
+    def close(self) -> None:
+        """ Unmap the log. """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def get_path(self) -> str:
+        """ Return the path of the log. """
+        return self._path
+
+    def get_end(self) -> int:
+        """ Return the offset where the scanned region ends.
+            The line by line reading should continue from here.
+        """
+        return self._end
+
+    def get_size(self) -> int:
+        """ Return the size of the scanned region, in bytes. """
+        return self._end - self._start
+
+    def get_entries(self, entry_start) -> Iterator[Tuple[int, int]]:
+        """ Yield the (start, end) offsets of the entries, using the
+            entry_start pattern to find the newline before them.
+            The region starts at the beginning of a line, so what
+            precedes the first match is yielded as an entry, even if
+            it isn't one.
+        """
+        if self._end <= self._start:
+            return
+        prev_start = self._start
+        for match in entry_start.finditer(self._map, self._start, self._end):
+            start = match.start() + 1
+            yield (prev_start, start)
+            prev_start = start
+        yield (prev_start, self._end)
+
+    def _get_entry_start_end(self, entry_start, offset: int) -> int:
+        """ If an entry starts at offset, return the offset where its
+            entry_start match ends. Otherwise return offset.
+        """
+        if offset > 0:
+            match = entry_start.match(self._map, offset - 1)
+            if match is None:
+                return offset
+            return match.end()
+        # The file has no newline before its first line
+        head = self._map[0:min(self._end, self._MAX_ENTRY_START_LENGTH)]
+        match = entry_start.match(b'\n' + head)
+        if match is None:
+            return offset
+        return match.end() - 1
+
+    def get_ranges(self, entry_start, size: int) -> Iterator[Tuple[int, int]]:
+        """ Split the region into (start, end) ranges of about size
+            bytes. Every range except the first one starts at the
+            beginning of an entry, found with the entry_start pattern.
+        """
+        start = self._start
+        while start < self._end:
+            # The search starts at the beginning of the line that
+            # contains the last byte of the range, or after the entry
+            # that starts the range, so ranges are never empty
+            entry_end = self._get_entry_start_end(entry_start, start)
+            last_byte = min(start + size, self._end) - 1
+            search_start = max(self._map.rfind(b'\n', start, last_byte + 1), entry_end)
+            match = entry_start.search(self._map, search_start, self._end)
+            if match is not None:
+                # Patterns span two lines at most: if the match is the
+                # second line of a longer match (# User@Host: after
+                # # Time:), the entry starts one line before
+                previous = self._map.rfind(b'\n', entry_end, match.start())
+                if previous >= 0:
+                    longer_match = entry_start.match(self._map, previous)
+                    if longer_match is not None and longer_match.end() > match.start():
+                        match = longer_match
+            end = self._end
+            if match is not None:
+                end = match.start() + 1
+            yield (start, end)
+            start = end
+
+    def get_first_line(self, start: int, end: int) -> str:
+        """ Return the first line of an entry, without the newline. """
+        newline = self._map.find(b'\n', start, end)
+        if newline < 0:
+            newline = end
+        return self._map[start:newline].decode('utf-8', 'replace').rstrip()
+
+    def get_lines(self, start: int, end: int) -> List[str]:
+        """ Return the lines of an entry, without the newlines. """
+        text = self._map[start:end].decode('utf-8', 'replace')
+        if text[-1:] == '\n':
+            text = text[:-1]
+        return [ line.rstrip() for line in text.split('\n') ]
+
+#EOF
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+
+""" Compose GELF messages from Error Log entries.
+"""
+
+
+from .gelf_message import GELF_Message
+from .gelf_template import GELF_Template
+from .error_log_parser import Error_Log_Record
+from .multiline_assembler import Multiline_Assembler
+
+
+class Error_Log_Formatter:
+    """ Turn Error_Log_Record objects into GELF messages.
+
+        The first line of the entry is sent as text, and the
+        continuation lines are appended to it when the entry
+        is complete.
+    """
+
+
+    ##  Variables
+    ##  =========
+
+    #: GELF_Template with the fields that are the same for all messages
+    _template = None
+    #: Maximum length of short_message, without the level
+    _short_message_length = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, template: GELF_Template, short_message_length: int):
+        """ Compose messages with the specified template. """
+        self._template = template
+        self._short_message_length = short_message_length
+
+    def format(self, record: Error_Log_Record, debug: dict) -> GELF_Message:
+        """ Return a GELF message for the first line of an entry. """
+        short_message = record.level_text + ' ' + record.message[:self._short_message_length]
+
+        custom = {
+            "text": record.message
+        }
+
+        return self._template.create_message(
+                debug,
+                record.timestamp,
+                short_message,
+                record.level,
+                custom
+            )
+
+    def add_continuation(self, message: GELF_Message, multiline: Multiline_Assembler) -> None:
+        """ Add the continuation lines collected by multiline to the
+            text field of the message.
+        """
+        if not multiline.has_lines():
+            return
+        # Join the lines once, instead of appending them one by one
+        message.append_to_field(True, 'text', multiline.get_text())
+        if multiline.get_dropped_lines() > 0:
+            message.create_field(True, 'truncated_lines', multiline.get_dropped_lines())
+
+#EOF
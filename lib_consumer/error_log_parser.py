@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+
+""" Parse Error Log lines.
+"""
+
+
+from typing import NamedTuple, Optional, Union
+
+from .timestamp_decoder import Timestamp_Decoder
+
+
+class Error_Log_Record(NamedTuple):
+    """ The information contained in the first line of an Error Log entry.
+    """
+    #: UNIX timestamp, with decimals if the line has fractional seconds
+    timestamp: Union[int, float]
+    #: Thread id, or None if the line format doesn't include it
+    thread: Optional[str]
+    #: Severity without brackets, in uppercase: NOTE, WARNING, ERROR...
+    level: str
+    #: Severity as written in the line, for example [Note]
+    level_text: str
+    #: Rest of the line
+    message: str
+
+
+class Error_Log_Parser:
+    """ Parse the lines of an Error Log with a single precompiled pattern.
+
+        These line formats are recognised:
+
+        MariaDB 10.x:
+        2019-11-01 16:10:48 0 [Note] WSREP: Read nil XID from storage engines, skipping position init
+        Legacy:
+        201030 12:40:21 [ERROR] mysqld got signal 6 ;
+
+        Seconds can have up to 6 decimals. Lines that don't match any
+        format are the continuation of the previous entry.
+    """
+
+
+    import re
+
+
+    ##  Constants
+    ##  =========
+
+    #: Both formats, in one pattern. Groups:
+    #: 1-3 date (YYYY-MM-DD), 4-6 date (YYMMDD), 7-9 time,
+    #: 10 fractional seconds, 11 thread, 12 level, 13 message
+    _RE_LINE = re.compile(
+        r'[ \t]*(?:(\d{4})-(\d{1,2})-(\d{1,2})|(\d\d)(\d\d)(\d\d))'
+        r'[ \t]+(\d{1,2}):(\d{1,2}):(\d{1,2})(?:\.(\d{1,6}))?'
+        r'(?:[ \t]+(\d+))?'
+        r'[ \t]+(\S+)'
+        r'[ \t]*(.*)',
+        re.DOTALL
+    )
+
+
+    ##  Variables
+    ##  =========
+
+    #: Timestamp_Decoder that converts dates and times
+    _timestamp_decoder = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, timestamp_decoder: Timestamp_Decoder = None):
+        """ Use the specified Timestamp_Decoder, or one that
+            considers times as local.
+        """
+        if timestamp_decoder is None:
+            timestamp_decoder = Timestamp_Decoder()
+        self._timestamp_decoder = timestamp_decoder
+
+    def parse(self, line: str) -> Optional[Error_Log_Record]:
+        """ Return an Error_Log_Record if the line starts an entry,
+            or None if it is the continuation of the previous entry.
+        """
+        match = self._RE_LINE.match(line)
+        if match is None:
+            return None
+        (
+            year, month, day,
+            short_year, short_month, short_day,
+            hour, minute, second, fraction,
+            thread, level_text, message
+        ) = match.groups()
+
+        if year is None:
+            # Same rule as strptime's %y
+            year = int(short_year)
+            year = year + (2000 if year < 69 else 1900)
+            month = short_month
+            day = short_day
+        microsecond = 0
+        if fraction:
+            microsecond = int(fraction.ljust(6, '0'))
+        try:
+            timestamp = self._timestamp_decoder.decode(
+                int(year), int(month), int(day),
+                int(hour), int(minute), int(second),
+                microsecond
+            )
+        except (ValueError, OverflowError):
+            return None
+
+        return Error_Log_Record(
+            timestamp,
+            thread,
+            level_text.replace('[', '').replace(']', '').upper(),
+            level_text,
+            message.strip()
+        )
+
+#EOF
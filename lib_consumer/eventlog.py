@@ -5,6 +5,10 @@
 
 
 import os
+import time
+import threading
+
+from .source_identity import Source_Identity
 
 
 class Eventlog:
@@ -18,6 +22,27 @@ class Eventlog:
 
         The first column tells us whether the entry refers to read rows
         (from the original source) or to rows sent to their destination.
+        The consumer writes SENT rows, and resumes from the last one.
+        Rows without the first column, written by older versions, are
+        considered SENT rows.
+        The sourcelog path can be followed by the Source_Identity of
+        the sourcelog file: device, inode, and size and CRC32 of the
+        head of the file. It tells whether the file at the same path
+        is still the same file.
+
+        On start, the Eventlog is read backwards from the end, so the
+        time it takes doesn't depend on its size. READ rows are
+        skipped, up to a maximum number of rows: if no SENT row is
+        found, there is no offset to resume from. If the program
+        crashed while writing the last row, that row is removed.
+
+        Rows are group-committed: append() only remembers the last
+        position, which is written as a checkpoint after a number of
+        messages or after some time, whichever comes first. Every
+        checkpoint is a single write of a complete row, optionally
+        followed by fsync() or fdatasync(). A crash can only tear the
+        last row, which is ignored on start. Fewer checkpoints mean
+        less I/O, but more messages are sent again after a crash.
         Rotation is supposed to happen via logrotate.
         The module we use will automatically close and reopen the file
         if logrotate truncates it.
@@ -38,11 +63,50 @@ class Eventlog:
 
     #: Separator between fields, in the same line
     FIELD_SEPARATOR = ':'
+    #: Types of rows, in the first column
+    ROW_READ = 'READ'
+    ROW_SENT = 'SENT'
+    #: Size of the blocks read backwards to find the last row
+    _READ_BLOCK_SIZE = 4096
+    #: Maximum number of rows read backwards to find the last SENT row
+    _MAX_ROWS_SCANNED = 10000
+    #: Allowed values for the sync option
+    SYNC_METHODS = ('none', 'fsync', 'fdatasync')
+    #: Default checkpoint policy
+    DEFAULT_CHECKPOINT_MESSAGES = 1000
+    DEFAULT_CHECKPOINT_INTERVAL = 1.0
 
-    #: Eventlog file handler
+    #: Path of the Eventlog
+    _eventlog_path = None
+    #: Eventlog file handler, unbuffered, so that a row is
+    #: written with a single system call
     _handler = None
+    #: Write a checkpoint after this number of messages
+    _checkpoint_messages = None
+    #: Write a checkpoint when the oldest message that is not
+    #: checkpointed is older than this number of seconds
+    _checkpoint_interval = None
+    #: 'none', 'fsync' or 'fdatasync'
+    _sync = None
+    #: Row to write at the next checkpoint, or None
+    _pending_row = None
+    #: Number of messages sent after the last checkpoint
+    _pending_messages = 0
+    #: time.monotonic() when the first message after the last
+    #: checkpoint was sent
+    _pending_since = None
+    #: Last written row, rewritten after a rotation
+    _last_row = None
+    #: Statistics for get_stats()
+    _stats = None
     #: Initial offset
     _offset = None
+    #: Source_Identity of the sourcelog at the initial offset,
+    #: if it was logged
+    _identity = None
+    #: The Eventlog can be written by sender threads
+    #: and rotated by a signal handler
+    _lock = None
 
 
     ##  Methods
@@ -61,54 +125,216 @@ class Eventlog:
         return self._get_name_regular() + self._EVENTLOG_TMP_EXTENSION
 
     def __init__(self, options, eventlog_path=None):
-        """ Open newest log file. If the file is changed (eg by logrotate) it closes and reopens it. """
+        """ Open newest log file. If the file is changed (eg by logrotate) it closes and reopens it.
+            Besides path and truncate, options can contain the
+            checkpoint policy: checkpoint_messages, checkpoint_interval
+            (in seconds) and sync (one of SYNC_METHODS).
+        """
         # This additional check is because a class member can't be an argument default.
         if eventlog_path is None:
             eventlog_path=self._DEFAULT_EVENTLOG_PATH
+        self._eventlog_path = eventlog_path
         self.Path(eventlog_path).parent.resolve().mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._checkpoint_messages = options.get('checkpoint_messages', self.DEFAULT_CHECKPOINT_MESSAGES)
+        self._checkpoint_interval = options.get('checkpoint_interval', self.DEFAULT_CHECKPOINT_INTERVAL)
+        self._sync = options.get('sync', 'none')
+        if self._sync not in self.SYNC_METHODS:
+            raise Exception('Invalid Eventlog sync method: ' + str(self._sync))
+        self._stats = {
+            'checkpoints': 0,
+            'messages': 0,
+            'max_lag_messages': 0,
+            'max_lag_seconds': 0.0
+        }
 
         # If the Eventlog exists and we're not going to truncate it,
-        # read the offset from the last line and store it in self._offset,
+        # read the offset from the last row and store it in self._offset,
         # so it can be read by the program.
         if os.path.exists(eventlog_path) and not options['truncate']:
-            self._handler = open(eventlog_path, 'r')
-            last_line = self._handler.readline()
-            prev_line = None
-            while last_line:
-                prev_line = last_line
-                last_line = self._handler.readline()
-            self._handler.close()
-            if prev_line is None:
-                raise Exception('Eventlog is malformed')
-            self._offset = int(prev_line.split(':')[0])
+            self._read_last_row(eventlog_path)
 
         # Empty the file if required
         if options['truncate']:
             try:
-                self._handler = open(eventlog_path, 'w')
-                self._handler.truncate(0)
-                self._handler.close()
-                self._handler = open(eventlog_path, 'a')
+                self._handler = open(eventlog_path, 'wb', buffering=0)
             except:
                 raise Exception('Could not truncate eventlog: ' + eventlog_path)
         # Open the existing file for append
         else:
             try:
-                self._handler = open(eventlog_path, 'a')
+                self._handler = open(eventlog_path, 'ab', buffering=0)
             except:
                 raise Exception('Could not open or create eventlog: ' + eventlog_path)
 
+    def _parse_row(self, line):
+        """ Return the offset and the Source_Identity (or None) of a
+            SENT row, without the newline.
+            Return None if the row is a READ row.
+            Raise ValueError if the row is malformed.
+        """
+        fields = line.split(self.FIELD_SEPARATOR)
+        if fields[0] == self.ROW_READ:
+            return None
+        if fields[0] == self.ROW_SENT:
+            fields = fields[1:]
+        if len(fields) < 2:
+            raise ValueError('Too few fields')
+        identity = None
+        if len(fields) > 2:
+            identity = Source_Identity.from_fields(fields[2:])
+        return (int(fields[0]), identity)
+
+    def _get_rows_backwards(self, eventlog_file, end):
+        """ Yield the rows of the Eventlog as bytes, without newlines,
+            from the last one to the first. The first yielded value is
+            what follows the last newline: an empty string, or a row
+            that was not completely written.
+        """
+        position = end
+        tail = b''
+        while position > 0:
+            size = min(self._READ_BLOCK_SIZE, position)
+            position = position - size
+            eventlog_file.seek(position)
+            lines = (eventlog_file.read(size) + tail).split(b'\n')
+            # The first line may continue in the previous block
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                yield line
+        yield tail
+
+    def _read_last_row(self, eventlog_path):
+        """ Find the last SENT row, reading the Eventlog backwards,
+            and store its offset and identity.
+            If there are no SENT rows in the last _MAX_ROWS_SCANNED
+            rows, the offset remains None.
+            Truncate a last row that was not completely written.
+            Raise an exception if the Eventlog contains complete rows
+            but none of them is valid.
+        """
+        with open(eventlog_path, 'rb+') as eventlog_file:
+            end = eventlog_file.seek(0, os.SEEK_END)
+            rows = self._get_rows_backwards(eventlog_file, end)
+            torn_row = next(rows)
+            scanned_rows = 0
+            has_valid_rows = False
+            for row in rows:
+                if not row:
+                    continue
+                scanned_rows = scanned_rows + 1
+                if scanned_rows > self._MAX_ROWS_SCANNED:
+                    break
+                try:
+                    parsed_row = self._parse_row(row.decode('utf-8'))
+                except (ValueError, UnicodeDecodeError):
+                    # Skip corrupted rows
+                    continue
+                has_valid_rows = True
+                if parsed_row is not None:
+                    self._offset, self._identity = parsed_row
+                    self._last_row = row.decode('utf-8')
+                    break
+            if torn_row:
+                eventlog_file.truncate(end - len(torn_row))
+        if scanned_rows > 0 and not has_valid_rows:
+            raise Exception('Eventlog is malformed')
+
     def get_offset(self):
         """ Return the Eventlog offset from the previous run """
         return self._offset
 
-    def append(self, position, sourcefile):
-        """ Append a line to the Eventlog """
-        self._handler.write(position + self.FIELD_SEPARATOR + sourcefile + '\n')
+    def get_identity(self):
+        """ Return the Source_Identity of the sourcelog at the offset
+            from the previous run, or None if it was not logged.
+        """
+        return self._identity
+
+    def append(self, position, sourcefile, identity=None, messages=1):
+        """ Record that the messages up to position were sent.
+            identity is the Source_Identity of sourcefile, if known.
+            messages is the number of messages that were sent since
+            the previous call.
+            The row is written now if the checkpoint policy requires it,
+            otherwise at the next checkpoint.
+        """
+        row = self.ROW_SENT + self.FIELD_SEPARATOR + position + self.FIELD_SEPARATOR + sourcefile
+        if identity is not None:
+            row = row + self.FIELD_SEPARATOR + self.FIELD_SEPARATOR.join(identity.to_fields())
+        with self._lock:
+            self._pending_row = row
+            self._pending_messages = self._pending_messages + messages
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if self._pending_messages >= self._checkpoint_messages:
+                self.checkpoint()
+            else:
+                self.checkpoint_if_old()
+
+    def _write_row(self, row):
+        """ Write a row with a single system call, and sync it
+            if required.
+        """
+        self._handler.write((row + '\n').encode('utf-8'))
+        if self._sync == 'fsync':
+            os.fsync(self._handler.fileno())
+        elif self._sync == 'fdatasync':
+            os.fdatasync(self._handler.fileno())
+
+    def checkpoint(self):
+        """ Write the last appended row, if it was not written yet. """
+        with self._lock:
+            if self._pending_row is None:
+                return
+            lag_messages, lag_seconds = self.get_lag()
+            self._write_row(self._pending_row)
+            self._last_row = self._pending_row
+            self._pending_row = None
+            self._pending_messages = 0
+            self._pending_since = None
+
+            self._stats['checkpoints'] = self._stats['checkpoints'] + 1
+            self._stats['messages'] = self._stats['messages'] + lag_messages
+            self._stats['max_lag_messages'] = max(self._stats['max_lag_messages'], lag_messages)
+            self._stats['max_lag_seconds'] = max(self._stats['max_lag_seconds'], lag_seconds)
+
+    def checkpoint_if_old(self):
+        """ Write a checkpoint if the oldest message that is not
+            checkpointed is older than the checkpoint interval.
+            Call this periodically, so that the last messages are
+            checkpointed when no more messages are sent.
+        """
+        with self._lock:
+            if self._pending_since is not None and time.monotonic() - self._pending_since >= self._checkpoint_interval:
+                self.checkpoint()
+
+    def get_lag(self):
+        """ Return the checkpoint lag, as a tuple: number of messages
+            sent but not checkpointed, and seconds since the oldest of
+            them was sent.
+        """
+        with self._lock:
+            if self._pending_since is None:
+                return (0, 0.0)
+            return (self._pending_messages, time.monotonic() - self._pending_since)
+
+    def get_stats(self):
+        """ Return a dictionary with the number of checkpoints and
+            checkpointed messages, the maximum lag of a checkpoint and
+            the current lag.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['lag_messages'], stats['lag_seconds'] = self.get_lag()
+            return stats
 
     def close(self):
-        """ Close the Eventlog """
-        self._handler.close()
+        """ Write the last checkpoint and close the Eventlog """
+        with self._lock:
+            try:
+                self.checkpoint()
+            finally:
+                self._handler.close()
 
     def rotate(self):
         """ Rotate the Eventlog.
@@ -123,33 +349,37 @@ class Eventlog:
         #   - open the new logfile
         #   - delete the old logfile
 
-        file_name_regular = self._get_name_regular()
-        file_name_tmp = self._get_name_tmp()
-
-        is_closed = False
-        is_renamed = False
-        is_reopened = False
-
-        try:
-            self._handler.close()
-            is_closed = True
-            if os.path.exists(file_name_tmp):
-                os.rename.unlink(file_name_tmp)
-            is_purged = True
-            os.rename(file_name_regular, file_name_tmp)
-            is_renamed = True
-            self._handler = open(file_name_regular, 'a')
-            is_reopened = True
-            os.unlink(file_name_tmp)
-        except:
-            if is_reopened:
-                status = 'The new logfile was opened, but the old could not be deleted.'
-            elif is_renamed:
-                status = 'The old logfile was renamed, but the new file could not be created.'
-            elif is_closed:
-                status = 'The old logfile was closed, but it could not be renamed.'
-            else:
-                status = 'The old logfile could not be closed.'
-            abort(3, 'An error occurred during rotation. ' + status)
+        with self._lock:
+            file_name_regular = self._get_name_regular()
+            file_name_tmp = self._get_name_tmp()
+
+            is_closed = False
+            is_renamed = False
+            is_reopened = False
+
+            try:
+                self.checkpoint()
+                self._handler.close()
+                is_closed = True
+                if os.path.exists(file_name_tmp):
+                    os.unlink(file_name_tmp)
+                os.rename(file_name_regular, file_name_tmp)
+                is_renamed = True
+                self._handler = open(file_name_regular, 'ab', buffering=0)
+                # The new Eventlog must tell where to resume from
+                if self._last_row is not None:
+                    self._write_row(self._last_row)
+                is_reopened = True
+                os.unlink(file_name_tmp)
+            except:
+                if is_reopened:
+                    status = 'The new logfile was opened, but the old could not be deleted.'
+                elif is_renamed:
+                    status = 'The old logfile was renamed, but the new file could not be created.'
+                elif is_closed:
+                    status = 'The old logfile was closed, but it could not be renamed.'
+                else:
+                    status = 'The old logfile could not be closed.'
+                raise Exception('An error occurred during rotation. ' + status)
 
 #EOF
\ No newline at end of file
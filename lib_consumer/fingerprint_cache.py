@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+
+""" Bounded cache of query fingerprints.
+"""
+
+
+from collections import OrderedDict
+
+
+class Fingerprint_Cache:
+    """ LRU cache in front of a fingerprinting object.
+        It has the same fingerprint() and fingerprint_many() methods,
+        so it can be used in place of the object it wraps.
+
+        Slow Logs are usually dominated by a small number of queries
+        that are repeated many times, so most entries are found in the
+        cache and are not fingerprinted again.
+        Queries are looked up by their text: the hash of a string is
+        computed once and cached by Python, so a lookup doesn't need to
+        tokenize the query. Identical fingerprints are interned, so
+        different queries with the same shape share the same string.
+    """
+
+
+    import sys
+
+
+    ##  Constants
+    ##  =========
+
+    #: Longer queries are not cached, to avoid that a few big
+    #: INSERTs use most of the memory.
+    _MAX_QUERY_LENGTH = 4096
+
+
+    ##  Variables
+    ##  =========
+
+    #: Object that computes the fingerprints. It must have the
+    #: fingerprint() and fingerprint_many() methods.
+    _fingerprinter = None
+    #: Maximum number of cached fingerprints
+    _size = None
+    #: Query text -> fingerprint, from the least to the most recently used.
+    _cache = None
+    #: Number of queries found in the cache
+    _hits = 0
+    #: Number of queries not found in the cache
+    _misses = 0
+    #: Number of fingerprints removed from a full cache
+    _evictions = 0
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, fingerprinter, size: int):
+        """ Wrap fingerprinter with a cache of the specified size. """
+        if size < 1:
+            raise ValueError('Fingerprint cache size must be a positive integer')
+        self._fingerprinter = fingerprinter
+        self._size = size
+        self._cache = OrderedDict()
+
+    def fingerprint(self, query: str) -> str:
+        """ Return the fingerprint of the specified query,
+            from the cache if possible.
+        """
+        if len(query) > self._MAX_QUERY_LENGTH:
+            self._misses = self._misses + 1
+            return self._fingerprinter.fingerprint(query)
+
+        try:
+            fingerprint = self._cache[query]
+            self._cache.move_to_end(query)
+            self._hits = self._hits + 1
+            return fingerprint
+        except KeyError:
+            pass
+
+        self._misses = self._misses + 1
+        fingerprint = self.sys.intern(self._fingerprinter.fingerprint(query))
+        self._cache[query] = fingerprint
+        if len(self._cache) > self._size:
+            self._cache.popitem(last=False)
+            self._evictions = self._evictions + 1
+        return fingerprint
+
+    def fingerprint_many(self, queries) -> list:
+        """ Return the fingerprints of a list of queries, in the same order.
+            The queries that are not in the cache are fingerprinted
+            with a single fingerprint_many() call.
+        """
+        results = [ None ] * len(queries)
+        # Query text -> indexes of the results that need its fingerprint
+        missing = { }
+        for i, query in enumerate(queries):
+            if len(query) > self._MAX_QUERY_LENGTH:
+                missing.setdefault(query, [ ]).append(i)
+                continue
+            try:
+                results[i] = self._cache[query]
+                self._cache.move_to_end(query)
+                self._hits = self._hits + 1
+            except KeyError:
+                missing.setdefault(query, [ ]).append(i)
+        if not missing:
+            return results
+
+        missing_queries = list(missing)
+        for query, fingerprint in zip(missing_queries, self._fingerprinter.fingerprint_many(missing_queries)):
+            indexes = missing[query]
+            if len(query) > self._MAX_QUERY_LENGTH:
+                self._misses = self._misses + len(indexes)
+            else:
+                # Repetitions in the batch would have been found in the cache
+                self._misses = self._misses + 1
+                self._hits = self._hits + len(indexes) - 1
+                fingerprint = self.sys.intern(fingerprint)
+                self._cache[query] = fingerprint
+                if len(self._cache) > self._size:
+                    self._cache.popitem(last=False)
+                    self._evictions = self._evictions + 1
+            for i in indexes:
+                results[i] = fingerprint
+        return results
+
+    def get_stats(self) -> dict:
+        """ Return a dictionary with the cache size and counters. """
+        return {
+            'size': self._size,
+            'entries': len(self._cache),
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions
+        }
+
+#EOF
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+
+""" Compress GELF payloads before they are sent to Graylog.
+"""
+
+
+class GELF_Compressor:
+    """ Compress payloads with zlib or gzip.
+        Graylog detects the format of UDP messages by their first bytes,
+        and accepts gzip-compressed HTTP requests with the
+        Content-Encoding: gzip header.
+
+        Payloads shorter than the threshold are returned unchanged:
+        compressing them costs CPU time and saves little or nothing.
+    """
+
+
+    import zlib
+
+
+    ##  Constants
+    ##  =========
+
+    #: Allowed compression methods
+    METHODS = ('zlib', 'gzip')
+    #: Default compression level, 1 (fastest) to 9 (smallest)
+    DEFAULT_LEVEL = 6
+    #: Default minimum size of a payload to be compressed, in bytes
+    DEFAULT_THRESHOLD = 1024
+
+    #: zlib window bits that produce each format
+    _WBITS = {
+        'zlib': zlib.MAX_WBITS,
+        'gzip': zlib.MAX_WBITS | 16
+    }
+
+
+    ##  Variables
+    ##  =========
+
+    #: Compression method, one of METHODS
+    _method = None
+    #: Compression level
+    _level = None
+    #: Minimum payload size to compress, in bytes
+    _threshold = None
+    #: Window bits for the compression method
+    _wbits = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, method: str = 'zlib', level: int = DEFAULT_LEVEL, threshold: int = DEFAULT_THRESHOLD):
+        """ Validate and store the compression parameters. """
+        if method not in self.METHODS:
+            raise Exception('Invalid compression method: ' + str(method))
+        if level < 0 or level > 9:
+            raise Exception('Compression level must be between 0 and 9')
+        self._method = method
+        self._level = level
+        self._threshold = threshold
+        self._wbits = self._WBITS[method]
+
+    def get_method(self) -> str:
+        """ Return the compression method. """
+        return self._method
+
+    def compress(self, payload: bytes) -> bytes:
+        """ Return the compressed payload, regardless of the threshold. """
+        compressor = self.zlib.compressobj(self._level, self.zlib.DEFLATED, self._wbits)
+        return compressor.compress(payload) + compressor.flush()
+
+    def maybe_compress(self, payload: bytes):
+        """ Return a tuple (payload, is_compressed).
+            The payload is compressed if it is at least as long as
+            the threshold.
+        """
+        if len(payload) < self._threshold:
+            return (payload, False)
+        return (self.compress(payload), True)
+
+#EOF
@@ -6,11 +6,13 @@
 """
 
 
+from .gelf_serializer import GELF_Serializer
+
 class GELF_Message:
     """ A GELF message that supports these operations:
         * Creation, with standard and custom attributes;
         * Append a string to an existing attribute;
-        * Get as string.
+        * Get as bytes or string.
     """
 
     import socket
@@ -18,10 +20,12 @@ class GELF_Message:
     ##  Variables
     ##  =========
 
-    #: GELF message in string form.
-    _message: dict[str, str] = { }
+    #: GELF message fields.
+    _message: dict = { }
     #: Debug flags for additional output.
     debug: dict[str, bool] = { }
+    #: GELF_Template with the constant fields, or None.
+    _template = None
 
 
     ##  Constants
@@ -29,22 +33,36 @@ class GELF_Message:
 
     _CUSTOM_FIELD_PREFIX = '_'
 
+    #: Serializer shared by all messages
+    _serializer = GELF_Serializer()
+
 
     ##  Methods
     ##  =======
 
     def _get_level(self, level):
         """ Given a string that represents a severity level, return the corresponding GELF level.
-            If the level is not recognised, return 'UNKNOWN'.
+            If the level is not recognised, return None.
         """
         if level == 'ERROR':
-            return '3'
+            return 3
         elif level == 'WARNING':
-            return '4'
+            return 4
         elif level == 'NOTE':
-            return '6'
+            return 6
         else:
-            return 'UNKNOWN'
+            return None
+
+    def _get_timestamp(self, timestamp):
+        """ Return the timestamp as an int or a float, as GELF wants
+            a number of seconds with optional decimals.
+        """
+        if isinstance(timestamp, (int, float)):
+            return timestamp
+        timestamp = str(timestamp)
+        if '.' in timestamp:
+            return float(timestamp)
+        return int(timestamp)
 
     def create_field(self, is_custom, key, value):
         """ Compose a single key/value couple in a GELF line.
@@ -79,69 +97,85 @@ class GELF_Message:
             short_message,
             level,
             # Custom properties
-            extra={ }
+            extra={ },
+            template=None
         ):
         """ Compose a line of GELF metrics for Graylog.
             GELF documentation:
             https://docs.graylog.org/docs/gelf
+            If a GELF_Template is specified, version and host are
+            ignored, and the template's constant fields are used.
         """
 
         self.debug = debug
-
-        self.create_field(False, 'version', version)
-        # The hostname was set previously
-        self.create_field(False, 'host', host)
+        # Every message needs its own dictionary, as several messages
+        # can be waiting to be sent
+        self._message = { }
+        self._template = template
+
+        if template is None:
+            self.create_field(False, 'version', version)
+            # The hostname was set previously
+            self.create_field(False, 'host', host)
         # 'MariaDB Error Log' or 'MariaDB Slow Log'
         self.create_field(False, 'short_message', short_message)
-        self.create_field(False, 'timestamp', str(timestamp))
+        # GELF wants numbers for timestamp and level
+        self.create_field(False, 'timestamp', self._get_timestamp(timestamp))
         # Same levels as syslog:
         # 0=Emergency, 1=Alert, 2=Critical, 3=Error, 4=Warning, 5=Notice, 6=Informational, 7=Debug
         # https://docs.delphix.com/docs534/system-administration/system-monitoring/setting-syslog-preferences/severity-levels-for-syslog-messages
-        self.create_field(False, 'level', self._get_level(level))
+        # level is optional, so it is omitted if it is not recognised
+        gelf_level = self._get_level(level)
+        if gelf_level is not None:
+            self.create_field(False, 'level', gelf_level)
 
         # all custom fields (not mentioned in GELF specs)
         # must start with a '_'
         for key in extra:
             self.create_field(True, key, extra[key])
 
-    def to_string(self):
-        """ Return the GELF message as string. """
-        gelf_message = '{'
-
-        is_first = True
-        for key in self._message:
-            if not is_first:
-                gelf_message = gelf_message + ','
-            is_first = False
-            gelf_message = gelf_message + '"' + key + '":"' + self._message[key].replace('"', '\\"') + '"'
-
-        gelf_message = gelf_message + '}'
+    def to_bytes(self) -> bytes:
+        """ Return the GELF message as UTF-8 encoded JSON. """
+        if self._template is not None:
+            return self._template.render(self._message)
+        return self._serializer.serialize(self._message)
 
-        return gelf_message
+    def to_string(self) -> str:
+        """ Return the GELF message as string. """
+        return self.to_bytes().decode('utf-8')
 
 
     ## DEBUG METHODS
     ## =============
 
+    def _get_all_fields(self):
+        """ Return all fields, including the template's constant fields. """
+        if self._template is None:
+            return self._message
+        fields = self._template.get_fields()
+        fields.update(self._message)
+        return fields
+
     def attribute_exists(self, key):
         """ Return whether the GELF message contains the specified key. """
-        return key in self._message
+        return key in self._get_all_fields()
 
     def get_attribute_by_name(self, key, defaultValue = None):
         """ Return the specified key or None. """
-        return self._message.get(key, defaultValue)
+        return self._get_all_fields().get(key, defaultValue)
 
     def get_attribute_by_value(self, needle):
         """ Return the list of attributes with the given value. """
         key_list = [ ]
-        for key in self._message:
-            current_value = self._message[key]
+        fields = self._get_all_fields()
+        for key in fields:
+            current_value = fields[key]
             if current_value == needle:
                 key_list.append(current_value)
         return key_list
 
     def get_attribute_count(self):
         """ Return the number of attributes in the GELF message. """
-        return len(self._message)
+        return len(self._get_all_fields())
 
 #EOF
\ No newline at end of file
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+
+""" Serialize GELF messages as JSON.
+"""
+
+
+import json
+
+# orjson and ujson are optional. They are faster than the json module,
+# which is used when they are not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class GELF_Serializer:
+    """ Serialize a dictionary of GELF fields as UTF-8 encoded JSON,
+        in a single pass and with proper escaping of quotes, backslashes,
+        newlines and control characters.
+
+        The fastest available library is used: orjson, ujson, or the
+        standard json module. If a library can't encode a message
+        (for example orjson rejects lone surrogates), the message is
+        encoded again by the json module with ASCII escapes.
+    """
+
+
+    ##  Constants
+    ##  =========
+
+    #: Libraries that can be used, from the fastest
+    LIBRARIES = ('orjson', 'ujson', 'json')
+
+
+    ##  Variables
+    ##  =========
+
+    #: Name of the library in use
+    _library = None
+    #: Function that returns the JSON bytes for a dictionary
+    _encode = None
+    #: json.JSONEncoder, if the json module is in use
+    _json_encoder = None
+    #: Encoder used when the library fails
+    _encode_ascii = json.JSONEncoder(
+        separators=(',', ':'),
+        ensure_ascii=True,
+        check_circular=False
+    ).encode
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, library: str = None):
+        """ Use the specified library, or the fastest available.
+            Raise an exception if the specified library is not installed.
+        """
+        if library is None:
+            if orjson is not None:
+                library = 'orjson'
+            elif ujson is not None:
+                library = 'ujson'
+            else:
+                library = 'json'
+
+        if library == 'orjson':
+            if orjson is None:
+                raise Exception('orjson is not installed')
+            self._encode = orjson.dumps
+        elif library == 'ujson':
+            if ujson is None:
+                raise Exception('ujson is not installed')
+            self._encode = self._encode_ujson
+        elif library == 'json':
+            # The encoder is created once, with compact separators
+            self._json_encoder = json.JSONEncoder(
+                separators=(',', ':'),
+                ensure_ascii=False,
+                check_circular=False
+            )
+            self._encode = self._encode_json
+        else:
+            raise Exception('Invalid JSON library: ' + str(library))
+        self._library = library
+
+    def _encode_ujson(self, fields: dict) -> bytes:
+        """ Encode with ujson. """
+        return ujson.dumps(fields, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+    def _encode_json(self, fields: dict) -> bytes:
+        """ Encode with the json module. """
+        return self._json_encoder.encode(fields).encode('utf-8')
+
+    def get_library(self) -> str:
+        """ Return the name of the library in use. """
+        return self._library
+
+    def serialize(self, fields: dict) -> bytes:
+        """ Return the specified fields as a JSON object. """
+        try:
+            return self._encode(fields)
+        except (TypeError, ValueError, OverflowError):
+            # UnicodeEncodeError is a ValueError,
+            # orjson.JSONEncodeError is a TypeError
+            return self._encode_ascii(fields).encode('ascii')
+
+#EOF
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+
+""" GELF fields that are the same for all messages of a run.
+"""
+
+
+from .gelf_serializer import GELF_Serializer
+from .gelf_message import GELF_Message
+
+
+class GELF_Template:
+    """ Hold the GELF fields that never change during a run:
+        version, host, and optional custom fields (for example an
+        environment name). They are encoded once, when the template is
+        created, as the beginning of a JSON object.
+
+        Messages created by create_message() only contain their
+        variable fields. When a message is serialized, only those
+        fields are encoded, and they are appended to the constant bytes.
+        If a variable field has the same name as a custom field, the
+        variable field is sent instead, and the whole message is
+        encoded.
+    """
+
+
+    ##  Constants
+    ##  =========
+
+    _CUSTOM_FIELD_PREFIX = '_'
+
+
+    ##  Variables
+    ##  =========
+
+    #: Constant fields, for debug methods
+    _fields: dict = { }
+    #: Names of the custom fields, with the initial underscore
+    _custom_keys = ( )
+    #: JSON object with the constant fields, without the closing brace
+    _prefix = None
+    #: Serializer for variable fields
+    _serializer = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, version: str, host: str, extra: dict = { }, serializer: GELF_Serializer = None):
+        """ Encode the constant fields.
+            extra contains custom fields, without the initial underscore.
+        """
+        self._fields = {
+            'version': version,
+            'host': host
+        }
+        for key in extra:
+            self._fields[self._CUSTOM_FIELD_PREFIX + key] = extra[key]
+        self._custom_keys = tuple(self._CUSTOM_FIELD_PREFIX + key for key in extra)
+
+        if serializer is None:
+            serializer = GELF_Message._serializer
+        self._serializer = serializer
+        # '{"version":"1.1","host":"db1"}' becomes '{"version":"1.1","host":"db1",'
+        self._prefix = bytes(serializer.serialize(self._fields)[:-1]) + b','
+
+    def create_message(self, debug, timestamp, short_message, level, extra={ }) -> GELF_Message:
+        """ Return a GELF_Message that uses this template.
+            Arguments have the same meaning as in GELF_Message.
+        """
+        return GELF_Message(debug, None, timestamp, None, short_message, level, extra, template=self)
+
+    def get_fields(self) -> dict:
+        """ Return a copy of the constant fields. """
+        return dict(self._fields)
+
+    def render(self, fields: dict) -> bytes:
+        """ Return a JSON object with the constant fields and the
+            specified variable fields. Variable fields replace the
+            custom fields with the same name.
+        """
+        for key in self._custom_keys:
+            if key in fields:
+                # Every key must appear once in the JSON object
+                return self._serializer.serialize(dict(self._fields, **fields))
+        body = self._serializer.serialize(fields)
+        if len(body) <= 2:
+            return self._prefix[:-1] + b'}'
+        # Skip the opening brace of the variable fields, without copying them
+        return self._prefix + memoryview(body)[1:]
+
+#EOF
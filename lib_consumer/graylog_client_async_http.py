@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+
+""" Send messages to Graylog using HTTP requests, from an asyncio event loop.
+"""
+
+
+from .graylog_client import Graylog_Client
+
+
+class Graylog_Client_Async_HTTP(Graylog_Client):
+    """ Send messages to Graylog using HTTP/1.1 requests over asyncio
+        streams, without depending on an HTTP library.
+
+        Every message is sent with a separate POST request. Connections
+        are kept alive and reused: up to pool_size requests can run at
+        the same time, each on its own connection.
+
+        graylog_http_timeout is a hard limit for the whole request,
+        while graylog_http_timeout_idle limits the time to wait for
+        every part of the response. Requests that fail because of a
+        connection error are retried up to graylog_http_max_retries
+        times, waiting graylog_http_backoff_factor * 2^(n-1) seconds
+        before the retry n.
+        A reused connection closed by Graylog is replaced immediately.
+        If a gzip compressor is specified, request bodies that are long
+        enough are compressed and sent with Content-Encoding: gzip.
+    """
+
+
+    import asyncio
+
+
+    ##  Constants
+    ##  =========
+
+    #: Default maximum number of concurrent requests
+    DEFAULT_POOL_SIZE = 10
+    #: Path of the GELF HTTP input
+    _PATH = '/gelf'
+    #: HTTP headers sent with every request
+    _HEADERS = {
+        'Content-Type': 'application/json',
+        'User-Agent': 'Vettabase/mariadb-to-graylog'
+    }
+    #: HTTP headers sent with compressed requests
+    _HEADERS_GZIP = dict(_HEADERS, **{ 'Content-Encoding': 'gzip' })
+
+
+    ##  Variables
+    ##  =========
+
+    #: Tuple representing Graylog host and port
+    _destination = (None, None)
+    #: Request head, up to the Content-Length header
+    _request_head = None
+    #: Request head for compressed bodies
+    _request_head_gzip = None
+    #: HTTP requests timeout when no data is received.
+    _graylog_http_timeout_idle = None
+    #: HTTP requests timeout, hard limit.
+    _graylog_http_timeout = None
+    #: Maximum number of retries after a connection error
+    _graylog_http_max_retries = None
+    #: Base of the exponential backoff between retries, in seconds
+    _graylog_http_backoff_factor = None
+    #: Maximum number of concurrent requests
+    _pool_size = None
+    #: Bounds the concurrent requests
+    _pool_semaphore = None
+    #: Idle connections, as (reader, writer) tuples
+    _idle_connections = None
+    #: GELF_Compressor using gzip, or None to send uncompressed bodies
+    _compressor = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(
+            self, host, port=12201,
+            graylog_http_timeout_idle=None,
+            graylog_http_timeout=None,
+            graylog_http_max_retries=3,
+            graylog_http_backoff_factor=1,
+            pool_size=DEFAULT_POOL_SIZE,
+            compressor=None
+        ):
+        """ Compose the request head. """
+        if compressor is not None and compressor.get_method() != 'gzip':
+            raise Exception('Graylog only accepts gzip compression over HTTP')
+        self._compressor = compressor
+        self._destination = (host, port)
+        self._request_head = self._compose_head(self._HEADERS)
+        self._request_head_gzip = self._compose_head(self._HEADERS_GZIP)
+        self._graylog_http_timeout_idle = graylog_http_timeout_idle
+        self._graylog_http_timeout = graylog_http_timeout
+        self._graylog_http_max_retries = graylog_http_max_retries
+        self._graylog_http_backoff_factor = graylog_http_backoff_factor
+        self._pool_size = pool_size
+        self._idle_connections = [ ]
+
+    def _compose_head(self, headers: dict) -> bytes:
+        """ Return the request line and the headers that are the same
+            for every request.
+        """
+        host, port = self._destination
+        head = 'POST ' + self._PATH + ' HTTP/1.1\r\n' + 'Host: ' + host + ':' + str(port) + '\r\n'
+        for name, value in headers.items():
+            head = head + name + ': ' + value + '\r\n'
+        return head.encode('ascii')
+
+    async def open(self) -> None:
+        """ Prepare the connection pool. Connections are established
+            when they are needed.
+        """
+        self._pool_semaphore = self.asyncio.Semaphore(self._pool_size)
+
+    async def _wait_idle(self, awaitable):
+        """ Await awaitable, waiting graylog_http_timeout_idle seconds
+            at most.
+        """
+        if self._graylog_http_timeout_idle is None:
+            return await awaitable
+        return await self.asyncio.wait_for(awaitable, self._graylog_http_timeout_idle)
+
+    async def _read_response(self, reader) -> tuple:
+        """ Read a response, and return its status code and whether
+            the connection can be reused.
+            Raise an exception if the response is not valid.
+        """
+        status_line = await self._wait_idle(reader.readline())
+        if not status_line:
+            raise ConnectionResetError('Connection closed by Graylog')
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/1.') or not parts[1].isdigit():
+            raise ValueError('Invalid HTTP response: ' + repr(status_line))
+        status = int(parts[1])
+        keep_alive = parts[0] == b'HTTP/1.1'
+
+        headers = { }
+        while True:
+            line = await self._wait_idle(reader.readline())
+            if not line:
+                raise ConnectionResetError('Connection closed by Graylog')
+            if line in (b'\r\n', b'\n'):
+                break
+            name, separator, value = line.partition(b':')
+            headers[name.strip().lower()] = value.strip().lower()
+        if headers.get(b'connection') == b'close':
+            keep_alive = False
+
+        if status < 200 or status in (204, 304):
+            pass
+        elif b'content-length' in headers:
+            await self._wait_idle(reader.readexactly(int(headers[b'content-length'])))
+        elif headers.get(b'transfer-encoding') == b'chunked':
+            while True:
+                size_line = await self._wait_idle(reader.readline())
+                size = int(size_line.split(b';', 1)[0], 16)
+                if size == 0:
+                    # Skip the trailers
+                    while await self._wait_idle(reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                await self._wait_idle(reader.readexactly(size + 2))
+        else:
+            # The body ends when the connection is closed
+            while await self._wait_idle(reader.read(65536)):
+                pass
+            keep_alive = False
+        return status, keep_alive
+
+    async def _request(self, head: bytes, body: bytes) -> int:
+        """ Send a request on a pooled connection, or on a new one,
+            and return the response status code.
+            Raise OSError on connection errors, or another exception
+            if the response is not valid.
+        """
+        reused = False
+        while True:
+            if self._idle_connections:
+                reader, writer = self._idle_connections.pop()
+                reused = True
+            else:
+                reader, writer = await self._wait_idle(self.asyncio.open_connection(*self._destination))
+                reused = False
+            try:
+                writer.write(head + b'Content-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+                await self._wait_idle(writer.drain())
+                status, keep_alive = await self._read_response(reader)
+                break
+            except (OSError, self.asyncio.IncompleteReadError) as e:
+                writer.close()
+                # Graylog may close an idle connection while we reuse
+                # it: the request was not received, send it again
+                if reused and isinstance(e, (ConnectionError, self.asyncio.IncompleteReadError)):
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+        if keep_alive and not reader.at_eof():
+            self._idle_connections.append((reader, writer))
+        else:
+            writer.close()
+        return status
+
+    async def _post(self, body: bytes) -> None:
+        """ Send a request with the specified body.
+            Raise an exception if Graylog did not accept it.
+        """
+        head = self._request_head
+        if self._compressor is not None:
+            body, is_compressed = self._compressor.maybe_compress(body)
+            if is_compressed:
+                head = self._request_head_gzip
+
+        retries = 0
+        async with self._pool_semaphore:
+            while True:
+                try:
+                    if self._graylog_http_timeout is None:
+                        status = await self._request(head, body)
+                    else:
+                        status = await self.asyncio.wait_for(self._request(head, body), self._graylog_http_timeout)
+                    break
+                except (self.asyncio.TimeoutError, self.asyncio.IncompleteReadError, ValueError) as e:
+                    # TimeoutError is an OSError, but a request that
+                    # timed out may have been received
+                    raise Exception('HTTP request to Graylog failed: ' + (str(e) or 'timeout'))
+                except OSError as e:
+                    if retries >= self._graylog_http_max_retries:
+                        raise Exception('HTTP request to Graylog failed: ' + str(e))
+                    retries = retries + 1
+                    await self.asyncio.sleep(self._graylog_http_backoff_factor * 2 ** (retries - 1))
+        if status < 200 or status > 299:
+            raise Exception('Graylog answered with HTTP status ' + str(status))
+
+    async def send(self, gelf_message):
+        """ Send the specified GELF message over an HTTP request.
+            Raise an exception if Graylog did not accept it.
+        """
+        if isinstance(gelf_message, str):
+            gelf_message = gelf_message.encode('utf-8')
+        await self._post(gelf_message)
+
+    async def close(self) -> None:
+        """ Close the idle connections. """
+        while self._idle_connections:
+            reader, writer = self._idle_connections.pop()
+            writer.close()
+
+#EOF
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+
+""" Send messages to Graylog using a TCP port, from an asyncio event loop.
+"""
+
+
+from .graylog_client import Graylog_Client
+
+
+class Graylog_Client_Async_TCP(Graylog_Client):
+    """ Send messages to Graylog through an asyncio stream.
+
+        Messages are NUL-terminated frames, as with Graylog_Client_TCP.
+        Several tasks can send messages at the same time: every frame
+        is written with a single write(), and send() returns when the
+        stream buffer was drained below its limit.
+
+        If the connection is lost, the client reconnects, waiting
+        longer after every failed attempt. While it waits, send()
+        raises an exception, so the caller can try another client.
+    """
+
+
+    import asyncio
+    import time
+
+
+    ##  Constants
+    ##  =========
+
+    #: Seconds to wait before reconnecting, after the first failure
+    _RECONNECT_BACKOFF_MIN = 0.1
+    #: Maximum seconds to wait before reconnecting
+    _RECONNECT_BACKOFF_MAX = 30
+
+
+    ##  Variables
+    ##  =========
+
+    #: Tuple representing Graylog host and port
+    _destination = (None, None)
+    #: asyncio.StreamWriter connected to Graylog, or None
+    _writer = None
+    #: Bytes appended to every message
+    _frame_end = b'\0'
+    #: Seconds to wait for connections and for the buffer to drain
+    _timeout = None
+    #: Seconds to wait before the next connection attempt
+    _backoff = None
+    #: time.monotonic() of the next connection attempt
+    _next_connect = 0
+    #: Last connection or write error
+    _last_error = None
+    #: Only one task at a time can connect
+    _connect_lock = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, host, port, timeout):
+        """ Assign values to private members. Connect with open(). """
+        self._destination = (host, port)
+        self._timeout = timeout
+        self._backoff = self._RECONNECT_BACKOFF_MIN
+
+    async def open(self) -> None:
+        """ Establish a connection to Graylog.
+            Raise an exception if the connection fails: later failures
+            are handled by reconnecting, but a wrong host or port
+            should be reported immediately.
+        """
+        self._connect_lock = self.asyncio.Lock()
+        if not await self._connect():
+            raise Exception('Could not connect to Graylog via TCP: ' + str(self._last_error))
+
+    async def _connect(self) -> bool:
+        """ Connect to Graylog if we're not connected, unless we have to
+            wait before the next attempt. Return whether we're connected.
+        """
+        async with self._connect_lock:
+            if self._writer is not None:
+                return True
+            if self.time.monotonic() < self._next_connect:
+                return False
+            try:
+                reader, writer = await self.asyncio.wait_for(
+                    self.asyncio.open_connection(*self._destination),
+                    self._timeout
+                )
+            except (OSError, self.asyncio.TimeoutError) as e:
+                self._schedule_reconnection(e)
+                return False
+            self._writer = writer
+            self._backoff = self._RECONNECT_BACKOFF_MIN
+            return True
+
+    def _schedule_reconnection(self, error) -> None:
+        """ Record the error and decide when to reconnect. """
+        self._last_error = error
+        self._next_connect = self.time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self._RECONNECT_BACKOFF_MAX)
+
+    def _disconnect(self, writer, error) -> None:
+        """ Close a broken connection, unless another task already
+            replaced it.
+        """
+        writer.close()
+        if self._writer is writer:
+            self._writer = None
+            self._schedule_reconnection(error)
+
+    async def send(self, gelf_message):
+        """ Send the specified message.
+            Raise an exception if we're not connected, or if the
+            message could not be written before the timeout.
+        """
+        if isinstance(gelf_message, str):
+            gelf_message = gelf_message.encode('utf-8')
+        if not await self._connect():
+            raise Exception('Not connected to Graylog via TCP: ' + str(self._last_error))
+        writer = self._writer
+        try:
+            writer.write(gelf_message + self._frame_end)
+            await self.asyncio.wait_for(writer.drain(), self._timeout)
+        except (OSError, self.asyncio.TimeoutError) as e:
+            self._disconnect(writer, e)
+            raise Exception('Could not send message to Graylog via TCP: ' + str(e))
+
+    async def close(self) -> None:
+        """ Close the connection. """
+        if self._writer is None:
+            return
+        writer = self._writer
+        self._writer = None
+        writer.close()
+        try:
+            await self.asyncio.wait_for(writer.wait_closed(), self._timeout)
+        except (OSError, self.asyncio.TimeoutError):
+            pass
+
+#EOF
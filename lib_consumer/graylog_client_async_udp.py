@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+
+""" Send messages to Graylog using a UDP port, from an asyncio event loop.
+"""
+
+
+from .graylog_client_udp import Graylog_Client_UDP
+
+
+class Graylog_Client_Async_UDP(Graylog_Client_UDP):
+    """ Send messages to Graylog through an asyncio datagram transport.
+
+        Messages are compressed and split into GELF chunks as
+        Graylog_Client_UDP does. Sending a datagram never waits, so
+        send() is a normal method. open() must be awaited before
+        sending messages.
+    """
+
+
+    import asyncio
+
+
+    ##  Variables
+    ##  =========
+
+    #: asyncio.DatagramTransport connected to Graylog
+    _transport = None
+
+
+    ##  Methods
+    ##  =======
+
+    def _create_socket(self):
+        """ The socket is created by open(). """
+        return None
+
+    async def open(self) -> None:
+        """ Create the datagram transport.
+            Raise an exception if it can't be created.
+        """
+        loop = self.asyncio.get_running_loop()
+        self._transport, protocol = await loop.create_datagram_endpoint(
+            self.asyncio.DatagramProtocol,
+            remote_addr=self._destination
+        )
+
+    def close(self):
+        """ Close the transport. """
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def send(self, gelf_message):
+        """ Send the specified message, in one or more UDP packets.
+            Raise an exception if the message is too big to be sent
+            with the maximum number of chunks, or if open() was not
+            called.
+        """
+        if self._transport is None:
+            raise Exception('UDP transport is not open')
+        for datagram in self._get_datagrams(gelf_message):
+            self._transport.sendto(datagram)
+
+#EOF
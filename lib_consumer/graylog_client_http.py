@@ -1,25 +1,44 @@
 #!/usr/bin/env python3
 
 
-""" Send messages to Graylog using a TCP port.
+""" Send messages to Graylog using HTTP requests.
 """
 
 
+from collections import deque
+
 from .graylog_client import Graylog_Client
 
 
 class Graylog_Client_HTTP(Graylog_Client):
-    """ Send messages to Graylog using a TCP port.
+    """ Send messages to Graylog using HTTP requests.
+
+        By default every message is sent with a separate request.
+        If batch_max_messages is greater than 1, messages are queued
+        and sent together in a single request, separated by newlines.
+        This requires a GELF HTTP input with bulk receiving enabled.
+        A batch is sent when it reaches batch_max_messages or
+        batch_max_bytes, or when flush() is called (see flush_if_old()).
+        Callbacks passed to send() are only called after Graylog
+        accepted the request that contains the message.
+        If a gzip compressor is specified, request bodies that are long
+        enough are compressed and sent with Content-Encoding: gzip.
+
+        graylog_http_timeout_idle limits the time to connect and to
+        wait for every part of the response, while graylog_http_timeout
+        limits the whole request: every wait is shortened to the time
+        left, so only a Graylog that keeps sending a response very
+        slowly can exceed it. Both apply to every attempt, if the
+        request is retried after a connection error.
     """
 
 
+    import time
+    import threading
     import requests
     from requests.adapters import HTTPAdapter
     from requests.packages.urllib3.util.retry import Retry
-    # Needed to convert JSON string to dictionary
-    import json
-    # Used to implement timeouts
-    import eventlet
+    from requests.packages.urllib3.util.timeout import Timeout
 
 
     #: Graylog URL that will receive requests, including host and port.
@@ -28,8 +47,37 @@ class Graylog_Client_HTTP(Graylog_Client):
     _graylog_http_timeout_idle = None
     #: HTTP requests timeout, hard limit.
     _graylog_http_timeout = None
+    #: Timeout passed to requests, with the connect, read and total limits
+    _request_timeout = None
     #: HTTP connection configuration
     _connection = None
+    #: HTTP headers sent with every request
+    _HEADERS = {
+        'Content-Type': 'application/json',
+        'User-Agent': 'Vettabase/mariadb-to-graylog'
+    }
+
+    #: Maximum number of messages in a batch. 1 disables batching.
+    _batch_max_messages = 1
+    #: Maximum size of a batch, in bytes
+    _batch_max_bytes = None
+    #: Maximum age of the oldest message in a batch, in seconds
+    _batch_max_age = None
+    #: Messages waiting to be sent, as bytes
+    _batch = None
+    #: Callbacks to call when the batch is sent, or None,
+    #: for the message in the same position.
+    _batch_callbacks = None
+    #: Size of the messages in the batch, in bytes
+    _batch_bytes = 0
+    #: time.monotonic() of the oldest message in the batch
+    _batch_started = None
+    #: Protects the batch, as messages can be sent by several threads
+    _lock = None
+    #: GELF_Compressor using gzip, or None to send uncompressed bodies
+    _compressor = None
+    #: HTTP headers sent with compressed requests
+    _HEADERS_GZIP = dict(_HEADERS, **{ 'Content-Encoding': 'gzip' })
 
 
     def __init__(
@@ -37,10 +85,26 @@ class Graylog_Client_HTTP(Graylog_Client):
             graylog_http_timeout_idle=None,
             graylog_http_timeout=None,
             graylog_http_max_retries=3,
-            graylog_http_backoff_factor=1
+            graylog_http_backoff_factor=1,
+            batch_max_messages=1,
+            batch_max_bytes=1048576,
+            batch_max_age=1.0,
+            compressor=None
         ):
         """ Compose Graylog URL. """
+        if compressor is not None and compressor.get_method() != 'gzip':
+            raise Exception('Graylog only accepts gzip compression over HTTP')
+        self._compressor = compressor
         self._url = 'http://' + host + ':' + str(port) + '/gelf'
+        self._graylog_http_timeout_idle = graylog_http_timeout_idle
+        self._graylog_http_timeout = graylog_http_timeout
+        # Requests are sent by sender threads, so the hard limit
+        # is enforced by the socket timeouts
+        self._request_timeout = self.Timeout(
+            connect=graylog_http_timeout_idle,
+            read=graylog_http_timeout_idle,
+            total=graylog_http_timeout
+        )
 
         retry_strategy = self.Retry(
             total=graylog_http_max_retries,
@@ -51,27 +115,109 @@ class Graylog_Client_HTTP(Graylog_Client):
         self._connection.mount('https://', adapter)
         self._connection.mount('http://', adapter)
 
-    def send(self, gelf_message):
-        """ Send the specified GELF message over an HTTP request. """
-        # Set a hard timeout for the HTTP call
-        timeout = self.eventlet.Timeout(self._graylog_http_timeout)
+        self._batch_max_messages = batch_max_messages
+        self._batch_max_bytes = batch_max_bytes
+        self._batch_max_age = batch_max_age
+        self._batch = deque()
+        self._batch_callbacks = deque()
+        self._lock = self.threading.RLock()
+
+    def _post(self, body):
+        """ Send a request with the specified body.
+            Raise an exception if Graylog did not accept it.
+        """
+        headers = self._HEADERS
+        if self._compressor is not None:
+            body, is_compressed = self._compressor.maybe_compress(body)
+            if is_compressed:
+                headers = self._HEADERS_GZIP
         try:
-            self._connection.post(
+            response = self._connection.post(
                 self._url,
-                headers={
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'Vettabase/mariadb-to-graylog'
-                },
-                json=self.json.loads(gelf_message),
-                timeout=self._graylog_http_timeout_idle,
+                headers=headers,
+                data=body,
+                timeout=self._request_timeout,
                 verify=True,
                 allow_redirects=False
             )
         # requests exceptions are listed here:
         # https://docs.python-requests.org/en/latest/user/quickstart/#errors-and-exceptions
-        except Timeout as e:
-            print(str(e))
-        finally:
-            timeout.cancel()
+        except self.requests.exceptions.RequestException as e:
+            raise Exception('HTTP request to Graylog failed: ' + str(e))
+        if response.status_code < 200 or response.status_code > 299:
+            raise Exception('Graylog answered with HTTP status ' + str(response.status_code))
+
+    def send(self, gelf_message, on_sent=None):
+        """ Send the specified GELF message over an HTTP request,
+            or add it to the current batch.
+            on_sent is an optional function called without arguments
+            after Graylog accepted the message.
+            Raise an exception if the message was not sent nor queued:
+            in that case on_sent will not be called.
+        """
+        if isinstance(gelf_message, str):
+            gelf_message = gelf_message.encode('utf-8')
+
+        if self._batch_max_messages <= 1:
+            self._post(gelf_message)
+            if on_sent:
+                on_sent()
+            return
+
+        with self._lock:
+            # The queue is bounded: if the last batch could not be sent,
+            # don't accept more messages until it is sent
+            if len(self._batch) >= self._batch_max_messages:
+                self.flush()
+
+            if not self._batch:
+                self._batch_started = self.time.monotonic()
+            self._batch.append(gelf_message)
+            self._batch_callbacks.append(on_sent)
+            self._batch_bytes = self._batch_bytes + len(gelf_message) + 1
+
+            # The message is queued and on_sent will be called when the
+            # batch is sent, so don't raise from now on: a failed request
+            # leaves the batch in the queue, to be sent later
+            try:
+                if (
+                        len(self._batch) >= self._batch_max_messages
+                        or self._batch_bytes >= self._batch_max_bytes
+                    ):
+                    self.flush()
+                else:
+                    self.flush_if_old()
+            except Exception:
+                pass
+
+    def has_pending(self) -> bool:
+        """ Return whether some messages are waiting to be sent. """
+        return bool(self._batch)
+
+    def flush(self):
+        """ Send the queued messages in a single request, and call their
+            callbacks in order. If the request fails, raise an exception
+            and keep the messages in the queue.
+        """
+        with self._lock:
+            if not self._batch:
+                return
+            self._post(b'\n'.join(self._batch))
+            callbacks = self._batch_callbacks
+            self._batch = deque()
+            self._batch_callbacks = deque()
+            self._batch_bytes = 0
+            self._batch_started = None
+        for callback in callbacks:
+            if callback:
+                callback()
+
+    def flush_if_old(self):
+        """ Send the queued messages if the oldest of them is older
+            than batch_max_age.
+        """
+        with self._lock:
+            if self._batch and self.time.monotonic() - self._batch_started >= self._batch_max_age:
+                self.flush()
 
-#EOF
\ No newline at end of file
+#EOF
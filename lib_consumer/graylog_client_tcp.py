@@ -5,44 +5,247 @@
 """
 
 
+from collections import deque
+
 from .graylog_client import Graylog_Client
 
 
 class Graylog_Client_TCP(Graylog_Client):
     """ Send messages to Graylog using a TCP port.
+
+        Graylog never answers on a GELF TCP input, so the connection is
+        write-only. Messages are NUL-terminated frames, appended to a
+        buffer. The buffer is written with non-blocking writes, passing
+        as many frames as possible to a single sendmsg() call.
+        Callbacks passed to send() are called when the whole frame was
+        written to the socket.
+
+        If the connection is lost, the client reconnects, waiting
+        longer after every failed attempt. Frames that were not
+        completely written are sent again on the new connection.
+        When the buffer is full, send() waits until it has room,
+        up to the timeout. get_pressure() tells how full the buffer is,
+        so callers can slow down before that happens.
     """
 
 
     import socket
+    import select
+    import itertools
+    import threading
+    import time
+
+
+    ##  Constants
+    ##  =========
 
+    #: Default maximum size of the buffer, in bytes
+    DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+    #: Maximum number of frames written with a single sendmsg() call
+    _MAX_FRAMES_PER_WRITE = 1024
+    #: Seconds to wait before reconnecting, after the first failure
+    _RECONNECT_BACKOFF_MIN = 0.1
+    #: Maximum seconds to wait before reconnecting
+    _RECONNECT_BACKOFF_MAX = 30
+
+
+    ##  Variables
+    ##  =========
 
     #: Tuple representing Graylog host and port.
     #: Useful in case we need to reconnect.
     _destination = (None, None)
-    #: Socket used to connect Graylog.
+    #: Socket used to connect Graylog, or None when disconnected.
     _sock = None
     # Whether TCP messages should end with a NUL character.
-    # This is necessary with Graylog, but breaks netcat.
+    # This is necessary with Graylog, but breaks netcat,
+    # so without NUL messages end with a newline.
     _terminate_with_nul = True
-    # Expected length of Graylog answer
-    _answer_length = 1024
+    #: Bytes appended to every message
+    _frame_end = None
+    #: Seconds to wait for connections and for the buffer to have room
+    _timeout = None
+    #: Frames waiting to be written
+    _frames = None
+    #: Callbacks for the frames in the same position, or None
+    _callbacks = None
+    #: Bytes of the first frame that were already written
+    _offset = 0
+    #: Size of the frames in the buffer
+    _buffered_bytes = 0
+    #: Maximum size of the buffer
+    _max_buffer_bytes = None
+    #: Seconds to wait before the next connection attempt
+    _backoff = None
+    #: time.monotonic() of the next connection attempt
+    _next_connect = 0
+    #: Last connection or write error
+    _last_error = None
+    #: Only one thread at a time can use the socket and the buffer
+    _lock = None
+
 
+    ##  Methods
+    ##  =======
 
-    def __init__(self, host, port, timeout):
-        """ Establish a connection to Graylog. """
-        self._sock = self.socket.socket(self.socket.AF_INET, self.socket.SOCK_STREAM)
-        self._sock.connect((host, port))
-        self._sock.settimeout(timeout)
+    def __init__(self, host, port, timeout, max_buffer_bytes=DEFAULT_BUFFER_SIZE):
+        """ Establish a connection to Graylog.
+            Raise an exception if the connection fails: later failures
+            are handled by reconnecting, but a wrong host or port
+            should be reported immediately.
+        """
+        self._destination = (host, port)
+        self._timeout = timeout
+        self._max_buffer_bytes = max_buffer_bytes
+        self._frame_end = b'\0' if self._terminate_with_nul else b'\n'
+        self._frames = deque()
+        self._callbacks = deque()
+        self._backoff = self._RECONNECT_BACKOFF_MIN
+        self._lock = self.threading.RLock()
+        if not self._connect():
+            raise Exception('Could not connect to Graylog via TCP: ' + str(self._last_error))
 
     def __del__(self):
         """ Close connections to Graylog. """
-        self._sock.close()
+        if self._sock is not None:
+            self._sock.close()
+
+    def _connect(self) -> bool:
+        """ Connect to Graylog if we're not connected, unless we have to
+            wait before the next attempt. Return whether we're connected.
+        """
+        if self._sock is not None:
+            return True
+        if self.time.monotonic() < self._next_connect:
+            return False
+        try:
+            sock = self.socket.create_connection(self._destination, self._timeout)
+        except OSError as e:
+            self._schedule_reconnection(e)
+            return False
+        sock.setblocking(False)
+        self._sock = sock
+        # A frame that was partially written to the old connection
+        # is sent again from its beginning
+        self._offset = 0
+        return True
+
+    def _schedule_reconnection(self, error) -> None:
+        """ Record the error and decide when to reconnect. """
+        self._last_error = error
+        self._next_connect = self.time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self._RECONNECT_BACKOFF_MAX)
+
+    def _disconnect(self, error) -> None:
+        """ Close a broken connection. """
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+        self._sock = None
+        self._schedule_reconnection(error)
+
+    def _write_pending(self) -> list:
+        """ Write as many frames as the socket accepts without blocking.
+            Return the callbacks of the frames that were written.
+        """
+        done = [ ]
+        while self._frames and self._connect():
+            buffers = list(self.itertools.islice(self._frames, self._MAX_FRAMES_PER_WRITE))
+            if self._offset:
+                buffers[0] = memoryview(buffers[0])[self._offset:]
+            try:
+                written = self._sock.sendmsg(buffers)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                self._disconnect(e)
+                continue
+            self._backoff = self._RECONNECT_BACKOFF_MIN
+
+            written = written + self._offset
+            while self._frames and written >= len(self._frames[0]):
+                frame = self._frames.popleft()
+                written = written - len(frame)
+                self._buffered_bytes = self._buffered_bytes - len(frame)
+                done.append(self._callbacks.popleft())
+            self._offset = written
+        return done
+
+    def _drain(self, size: int) -> list:
+        """ Write frames, waiting up to the timeout, until the buffer
+            is not bigger than size.
+            Return the callbacks of the frames that were written.
+        """
+        deadline = self.time.monotonic() + self._timeout
+        done = self._write_pending()
+        while self._buffered_bytes > size:
+            remaining = deadline - self.time.monotonic()
+            if remaining <= 0:
+                break
+            if self._sock is None:
+                self.time.sleep(max(0, min(remaining, self._next_connect - self.time.monotonic())))
+            else:
+                self.select.select([ ], [ self._sock ], [ ], remaining)
+            done.extend(self._write_pending())
+        return done
+
+    def _run_callbacks(self, callbacks: list) -> None:
+        """ Call the callbacks of the frames that were written. """
+        for callback in callbacks:
+            if callback:
+                callback()
+
+    def send(self, gelf_message, on_sent=None):
+        """ Add the specified message to the buffer, and write as much
+            of the buffer as possible.
+            If the buffer is full, wait until it has room. Raise an
+            exception if it doesn't have room before the timeout.
+            on_sent is an optional function called without arguments
+            after the message was written.
+        """
+        if isinstance(gelf_message, str):
+            gelf_message = gelf_message.encode('utf-8')
+        frame = gelf_message + self._frame_end
+
+        with self._lock:
+            done = [ ]
+            if self._buffered_bytes + len(frame) > self._max_buffer_bytes:
+                done = self._drain(self._max_buffer_bytes - len(frame))
+                if self._buffered_bytes + len(frame) > self._max_buffer_bytes:
+                    self._run_callbacks(done)
+                    raise Exception('TCP buffer is full: ' + str(self._last_error))
+            self._frames.append(frame)
+            self._callbacks.append(on_sent)
+            self._buffered_bytes = self._buffered_bytes + len(frame)
+            done.extend(self._write_pending())
+        self._run_callbacks(done)
+
+    def write_pending(self):
+        """ Write as much of the buffer as possible without waiting.
+            This also reconnects, if it's time to try again.
+        """
+        with self._lock:
+            done = self._write_pending()
+        self._run_callbacks(done)
+
+    def flush(self):
+        """ Write the whole buffer, waiting up to the timeout.
+            Raise an exception if some messages could not be written.
+        """
+        with self._lock:
+            done = self._drain(0)
+            is_empty = not self._frames
+        self._run_callbacks(done)
+        if not is_empty:
+            raise Exception('Could not send all TCP messages to Graylog: ' + str(self._last_error))
+
+    def has_pending(self) -> bool:
+        """ Return whether some messages are waiting to be written. """
+        return bool(self._frames)
 
-    def send(self, gelf_message):
-        """ Send the specified TCP packet. """
-        if self._terminate_with_nul:
-            self._sock.sendall(gelf_message + '\0')
-        self._sock.sendall(gelf_message)
-        self._sock.recv(self._answer_length)
+    def get_pressure(self) -> float:
+        """ Return how full the buffer is, from 0 (empty) to 1 (full). """
+        return self._buffered_bytes / self._max_buffer_bytes
 
-#EOF
\ No newline at end of file
+#EOF
@@ -10,27 +10,114 @@ from .graylog_client import Graylog_Client
 
 class Graylog_Client_UDP(Graylog_Client):
     """ Send messages to Graylog using a UDP port.
+
+        The same socket is used for all messages.
+        If a compressor is specified, messages that are long enough
+        are compressed before being split into chunks.
+        Messages that don't fit a single datagram are split into
+        GELF chunks, each starting with a 12 bytes header:
+        magic bytes, message id, sequence number, sequence count.
     """
 
 
     import socket
+    import struct
+    import itertools
+    import os
+
+
+    ##  Constants
+    ##  =========
+
+    #: Bytes that identify a chunked GELF message
+    _CHUNK_MAGIC = b'\x1e\x0f'
+    #: Length of the chunk header, in bytes
+    CHUNK_HEADER_LENGTH = 12
+    #: Graylog discards messages with more chunks than this
+    _CHUNK_MAX_COUNT = 128
+    #: Default chunk size, including the header.
+    #: Fits in an Ethernet frame, even over most VPNs.
+    DEFAULT_CHUNK_SIZE = 1420
 
 
+    ##  Variables
+    ##  =========
+
     #: An immutable tuple (host, port) is assigned when the
     #: object is instantiated.
     _destination = (None, None)
+    #: Socket used to send all messages
+    _sock = None
+    #: Maximum size of a datagram, including the chunk header
+    _chunk_size = None
+    #: Generates unique message ids for chunked messages
+    _message_ids = None
+    #: GELF_Compressor, or None to send messages uncompressed
+    _compressor = None
+
 
+    ##  Methods
+    ##  =======
 
-    def __init__(self, host, port):
-        """ Assign values to private members. """
+    def __init__(self, host, port, chunk_size=DEFAULT_CHUNK_SIZE, compressor=None):
+        """ Assign values to private members and create the socket. """
+        if chunk_size <= self.CHUNK_HEADER_LENGTH:
+            raise Exception('UDP chunk size must be greater than ' + str(self.CHUNK_HEADER_LENGTH))
         self._destination = (host, port)
+        self._chunk_size = chunk_size
+        self._compressor = compressor
+        self._sock = self._create_socket()
+        # Ids only need to be unique among the chunked messages that
+        # Graylog is assembling, so a counter with a random start is enough
+        self._message_ids = self.itertools.count(
+            int.from_bytes(self.os.urandom(8), 'big') >> 1
+        )
+
+    def _create_socket(self):
+        """ Return the socket used to send all messages. """
+        return self.socket.socket(self.socket.AF_INET, self.socket.SOCK_DGRAM)
+
+    def __del__(self):
+        """ Close the socket. """
+        self.close()
+
+    def close(self):
+        """ Close the socket. """
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _get_datagrams(self, gelf_message: bytes) -> list:
+        """ Return the datagrams that contain the specified message:
+            the message itself, or its GELF chunks.
+            Raise an exception if the message is too big to be sent
+            with the maximum number of chunks.
+        """
+        if self._compressor is not None:
+            gelf_message = self._compressor.maybe_compress(gelf_message)[0]
+        if len(gelf_message) <= self._chunk_size:
+            return [ gelf_message ]
+
+        payload_size = self._chunk_size - self.CHUNK_HEADER_LENGTH
+        count = -(-len(gelf_message) // payload_size)
+        if count > self._CHUNK_MAX_COUNT:
+            raise Exception('GELF message is too big to be sent via UDP: ' + str(len(gelf_message)) + ' bytes')
+
+        message_id = next(self._message_ids) & 0xFFFFFFFFFFFFFFFF
+        message = memoryview(gelf_message)
+        datagrams = [ ]
+        for sequence in range(count):
+            header = self.struct.pack('>2sQBB', self._CHUNK_MAGIC, message_id, sequence, count)
+            offset = sequence * payload_size
+            datagrams.append(header + message[offset:offset + payload_size])
+        return datagrams
 
     def send(self, gelf_message):
-        """ Send the specified UDP packet. """
-        self.socket.socket(self.socket.AF_INET, self.socket.SOCK_DGRAM).sendto(
-            # python3: bytes(gelf_message, 'utf-8'),
-            gelf_message,
-            self._destination
-        )
+        """ Send the specified message, in one or more UDP packets.
+            Raise an exception if the message is too big to be sent
+            with the maximum number of chunks.
+        """
+        for datagram in self._get_datagrams(gelf_message):
+            self._sock.sendto(datagram, self._destination)
 
-#EOF
\ No newline at end of file
+#EOF
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+
+""" Wait for changes to files with Linux inotify.
+"""
+
+
+class Inotify_Watcher:
+    """ Watch files with inotify, through ctypes, so that the caller
+        can sleep until a file changes instead of polling it.
+
+        Files are watched by inode: if a file is moved or deleted, its
+        watch follows the old file. The caller can remove_watch() and
+        add_watch() the path again when a new file is created.
+
+        Several files can be watched with add_watch(), and
+        wait_for_events() tells which of them changed. An event loop
+        can wait until fileno() is readable, and call read_events().
+    """
+
+
+    import os
+    import sys
+    import ctypes
+    import ctypes.util
+    import select
+    import struct
+
+
+    ##  Constants
+    ##  =========
+
+    #: Event masks, from <sys/inotify.h>
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_IGNORED = 0x00008000
+    #: inotify_init1() flags
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+
+    #: Watched events. IN_ATTRIB is included because
+    #: deleting a file that we keep open only changes its link count:
+    #: IN_DELETE_SELF is only sent when the file is closed.
+    _WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+
+    #: struct inotify_event, without the name that follows it
+    _EVENT_HEADER = struct.Struct('iIII')
+    #: Size of a read from the inotify descriptor
+    _READ_SIZE = 4096
+
+
+    ##  Variables
+    ##  =========
+
+    #: libc, loaded with ctypes
+    _libc = None
+    #: inotify file descriptor
+    _fd = None
+
+
+    ##  Methods
+    ##  =======
+
+    @staticmethod
+    def is_supported() -> bool:
+        """ Return whether inotify can be used on this system. """
+        if not Inotify_Watcher.sys.platform.startswith('linux'):
+            return False
+        try:
+            libc = Inotify_Watcher.ctypes.CDLL(Inotify_Watcher.ctypes.util.find_library('c') or 'libc.so.6')
+            return hasattr(libc, 'inotify_init1')
+        except OSError:
+            return False
+
+    def __init__(self):
+        """ Create an inotify instance.
+            Raise an exception if inotify is not available.
+        """
+        try:
+            self._libc = self.ctypes.CDLL(self.ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError):
+            raise Exception('inotify is not available on this system')
+        self._fd = init(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self._fd < 0:
+            raise Exception('Could not initialize inotify: ' + self.os.strerror(self.ctypes.get_errno()))
+
+    def __del__(self):
+        """ Close the inotify descriptor. """
+        self.close()
+
+    def close(self) -> None:
+        """ Stop watching and close the inotify descriptor. """
+        if self._fd is not None:
+            # Forget the descriptor first, in case a signal handler
+            # closes the watcher again while it's being closed
+            fd = self._fd
+            self._fd = None
+            self.os.close(fd)
+
+    def add_watch(self, path: str) -> int:
+        """ Watch the file at the specified path, besides the files
+            that are already watched, and return its watch descriptor.
+            Raise an exception if the file can't be watched.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, self.os.fsencode(path), self._WATCH_MASK)
+        if wd < 0:
+            raise Exception('Could not watch ' + path + ': ' + self.os.strerror(self.ctypes.get_errno()))
+        return wd
+
+    def remove_watch(self, wd: int) -> None:
+        """ Stop watching the file with the specified watch descriptor.
+            The watch may be already removed by the kernel, if the
+            file was deleted.
+        """
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def fileno(self) -> int:
+        """ Return the inotify descriptor, which is readable when
+            there are events.
+        """
+        return self._fd
+
+    def wait_for_events(self, timeout: float = None) -> dict:
+        """ Wait until a watched file changes, or until timeout
+            seconds pass.
+            Return a dictionary with the events that happened to each
+            file, ORed together, by watch descriptor. It's empty on
+            timeout.
+        """
+        readable, writable, errors = self.select.select([ self._fd ], [ ], [ ], timeout)
+        if not readable:
+            return { }
+        return self.read_events()
+
+    def read_events(self) -> dict:
+        """ Return the events that happened, as wait_for_events()
+            does, without waiting.
+        """
+        events = { }
+        while True:
+            try:
+                data = self.os.read(self._fd, self._READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, event_mask, cookie, name_length = self._EVENT_HEADER.unpack_from(data, offset)
+                events[wd] = events.get(wd, 0) | event_mask
+                offset = offset + self._EVENT_HEADER.size + name_length
+        return events
+
+#EOF
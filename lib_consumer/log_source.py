@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+
+""" A sourcelog consumed by the consuming loops.
+"""
+
+
+from typing import Optional
+
+from .eventlog import Eventlog
+from .block_reader import Block_Reader
+from .source_identity import Source_Identity, Source_Position
+from .inotify_watcher import Inotify_Watcher
+from .error_log_parser import Error_Log_Parser
+from .error_log_formatter import Error_Log_Formatter
+from .multiline_assembler import Multiline_Assembler
+from .slow_log_parser import Slow_Log_Parser
+from .slow_log_formatter import Slow_Log_Formatter
+
+
+class Log_Source:
+    """ An Error Log or a Slow Log, consumed alone (--log) or together
+        with other sourcelogs (--config).
+
+        Every source has its own reader, Eventlog, parser state and
+        Source_Identity. consume() reads the lines that were written
+        since the last call, without waiting, and passes the complete
+        entries to a put(message, position) function. Rotated and
+        truncated sourcelogs are followed.
+
+        The caller decides when to call consume(), for example when
+        an Inotify_Watcher reports that the file changed.
+    """
+
+
+    import os
+
+
+    ##  Constants
+    ##  =========
+
+    #: Types of sourcelogs
+    TYPES = ('ERROR', 'SLOW')
+
+
+    ##  Variables
+    ##  =========
+
+    #: Name of the source, for messages
+    _name = None
+    #: 'ERROR' or 'SLOW'
+    _type = None
+    #: Path of the sourcelog
+    _path = None
+    #: Block_Reader of the file we're reading
+    _reader = None
+    #: Source_Identity of the file we're reading, or None if it was
+    #: not computed yet
+    _identity = None
+    #: Eventlog of this source
+    _eventlog = None
+    #: Inotify_Watcher that watches the file, or None
+    _watcher = None
+    #: Watch descriptor of the file, or None
+    _wd = None
+    #: Set when the path points to a new file. The old file is read
+    #: until the end before opening the new one.
+    _replaced = False
+    #: Set when the path doesn't exist
+    _missing = False
+    #: Debug flags
+    _debug = None
+
+    # Error Log
+
+    #: Parses Error Log lines
+    _error_log_parser = None
+    #: Composes GELF messages from Error Log entries
+    _error_log_formatter = None
+    #: Collects the continuation lines of the pending entry
+    _multiline = None
+    #: GELF message of the pending entry, or None
+    _message = None
+    #: The pending entry is sent when no lines were read
+    #: for this number of seconds
+    _flush_idle = None
+
+    # Slow Log
+
+    #: Parses Slow Log lines
+    _slow_log_parser = None
+    #: Composes GELF messages from Slow Log entries
+    _slow_log_formatter = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, name: str, log_type: str, path: str, eventlog: Eventlog, settings: dict):
+        """ Open the sourcelog.
+            settings is a dictionary with these keys: timestamp_decoder,
+            error_log_formatter, slow_log_formatter, multiline_max_size,
+            flush_idle (in seconds), debug.
+            Raise an exception if the sourcelog can't be opened.
+        """
+        if log_type not in self.TYPES:
+            raise Exception('Invalid sourcelog type: ' + str(log_type))
+        self._name = name
+        self._type = log_type
+        self._path = path
+        self._eventlog = eventlog
+        self._debug = settings['debug']
+        if log_type == 'ERROR':
+            self._error_log_parser = Error_Log_Parser(settings['timestamp_decoder'])
+            self._error_log_formatter = settings['error_log_formatter']
+            self._multiline = Multiline_Assembler(settings['multiline_max_size'])
+            self._flush_idle = settings['flush_idle']
+        else:
+            self._slow_log_parser = Slow_Log_Parser(settings['timestamp_decoder'])
+            self._slow_log_formatter = settings['slow_log_formatter']
+        try:
+            self._reader = Block_Reader(path)
+        except OSError:
+            raise Exception('Could not open sourcelog: ' + path)
+
+    def close(self) -> None:
+        """ Close the sourcelog. The Eventlog is closed by the caller. """
+        if self._reader is not None:
+            self._reader.close()
+
+    def get_name(self) -> str:
+        """ Return the name of the source. """
+        return self._name
+
+    def get_path(self) -> str:
+        """ Return the path of the sourcelog. """
+        return self._path
+
+    def get_eventlog(self) -> Eventlog:
+        """ Return the Eventlog of the source. """
+        return self._eventlog
+
+    def is_missing(self) -> bool:
+        """ Return whether the sourcelog path didn't exist when
+            consume() last checked it.
+        """
+        return self._missing
+
+    def watch(self, watcher: Optional[Inotify_Watcher]) -> None:
+        """ Watch the sourcelog with watcher, or stop watching it
+            if watcher is None.
+            Raise an exception if the file can't be watched.
+        """
+        self._watcher = watcher
+        self._wd = None
+        if watcher is not None:
+            self._wd = watcher.add_watch(self._path)
+
+    def get_watch(self) -> Optional[int]:
+        """ Return the watch descriptor of the sourcelog, or None. """
+        return self._wd
+
+    def get_reader(self) -> Block_Reader:
+        """ Return the Block_Reader of the file we're reading, which
+            may be a rotated file. Used by the catch-up mode to move
+            the reader after the scanned region.
+        """
+        return self._reader
+
+    def _get_identity(self) -> Source_Identity:
+        """ Return the Source_Identity of the file we're reading.
+            While the file is smaller than the head used to identify
+            it, the identity is computed again, to cover the new bytes.
+        """
+        if self._identity is None or not self._identity.is_complete():
+            self._identity = Source_Identity.of_file(self._reader.fileno())
+        return self._identity
+
+    def get_position(self, offset: Optional[int] = None) -> Source_Position:
+        """ Return the position of the specified offset in the file
+            we're reading. By default, the offset we're currently reading.
+        """
+        if offset is None:
+            offset = self._reader.tell()
+        return Source_Position(offset, self._get_identity())
+
+    def resume(self) -> None:
+        """ Continue from the offset read from the Eventlog, if any.
+            If the sourcelog was rotated while we were not running, the
+            rotated file is looked for in the same directory, and read
+            from the offset before the new file. If it's not found,
+            the new file is read from the beginning.
+        """
+        offset = self._eventlog.get_offset()
+        if not offset:
+            return
+        identity = self._eventlog.get_identity()
+        # Logged by an older version if identity is None: we can only
+        # hope that the file was not replaced
+        if identity is None or identity.matches(self._reader.fileno()):
+            if offset <= self.os.fstat(self._reader.fileno()).st_size:
+                self._reader.seek(offset)
+            return
+        rotated_path = identity.find_file(self.os.path.dirname(self.os.path.abspath(self._path)))
+        if rotated_path is None:
+            if self._debug['LOG_PARSER']:
+                print(self._name + ': the sourcelog was replaced and the old file was not found, reading the new file')
+            return
+        self._reader.close()
+        self._reader = Block_Reader(rotated_path)
+        self._reader.seek(offset)
+        self._identity = identity
+        self._replaced = True
+
+    def _get_change(self) -> Optional[str]:
+        """ Compare the sourcelog path with the file we're reading.
+            Return 'MISSING' if the path doesn't exist, 'REPLACED' if
+            it's a different file, 'TRUNCATED' if it's smaller than
+            the position we've read, or None.
+        """
+        try:
+            path_stat = self.os.stat(self._path)
+        except FileNotFoundError:
+            return 'MISSING'
+        file_stat = self.os.fstat(self._reader.fileno())
+        if (path_stat.st_dev, path_stat.st_ino) != (file_stat.st_dev, file_stat.st_ino):
+            return 'REPLACED'
+        if file_stat.st_size < self._reader.tell():
+            return 'TRUNCATED'
+        return None
+
+    def _reopen(self) -> None:
+        """ Read the sourcelog path from the beginning. """
+        old_reader = self._reader
+        self._reader = Block_Reader(self._path)
+        self._identity = None
+        old_reader.close()
+        if self._watcher is not None:
+            self._watcher.remove_watch(self._wd)
+            self._wd = self._watcher.add_watch(self._path)
+        self._replaced = False
+
+    def flush(self, put) -> None:
+        """ put() the pending entry, if any, ending at the current
+            position.
+        """
+        if self._type == 'ERROR':
+            if self._message is None:
+                return
+            self._error_log_formatter.add_continuation(self._message, self._multiline)
+            self._multiline.reset()
+            message = self._message
+            self._message = None
+            put(message, self.get_position())
+        else:
+            entry = self._slow_log_parser.flush()
+            if entry is not None:
+                put(self._slow_log_formatter.format(entry, self._debug), self.get_position())
+
+    def _process_error_log_line(self, line: str, put) -> None:
+        """ Parse an Error Log line. If it starts an entry, put() the
+            previous one and compose a message for the new one,
+            otherwise add it to the continuation lines.
+        """
+        record = self._error_log_parser.parse(line)
+        if record is None:
+            # Lines that precede the first entry are dropped
+            if self._message is not None:
+                self._multiline.append(line.rstrip())
+            return
+        if self._message is not None:
+            # The previous entry ends where this line starts
+            self._error_log_formatter.add_continuation(self._message, self._multiline)
+            put(self._message, self.get_position(self._reader.get_line_start()))
+        self._multiline.start()
+        self._message = self._error_log_formatter.format(record, self._debug)
+        if self._debug['LOG_PARSER']:
+            print(str(record))
+
+    def _process_slow_log_line(self, line: str, put) -> None:
+        """ Parse a Slow Log line, and put() the previous entry if
+            this line starts a new one.
+        """
+        entry = self._slow_log_parser.feed(line)
+        if entry is not None:
+            # The entry ends where this line starts
+            put(self._slow_log_formatter.format(entry, self._debug), self.get_position(self._reader.get_line_start()))
+
+    def _read_lines(self, put, follow: bool, max_lines: Optional[int] = None) -> int:
+        """ Process the lines that were written since the last read,
+            up to max_lines lines, and return their number.
+            Unless we follow the sourcelog, a last line without a
+            newline is processed too.
+        """
+        lines = 0
+        while max_lines is None or lines < max_lines:
+            line = self._reader.readline(allow_partial=not follow)
+            if line is None:
+                break
+            lines = lines + 1
+            line = line.rstrip()
+            if self._debug['LOG_LINES']:
+                print(line)
+            if self._type == 'ERROR':
+                self._process_error_log_line(line, put)
+            else:
+                self._process_slow_log_line(line, put)
+        return lines
+
+    def skip_lines(self, max_lines: int, follow: bool) -> int:
+        """ Read up to max_lines lines without processing them, and
+            return their number. Used to implement --offset.
+        """
+        lines = 0
+        while lines < max_lines:
+            if self._reader.readline(allow_partial=not follow) is None:
+                break
+            lines = lines + 1
+        return lines
+
+    def get_flush_wait(self) -> Optional[float]:
+        """ Return the number of seconds after which the pending
+            Error Log entry must be sent if no lines are written,
+            or None if there is no pending entry.
+        """
+        if self._message is None:
+            return None
+        return self._flush_idle - self._multiline.get_idle_time()
+
+    def consume(self, put, follow: bool, max_lines: Optional[int] = None) -> bool:
+        """ Read the new lines of the sourcelog, and call
+            put(message, position) for every complete entry. position
+            is a Source_Position.
+            If follow is False, we're going to stop: the last entry
+            is sent too. Otherwise, the last Error Log entry is only
+            sent when no lines were read for flush_idle seconds, and
+            rotated or truncated sourcelogs are followed.
+            If max_lines is specified, return True after reading
+            max_lines lines, even if there are more: the pending entry
+            is not sent, and the caller should call consume() again
+            soon, or flush(). Otherwise return False.
+        """
+        lines = 0
+        while True:
+            if max_lines is None:
+                self._read_lines(put, follow)
+            else:
+                lines = lines + self._read_lines(put, follow, max_lines - lines)
+                if lines >= max_lines:
+                    return True
+            if self._replaced:
+                self.flush(put)
+                self._reopen()
+                continue
+            if not follow:
+                self.flush(put)
+                return False
+            change = self._get_change()
+            self._missing = change == 'MISSING'
+            if change == 'REPLACED':
+                # Read what was written to the old file after our last
+                # read, then open the new file
+                self._replaced = True
+                continue
+            if change == 'TRUNCATED':
+                self.flush(put)
+                self._reader.seek(0)
+                self._identity = None
+                continue
+            break
+
+        # The server writes Slow Log entries at once, so at the end
+        # of the file the last entry is complete
+        flush_wait = self.get_flush_wait()
+        if self._type == 'SLOW' or (flush_wait is not None and flush_wait <= 0):
+            self.flush(put)
+        return False
+
+#EOF
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+
+""" Collect the continuation lines of a multiline log entry.
+"""
+
+
+class Multiline_Assembler:
+    """ Collect the lines that follow the first line of an entry, like
+        stack traces or InnoDB monitor output, and join them once when
+        the entry is complete.
+
+        Appending each line to a string would copy the whole text for
+        every line. Lines are kept in a list instead, and joined by
+        get_text().
+
+        The text is capped at a maximum size. Lines that don't fit
+        are dropped and counted, so that a runaway dump can't exhaust
+        the memory.
+    """
+
+
+    import time
+
+
+    ##  Constants
+    ##  =========
+
+    #: Default maximum size of the continuation text, in characters
+    DEFAULT_MAX_SIZE = 64 * 1024
+
+
+    ##  Variables
+    ##  =========
+
+    #: Maximum size of the continuation text, in characters
+    _max_size = None
+    #: Continuation lines of the current entry
+    _lines = None
+    #: Size of the collected lines, including separators
+    _size = 0
+    #: Number of lines dropped because of _max_size
+    _dropped_lines = 0
+    #: time.monotonic() of the last line, or None if there is no entry
+    _last_line_time = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        """ Collect up to max_size characters of continuation text
+            per entry.
+        """
+        self._max_size = max_size
+        self.start()
+
+    def start(self) -> None:
+        """ Start a new entry, forgetting the lines of the previous one. """
+        self._lines = [ ]
+        self._size = 0
+        self._dropped_lines = 0
+        self._last_line_time = self.time.monotonic()
+
+    def reset(self) -> None:
+        """ Forget the current entry. Call it when an entry is sent. """
+        self.start()
+        self._last_line_time = None
+
+    def append(self, line: str) -> bool:
+        """ Add a continuation line to the current entry.
+            Return False if the line was dropped because the entry is
+            too big.
+        """
+        self._last_line_time = self.time.monotonic()
+        size = self._size + len(line) + 1
+        if self._dropped_lines > 0 or size > self._max_size:
+            self._dropped_lines = self._dropped_lines + 1
+            return False
+        self._lines.append(line)
+        self._size = size
+        return True
+
+    def has_lines(self) -> bool:
+        """ Return whether the current entry has continuation lines. """
+        return len(self._lines) > 0 or self._dropped_lines > 0
+
+    def get_text(self) -> str:
+        """ Return the continuation lines, separated by newlines. """
+        return '\n'.join(self._lines)
+
+    def get_dropped_lines(self) -> int:
+        """ Return the number of lines that didn't fit in the entry. """
+        return self._dropped_lines
+
+    def get_idle_time(self) -> float:
+        """ Return the number of seconds since the last line of the
+            current entry was added, or 0 if there is no entry.
+        """
+        if self._last_line_time is None:
+            return 0
+        return self.time.monotonic() - self._last_line_time
+
+#EOF
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+
+""" Fingerprint queries with a long-lived pt-fingerprint process.
+"""
+
+
+from collections import deque
+
+
+class PT_Fingerprint_Coprocess:
+    """ Keep one pt-fingerprint process running and send it queries
+        over its standard input, instead of starting a new process
+        (and a Perl interpreter) for every query.
+
+        pt-fingerprint reads queries separated by ";\\n" from its input
+        and writes one fingerprint per line. Its output is connected
+        to a pseudo-terminal, so that Perl flushes every line instead
+        of buffering the output until it exits.
+
+        With fingerprint_many(), several queries are sent before their
+        results are read: the consumer uses it for the Slow Log entries
+        found by the catch-up mode. If the process dies or doesn't
+        answer within the timeout, it is restarted: the query that
+        failed is fingerprinted by the fallback object, and the queries
+        that were still pending are sent to the new process.
+
+        Queries that pt-fingerprint would silently skip (those that
+        don't start with a word after removing comment lines) and
+        administrator commands, which are returned as they are and may
+        contain newlines, are always handled by the fallback object.
+    """
+
+
+    import os
+    import re
+    import pty
+    import tty
+    import time
+    import select
+    import subprocess
+
+
+    ##  Constants
+    ##  =========
+
+    #: Separator between queries, in pt-fingerprint input
+    _QUERY_SEPARATOR = ';\n'
+    #: pt-fingerprint removes these lines before checking if
+    #: the query starts with a word
+    _RE_COMMENT_LINE = re.compile(r'^#.+$', re.MULTILINE)
+    _RE_STARTS_WITH_WORD = re.compile(r'\s*\w')
+    _RE_ADMIN_COMMAND = re.compile(r'administrator command: ')
+    #: Maximum number of bytes read or written at once
+    _CHUNK_SIZE = 65536
+
+
+    ##  Variables
+    ##  =========
+
+    #: Path of pt-fingerprint
+    _path = None
+    #: Seconds to wait for a fingerprint
+    _timeout = None
+    #: Maximum number of queries sent before reading their results
+    _max_pending = None
+    #: Object used when pt-fingerprint can't be used.
+    #: It must have a fingerprint() method.
+    _fallback = None
+    #: pt-fingerprint process
+    _process = None
+    #: Master side of the pseudo-terminal that receives the output
+    _output_fd = None
+    #: Output received but not collected yet
+    _output_buffer = None
+    #: Queries whose results were not read yet, in submission order.
+    #: Each item is a (query, result) tuple. result is None if the
+    #: query was sent to pt-fingerprint.
+    _pending = None
+    #: Number of times the process was restarted
+    _restarts = 0
+    #: Number of queries handled by the fallback object
+    _fallbacks = 0
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, fallback, path='./pt-fingerprint', timeout=1.0, max_pending=64):
+        """ Start pt-fingerprint.
+            Raise an exception if it can't be started.
+        """
+        self._path = path
+        self._timeout = timeout
+        self._max_pending = max_pending
+        self._fallback = fallback
+        self._output_buffer = bytearray()
+        self._pending = deque()
+        self._start()
+
+    def __del__(self):
+        """ Stop pt-fingerprint. """
+        self.close()
+
+    def _start(self) -> None:
+        """ Start a pt-fingerprint process. """
+        master_fd, slave_fd = self.pty.openpty()
+        try:
+            # No newline translation
+            self.tty.setraw(slave_fd)
+            self._process = self.subprocess.Popen(
+                [ self._path ],
+                stdin=self.subprocess.PIPE,
+                stdout=slave_fd,
+                stderr=self.subprocess.DEVNULL,
+                close_fds=True
+            )
+        except OSError as e:
+            self.os.close(master_fd)
+            raise Exception('Could not start pt-fingerprint: ' + str(e))
+        finally:
+            self.os.close(slave_fd)
+        self._output_fd = master_fd
+        self.os.set_blocking(self._process.stdin.fileno(), False)
+        self._output_buffer.clear()
+
+    def _stop(self) -> None:
+        """ Kill the pt-fingerprint process, if it is running. """
+        if self._process is None:
+            return
+        try:
+            self._process.kill()
+            self._process.wait()
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self.os.close(self._output_fd)
+        self._process = None
+        self._output_fd = None
+
+    def _restart(self) -> None:
+        """ Restart pt-fingerprint and send it the pending queries again.
+            If this fails, pending queries are fingerprinted by the
+            fallback object.
+        """
+        self._stop()
+        self._restarts = self._restarts + 1
+        try:
+            self._start()
+            for query, result in self._pending:
+                if result is None and not self._write(query):
+                    raise Exception('pt-fingerprint is not accepting queries')
+        except Exception:
+            self._stop()
+            for i in range(len(self._pending)):
+                query, result = self._pending[i]
+                if result is None:
+                    self._pending[i] = (query, self._use_fallback(query))
+
+    def _read_available(self) -> bool:
+        """ Read the available output without blocking.
+            Return False if the process closed its output.
+        """
+        try:
+            data = self.os.read(self._output_fd, self._CHUNK_SIZE)
+        except OSError:
+            # EIO: the process exited
+            return False
+        if not data:
+            return False
+        self._output_buffer += data
+        return True
+
+    def _write(self, query: str) -> bool:
+        """ Send a query to pt-fingerprint. While the input is full,
+            read the output, to avoid that both processes wait for
+            each other. Return whether the query was sent in time.
+        """
+        # With --query, pt-fingerprint removes a trailing newline.
+        # A separator inside the query would split it.
+        if query.endswith('\n'):
+            query = query[:-1]
+        data = (query.replace(self._QUERY_SEPARATOR, '; \n') + self._QUERY_SEPARATOR).encode('utf-8')
+        input_fd = self._process.stdin.fileno()
+        view = memoryview(data)
+        deadline = self.time.monotonic() + self._timeout
+        while view:
+            remaining = deadline - self.time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, writable, broken = self.select.select([ self._output_fd ], [ input_fd ], [ ], remaining)
+            if readable and not self._read_available():
+                return False
+            if writable:
+                try:
+                    written = self.os.write(input_fd, view[:self._CHUNK_SIZE])
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    return False
+                view = view[written:]
+        return True
+
+    def _read_line(self):
+        """ Return the next line of output, or None if it is not
+            received within the timeout.
+        """
+        deadline = self.time.monotonic() + self._timeout
+        while True:
+            position = self._output_buffer.find(b'\n')
+            if position > -1:
+                line = bytes(self._output_buffer[:position])
+                del self._output_buffer[:position + 1]
+                return line.decode('utf-8', 'replace')
+            remaining = deadline - self.time.monotonic()
+            if remaining <= 0:
+                return None
+            readable, writable, broken = self.select.select([ self._output_fd ], [ ], [ ], remaining)
+            if readable and not self._read_available():
+                return None
+
+    def _can_send(self, query: str) -> bool:
+        """ Return whether pt-fingerprint will return a fingerprint for
+            this query, on a single line.
+        """
+        if self._RE_ADMIN_COMMAND.match(query):
+            return False
+        return bool(self._RE_STARTS_WITH_WORD.match(self._RE_COMMENT_LINE.sub('', query)))
+
+    def _use_fallback(self, query: str) -> str:
+        """ Fingerprint a query with the fallback object. """
+        self._fallbacks = self._fallbacks + 1
+        return self._fallback.fingerprint(query)
+
+    def _submit(self, query: str) -> None:
+        """ Send a query to pt-fingerprint without waiting for the result. """
+        if not self._can_send(query):
+            self._pending.append((query, self._use_fallback(query)))
+            return
+
+        if self._process is None:
+            self._restart()
+        if self._process is not None and self._write(query):
+            self._pending.append((query, None))
+            return
+
+        self._pending.append((query, self._use_fallback(query)))
+        self._restart()
+
+    def _collect(self) -> str:
+        """ Return the fingerprint of the oldest pending query. """
+        query, result = self._pending.popleft()
+        if result is not None:
+            return result
+
+        line = self._read_line()
+        if line is None:
+            # The process died or is stuck on this query
+            result = self._use_fallback(query)
+            self._restart()
+            return result
+        return line
+
+    def fingerprint(self, query: str) -> str:
+        """ Return the fingerprint of the specified query. """
+        self._submit(query)
+        return self._collect()
+
+    def fingerprint_many(self, queries) -> list:
+        """ Return the fingerprints of a list of queries, in the same order.
+            Up to max_pending queries are sent before their results
+            are read.
+        """
+        results = [ ]
+        for query in queries:
+            if len(self._pending) >= self._max_pending:
+                results.append(self._collect())
+            self._submit(query)
+        while self._pending:
+            results.append(self._collect())
+        return results
+
+    def get_stats(self) -> dict:
+        """ Return a dictionary with the process counters. """
+        return {
+            'restarts': self._restarts,
+            'fallbacks': self._fallbacks,
+            'pending': len(self._pending)
+        }
+
+    def close(self) -> None:
+        """ Stop pt-fingerprint. Pending results are lost. """
+        self._pending.clear()
+        self._stop()
+
+#EOF
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+
+""" Native query fingerprinting.
+    Produces the same output as pt-fingerprint, without spawning
+    a Perl process for every query.
+"""
+
+
+class Query_Fingerprint:
+    """ Turn a query into its fingerprint: literals and comments are
+        replaced or removed, IN() and VALUES() lists are collapsed,
+        whitespace is normalised and the query is lowercased.
+
+        The rules and their quirks are the ones of pt-fingerprint
+        (QueryRewriter::fingerprint), for example numbers embedded in
+        identifiers are replaced too: t1 becomes t?.
+        Each rule is a precompiled pattern that runs in a single pass
+        over the query. Rules that can't match a query (for example,
+        the string rules for a query without quotes) are skipped.
+    """
+
+
+    import re
+
+
+    ##  Constants
+    ##  =========
+
+    #: Queries that are returned as a constant string
+    _RE_MYSQLDUMP = re.compile(r'SELECT /\*!40001 SQL_NO_CACHE \*/ \* FROM `')
+    _RE_PERCONA_TOOLKIT = re.compile(r'/\*\w+\.\w+:[0-9]/[0-9]\*/')
+    #: Queries that are returned as they are
+    _RE_ADMIN_COMMAND = re.compile(r'administrator command: ')
+    #: Stored procedure calls are returned without arguments
+    _RE_CALL = re.compile(r'\s*(call\s+\S+)\(', re.IGNORECASE)
+    #: Multi-row INSERTs are shortened to the first row
+    _RE_MULTI_ROW_INSERT = re.compile(
+        r'((?:INSERT|REPLACE)(?: IGNORE)?\s+INTO.+?VALUES\s*\(.*?\))\s*,\s*\(',
+        re.IGNORECASE | re.DOTALL
+    )
+    #: USE statements only differ by database name
+    _RE_USE = re.compile(r'use \S+(?=\n?\Z)', re.IGNORECASE)
+
+    #: Comments. Executable comments (/*! ... */) are not removed
+    _RE_MULTI_LINE_COMMENT = re.compile(r'/\*[^!].*?\*/', re.DOTALL)
+    _RE_SINGLE_LINE_COMMENT = re.compile(r'(?:--|#)[^\'"\r\n]*(?=[\r\n]|\Z)')
+
+    #: Escaped quotes and backslashes
+    _RE_ESCAPED_SINGLE_QUOTE = re.compile(r"([^\\])(\\')", re.DOTALL)
+    _RE_ESCAPED_DOUBLE_QUOTE = re.compile(r'([^\\])(\\")', re.DOTALL)
+    _RE_ESCAPES = (
+        re.compile(r'\\\\'),
+        re.compile(r"\\'"),
+        re.compile(r'\\"')
+    )
+    #: Quoted strings
+    _RE_DOUBLE_QUOTED = re.compile(r'([^\\])(".*?[^\\]?")', re.DOTALL)
+    _RE_SINGLE_QUOTED = re.compile(r"([^\\])('.*?[^\\]?')", re.DOTALL)
+    #: Other literals
+    _RE_BOOLEAN = re.compile(r'\bfalse\b|\btrue\b', re.IGNORECASE)
+    _RE_NUMBER = re.compile(r'[0-9+-][0-9a-f.xb+-]*')
+    #: Leftovers of literals, like the x in x'FF'
+    _RE_LITERAL_PREFIX = re.compile(r'[xb.+-]\?')
+
+    _RE_WHITESPACE = re.compile(r'[ \n\t\r\f]+')
+    _RE_NULL = re.compile(r'\bnull\b')
+    _RE_LISTS = re.compile(r'\b(in|values?)(?:[\s,]*\([\s?,]*\))+')
+    _RE_UNION = re.compile(r'\b(select\s.*?)(?:(\sunion(?:\sall)?)\s\1)+')
+    _RE_LIMIT = re.compile(r'\blimit \?(?:, ?\?| offset \?)?')
+    _RE_ORDER_BY = re.compile(r'\border by ')
+    _RE_ASC = re.compile(r'(.+?)\s+asc')
+
+
+    ##  Methods
+    ##  =======
+
+    def fingerprint(self, query: str) -> str:
+        """ Return the fingerprint of the specified query. """
+        if self._RE_MYSQLDUMP.match(query):
+            return 'mysqldump'
+        if self._RE_PERCONA_TOOLKIT.search(query):
+            return 'percona-toolkit'
+        if self._RE_ADMIN_COMMAND.match(query):
+            return query
+        match = self._RE_CALL.match(query)
+        if match:
+            return match.group(1).lower()
+        match = self._RE_MULTI_ROW_INSERT.match(query)
+        if match:
+            query = match.group(1)
+
+        query = self._remove_comments(query)
+        if self._RE_USE.match(query):
+            return 'use ?'
+
+        query = self._replace_literals(query)
+
+        query = query.lstrip(' \n\t\r\f\v')
+        if query.endswith('\n'):
+            query = query[:-1]
+        query = self._RE_WHITESPACE.sub(' ', query).lower()
+
+        if 'null' in query:
+            query = self._RE_NULL.sub('?', query)
+        query = self._RE_LISTS.sub(r'\1(?+)', query)
+        if 'union' in query:
+            query = self._RE_UNION.sub(r'\1 /*repeat\2*/', query)
+        query = self._RE_LIMIT.sub('limit ?', query, 1)
+        query = self._remove_asc(query)
+
+        return query
+
+    def fingerprint_many(self, queries) -> list:
+        """ Return the fingerprints of a list of queries, in the same order. """
+        return [ self.fingerprint(query) for query in queries ]
+
+    def _remove_comments(self, query: str) -> str:
+        """ Remove multi-line comments (but not /*! executable comments)
+            and single-line comments that don't contain quotes.
+        """
+        if '/*' in query:
+            query = self._RE_MULTI_LINE_COMMENT.sub('', query)
+        if '--' in query or '#' in query:
+            query = self._RE_SINGLE_LINE_COMMENT.sub('', query)
+        return query
+
+    def _replace_literals(self, query: str) -> str:
+        """ Replace quoted strings, booleans and numbers with placeholders. """
+        if '\\' in query:
+            query = self._RE_ESCAPED_SINGLE_QUOTE.sub(r'\1', query)
+            query = self._RE_ESCAPED_DOUBLE_QUOTE.sub(r'\1', query)
+            for pattern in self._RE_ESCAPES:
+                query = pattern.sub('', query)
+        if '"' in query:
+            query = self._RE_DOUBLE_QUOTED.sub(r'\1?', query)
+        if "'" in query:
+            query = self._RE_SINGLE_QUOTED.sub(r'\1?', query)
+        query = self._RE_BOOLEAN.sub('?', query)
+        query = self._RE_NUMBER.sub('?', query)
+        if '?' in query:
+            query = self._RE_LITERAL_PREFIX.sub('?', query)
+        return query
+
+    def _remove_asc(self, query: str) -> str:
+        """ Remove ASC from the ORDER BY clause, as it is the default. """
+        match = self._RE_ORDER_BY.search(query)
+        if not match:
+            return query
+        position = match.end()
+        pieces = [ query[:position] ]
+        match = self._RE_ASC.match(query, position)
+        while match:
+            pieces.append(match.group(1))
+            position = match.end()
+            match = self._RE_ASC.match(query, position)
+        pieces.append(query[position:])
+        return ''.join(pieces)
+
+#EOF
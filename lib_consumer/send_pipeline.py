@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+
+""" Decouple reading the sourcelog from sending messages to Graylog.
+"""
+
+
+class Send_Pipeline:
+    """ Pass messages from the reader to sender threads through a
+        bounded queue, and commit their positions in order.
+
+        The reader calls put() with a message and the sourcelog position
+        that follows it. If the queue is full, put() waits: this way a
+        slow Graylog slows down the reader instead of filling the memory.
+        A sender thread calls send_function(message, on_sent), which must
+        call on_sent() exactly once, when the message was sent or when it
+        will never be. Messages can be sent out of order, but
+        commit_function(position, messages) is only called when all the
+        previous messages were sent, so the committed position is always
+        safe to restart from. Consecutive positions are committed once:
+        messages is the number of messages committed by the call.
+        If messages come from several sources, commit_key(position)
+        tells the source of a position, and consecutive positions are
+        committed once per source.
+
+        With zero threads, put() sends the message itself.
+    """
+
+
+    import queue
+    import threading
+
+
+    ##  Variables
+    ##  =========
+
+    #: Function that sends a message
+    _send_function = None
+    #: Function that records a position
+    _commit_function = None
+    #: Function that returns the source of a position, or None
+    _commit_key = None
+    #: Messages waiting to be sent, as (sequence, message, position) tuples
+    _queue = None
+    #: Sender threads
+    _threads = None
+    #: Sequence number of the next message
+    _next_sequence = 0
+    #: Sequence number of the next message to commit
+    _next_commit = 0
+    #: Positions of sent messages that can't be committed yet, by sequence
+    _sent = None
+    #: Protects _sent and _next_commit
+    _commit_lock = None
+    #: Signalled when a message is committed
+    _committed = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, send_function, commit_function, threads=1, queue_size=1000, commit_key=None):
+        """ Start the sender threads. """
+        self._send_function = send_function
+        self._commit_function = commit_function
+        self._commit_key = commit_key
+        self._queue = self.queue.Queue(maxsize=queue_size)
+        self._sent = { }
+        self._commit_lock = self.threading.Lock()
+        self._committed = self.threading.Condition(self._commit_lock)
+        self._threads = [ ]
+        for i in range(threads):
+            thread = self.threading.Thread(target=self._sender_loop, name='sender-' + str(i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _sender_loop(self) -> None:
+        """ Sender threads main loop. """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            self._send(*item)
+
+    def _send(self, sequence, message, position) -> None:
+        """ Send a message, and mark it as sent when done. """
+        try:
+            self._send_function(message, lambda: self._mark_sent(sequence, position))
+        except Exception:
+            # The send function should not raise exceptions, but if it
+            # does, don't block the commits forever
+            self._mark_sent(sequence, position)
+
+    def _mark_sent(self, sequence, position) -> None:
+        """ Record that a message was sent, and commit the highest
+            position that has no unsent messages before it.
+        """
+        with self._commit_lock:
+            self._sent[sequence] = position
+            # [ last position, messages ] by source
+            commits = { }
+            while self._next_commit in self._sent:
+                position = self._sent.pop(self._next_commit)
+                self._next_commit = self._next_commit + 1
+                key = None
+                if self._commit_key is not None:
+                    key = self._commit_key(position)
+                if key in commits:
+                    commits[key][0] = position
+                    commits[key][1] = commits[key][1] + 1
+                else:
+                    commits[key] = [ position, 1 ]
+            for last_position, messages in commits.values():
+                self._commit_function(last_position, messages)
+            if commits:
+                self._committed.notify_all()
+
+    def put(self, message, position) -> None:
+        """ Queue a message for sending. Wait if the queue is full. """
+        sequence = self._next_sequence
+        self._next_sequence = self._next_sequence + 1
+        if self._threads:
+            self._queue.put((sequence, message, position))
+        else:
+            self._send(sequence, message, position)
+
+    def get_pending(self) -> int:
+        """ Return the number of messages that were queued but not
+            committed yet.
+        """
+        with self._commit_lock:
+            return self._next_sequence - self._next_commit
+
+    def wait(self, timeout=None) -> bool:
+        """ Wait until all queued messages are committed.
+            Return False if the timeout expires first.
+            Messages whose on_sent() is delayed (for example, by HTTP
+            batches) are only committed when on_sent() is called.
+        """
+        with self._commit_lock:
+            return self._committed.wait_for(
+                lambda: self._next_commit == self._next_sequence,
+                timeout
+            )
+
+    def close(self) -> None:
+        """ Send the queued messages and stop the sender threads. """
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = [ ]
+
+#EOF
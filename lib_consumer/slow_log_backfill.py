@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+
+""" Parse and fingerprint a large Slow Log in a pool of processes.
+"""
+
+
+from typing import Iterator, List, Tuple
+
+from .timestamp_decoder import Timestamp_Decoder
+from .slow_log_parser import Slow_Log_Parser
+from .slow_log_formatter import Slow_Log_Formatter
+from .gelf_template import GELF_Template
+from .query_fingerprint import Query_Fingerprint
+from .fingerprint_cache import Fingerprint_Cache
+
+
+class Slow_Log_Backfill:
+    """ Turn byte ranges of a Slow Log into serialized GELF messages,
+        using a pool of processes.
+
+        Every range must start at the beginning of an entry and end
+        at the beginning of the next one, so that it can be parsed
+        independently. Each process has its own parser, fingerprint
+        cache and GELF template. It returns the serialized messages of
+        a range, each one with the offset where its entry ends.
+
+        Results are returned in the order of the ranges, so the caller
+        can send them and log the offsets in the Eventlog in the same
+        order as the line by line reading would. A limited number of
+        ranges is processed in advance, to bound memory usage when
+        Graylog is slower than the processes.
+    """
+
+
+    import signal
+    import collections
+    import multiprocessing
+    import concurrent.futures
+
+
+    ##  Constants
+    ##  =========
+
+    #: Size of a range processed by a single task, in bytes
+    RANGE_SIZE = 8 * 1024 * 1024
+    #: Ranges processed in advance, per process
+    _RANGES_AHEAD = 2
+
+
+    ##  Variables
+    ##  =========
+
+    #: ProcessPoolExecutor
+    _executor = None
+    #: Number of processes
+    _processes = None
+
+    # Per process state, set by _init_process()
+
+    #: Path of the Slow Log
+    _path = None
+    #: Slow_Log_Parser of the process
+    _parser = None
+    #: Slow_Log_Formatter of the process
+    _formatter = None
+    #: Debug flags passed to GELF messages
+    _debug = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, processes: int, settings: dict):
+        """ Start the processes.
+            settings is a dictionary with these keys: path, timezone,
+            gelf_version, hostname, gelf_fields, fingerprint_cache_size,
+            short_message_length, debug.
+        """
+        self._processes = processes
+        # Forking a process that runs sender threads is not safe
+        self._executor = self.concurrent.futures.ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=self.multiprocessing.get_context('spawn'),
+            initializer=Slow_Log_Backfill._init_process,
+            initargs=(settings, )
+        )
+
+    @staticmethod
+    def _init_process(settings: dict) -> None:
+        """ Prepare the state of a process. """
+        # Signals are handled by the main process, which stops the pool
+        signal = Slow_Log_Backfill.signal
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        fingerprinter = Query_Fingerprint()
+        if settings['fingerprint_cache_size'] > 0:
+            fingerprinter = Fingerprint_Cache(fingerprinter, settings['fingerprint_cache_size'])
+        template = GELF_Template(
+            settings['gelf_version'],
+            settings['hostname'],
+            settings['gelf_fields']
+        )
+        Slow_Log_Backfill._path = settings['path']
+        Slow_Log_Backfill._parser = Slow_Log_Parser(Timestamp_Decoder(settings['timezone']))
+        Slow_Log_Backfill._formatter = Slow_Log_Formatter(
+            template,
+            fingerprinter,
+            settings['short_message_length']
+        )
+        Slow_Log_Backfill._debug = settings['debug']
+
+    @staticmethod
+    def _process_range(start: int, end: int) -> List[Tuple[bytes, int]]:
+        """ Return the messages of the entries between start and end,
+            as (message, end offset of the entry) tuples.
+            Runs in a process of the pool.
+        """
+        parser = Slow_Log_Backfill._parser
+        formatter = Slow_Log_Backfill._formatter
+        debug = Slow_Log_Backfill._debug
+        with open(Slow_Log_Backfill._path, 'rb') as log_file:
+            log_file.seek(start)
+            data = log_file.read(end - start)
+        if data[-1:] == b'\n':
+            data = data[:-1]
+
+        results = [ ]
+        offset = start
+        for line in data.split(b'\n'):
+            entry = parser.feed(line.decode('utf-8', 'replace').rstrip())
+            if entry is not None:
+                # The entry ends where this line starts
+                results.append((formatter.format(entry, debug).to_bytes(), offset))
+            offset = offset + len(line) + 1
+        entry = parser.flush()
+        if entry is not None:
+            results.append((formatter.format(entry, debug).to_bytes(), end))
+        return results
+
+    def process(self, ranges: Iterator[Tuple[int, int]]) -> Iterator[List[Tuple[bytes, int]]]:
+        """ Process the (start, end) ranges, and yield their results
+            in the same order.
+        """
+        pending = self.collections.deque()
+        for start, end in ranges:
+            pending.append(self._executor.submit(Slow_Log_Backfill._process_range, start, end))
+            if len(pending) >= self._processes * self._RANGES_AHEAD:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def close(self) -> None:
+        """ Stop the processes, without waiting for the pending ranges. """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+#EOF
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+
+""" Compose GELF messages from Slow Log entries.
+"""
+
+
+from .gelf_message import GELF_Message
+from .gelf_template import GELF_Template
+from .slow_log_parser import Slow_Log_Entry
+
+
+class Slow_Log_Formatter:
+    """ Turn Slow_Log_Entry objects into GELF messages.
+
+        The query is fingerprinted and sent as query_text, with the
+        first word in uppercase. The original query is not sent, as it
+        may contain sensitive data. The metrics are sent as additional
+        fields.
+    """
+
+
+    import time
+
+
+    ##  Variables
+    ##  =========
+
+    #: GELF_Template with the fields that are the same for all messages
+    _template = None
+    #: Object with the fingerprint() and fingerprint_many() methods
+    _fingerprinter = None
+    #: Maximum length of short_message
+    _short_message_length = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, template: GELF_Template, fingerprinter, short_message_length: int):
+        """ Compose messages with the specified template, and
+            fingerprint queries with fingerprinter.
+        """
+        self._template = template
+        self._fingerprinter = fingerprinter
+        self._short_message_length = short_message_length
+
+    def _capitalize_first_word(self, phrase: str) -> str:
+        """ Return the input string with the first word in uppercase.
+            Assume that words are separated by spaces and there are
+            no trailing spaces.
+        """
+        first_word, separator, rest = phrase.partition(' ')
+        return first_word.upper() + separator + rest
+
+    def format(self, entry: Slow_Log_Entry, debug: dict) -> GELF_Message:
+        """ Return a GELF message for the entry. """
+        fingerprint = ''
+        if entry.query:
+            fingerprint = self._fingerprinter.fingerprint(entry.query)
+        return self._compose(entry, fingerprint, debug)
+
+    def format_many(self, entries: list, debug: dict) -> list:
+        """ Return a list of GELF messages for a list of entries, in the
+            same order. The queries are fingerprinted with a single
+            fingerprint_many() call.
+        """
+        queries = [ entry.query for entry in entries if entry.query ]
+        fingerprints = iter(self._fingerprinter.fingerprint_many(queries))
+        messages = [ ]
+        for entry in entries:
+            fingerprint = ''
+            if entry.query:
+                fingerprint = next(fingerprints)
+            messages.append(self._compose(entry, fingerprint, debug))
+        return messages
+
+    def _compose(self, entry: Slow_Log_Entry, fingerprint: str, debug: dict) -> GELF_Message:
+        """ Return a GELF message for the entry, whose query has the
+            specified fingerprint.
+        """
+        parametrized_query = ''
+        if fingerprint:
+            parametrized_query = self._capitalize_first_word(fingerprint)
+
+        custom = { }
+        for key in entry.metrics:
+            if key != 'timestamp':
+                custom[key] = entry.metrics[key]
+        custom['query_text'] = parametrized_query
+
+        timestamp = entry.metrics.get('timestamp')
+        if timestamp is None:
+            timestamp = str(int(self.time.time()))
+
+        return self._template.create_message(
+                debug,
+                timestamp,
+                parametrized_query[:self._short_message_length],
+                'NOTE',
+                custom
+            )
+
+#EOF
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+
+
+""" Parse Slow Log entries.
+"""
+
+
+from typing import NamedTuple, Optional
+
+from .timestamp_decoder import Timestamp_Decoder
+
+
+class Slow_Log_Entry(NamedTuple):
+    """ A complete Slow Log entry.
+    """
+    #: Metrics from the comment lines, with typed values.
+    #: Keys are lowercase, for example query_time or rows_examined.
+    metrics: dict
+    #: Query text, without the USE and SET timestamp statements
+    #: added by the server
+    query: str
+
+
+class Slow_Log_Parser:
+    """ Turn Slow Log lines into Slow_Log_Entry objects.
+
+        An entry is made of comment lines with metrics (META), followed
+        by the query text (SQL), which can span multiple lines:
+
+        # Time: 230101 12:00:00
+        # User@Host: app[app] @ web1 [10.0.0.2]
+        # Thread_id: 9  Schema: shop  QC_hit: No
+        # Query_time: 1.5  Lock_time: 0.1  Rows_sent: 10  Rows_examined: 1000
+        # Rows_affected: 0  Bytes_sent: 900
+        SET timestamp=1672574400;
+        SELECT * FROM orders;
+
+        # Time: is only written when the second changes, so an entry
+        # can also start with # User@Host:. Comment lines that follow
+        # SQL lines and don't start an entry are part of the query.
+        The headers that the server writes when it starts are skipped.
+
+        Numeric metrics become int or float. Yes/No metrics become 1/0,
+        so they can be aggregated.
+    """
+
+
+    import re
+    import datetime
+
+
+    ##  Constants
+    ##  =========
+
+    #: Line types
+    _META = 'META'
+    _SQL = 'SQL'
+
+    #: # Time: in MariaDB format (230101 12:00:00) or MySQL format
+    #: (2023-01-01T12:00:00.123456Z)
+    _RE_TIME = re.compile(
+        r'# Time: +(?:(\d\d)(\d\d)(\d\d) +(\d{1,2}):(\d\d):(\d\d)(?:\.(\d{1,6}))?'
+        r'|(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d{1,6})?)(Z|[+-]\d\d:\d\d)?)'
+    )
+    #: # User@Host: user[priv_user] @ hostname [ip]  Id: 8
+    _RE_USER_HOST = re.compile(
+        r'# User@Host: +(\S*?) *\[[^\]]*\] *@ *(\S*) *\[([^\]]*)\](?: +Id: +(\d+))?'
+    )
+    #: Key: value pairs in the other META lines. A value can be empty,
+    #: for example Schema when there is no default database: in that
+    #: case the next key is not taken as the value.
+    _RE_PAIR = re.compile(r'(\w+):[ \t]*(?!\w+:)(\S*)')
+    #: Statements added by the server before the query
+    _RE_USE = re.compile(r'use [^;]+;$', re.IGNORECASE)
+    _RE_SET_TIMESTAMP = re.compile(r'SET timestamp=(\d+)(?:\.(\d+))?;$')
+    #: Headers written by the server when it starts
+    _RE_HEADER = re.compile(
+        r'\S.*, Version: .* started with:$'
+        r'|Tcp port: \d+ +Unix socket: '
+        r'|Time +Id +Command +Argument$'
+    )
+
+    #: Converters for Yes/No values
+    _BOOLEANS = { 'Yes': 1, 'No': 0 }
+
+    #: Known metrics: name in the log -> (key, type)
+    _METRICS = {
+        'Thread_id': ('thread_id', int),
+        'Schema': ('schema', str),
+        'QC_hit': ('query_cache_hit', bool),
+        'Query_time': ('query_time', float),
+        'Lock_time': ('lock_time', float),
+        'Rows_sent': ('rows_sent', int),
+        'Rows_examined': ('rows_examined', int),
+        'Rows_affected': ('rows_affected', int),
+        'Bytes_sent': ('bytes_sent', int),
+        'Tmp_tables': ('tmp_tables', int),
+        'Tmp_disk_tables': ('tmp_disk_tables', int),
+        'Tmp_table_sizes': ('tmp_table_sizes', int),
+        'Full_scan': ('full_scan', bool),
+        'Full_join': ('full_join', bool),
+        'Tmp_table': ('tmp_table', bool),
+        'Tmp_table_on_disk': ('tmp_table_on_disk', bool),
+        'Filesort': ('filesort', bool),
+        'Filesort_on_disk': ('filesort_on_disk', bool),
+        'Merge_passes': ('merge_passes', int),
+        'Priority_queue': ('priority_queue', bool)
+    }
+
+
+    ##  Variables
+    ##  =========
+
+    #: Converts # Time: values
+    _timestamp_decoder = None
+    #: Type of the previous line: _META, _SQL or None (headers)
+    _prev_line_type = None
+    #: Metrics of the current entry
+    _metrics = None
+    #: Lines of the current query
+    _query_lines = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, timestamp_decoder: Timestamp_Decoder = None):
+        """ Use the specified Timestamp_Decoder for # Time: lines in
+            MariaDB format, or one that considers times as local.
+        """
+        if timestamp_decoder is None:
+            timestamp_decoder = Timestamp_Decoder()
+        self._timestamp_decoder = timestamp_decoder
+        self._start_entry()
+
+    def _start_entry(self) -> None:
+        """ Forget the current entry. """
+        self._metrics = { }
+        self._query_lines = [ ]
+
+    def _convert(self, value: str, value_type):
+        """ Convert a metric value to the specified type.
+            If the type is None, guess it.
+            Return the value as a string if it can't be converted.
+        """
+        try:
+            if value_type is str:
+                return value
+            if value_type is bool:
+                return self._BOOLEANS[value]
+            if value_type is not None:
+                return value_type(value)
+            if value in self._BOOLEANS:
+                return self._BOOLEANS[value]
+            if '.' in value:
+                return float(value)
+            return int(value)
+        except (KeyError, ValueError):
+            return value
+
+    def _parse_time(self, line: str) -> None:
+        """ Get the timestamp from a # Time: line. """
+        match = self._RE_TIME.match(line)
+        if match is None:
+            return
+        try:
+            if match.group(1) is not None:
+                microsecond = 0
+                if match.group(7):
+                    microsecond = int(match.group(7).ljust(6, '0'))
+                self._metrics['timestamp'] = self._timestamp_decoder.decode(
+                    2000 + int(match.group(1)), int(match.group(2)), int(match.group(3)),
+                    int(match.group(4)), int(match.group(5)), int(match.group(6)),
+                    microsecond
+                )
+            else:
+                date_time = self.datetime.datetime.fromisoformat(match.group(8))
+                if match.group(9):
+                    offset = match.group(9)
+                    if offset == 'Z':
+                        offset = '+00:00'
+                    date_time = self.datetime.datetime.fromisoformat(match.group(8) + offset)
+                    self._metrics['timestamp'] = date_time.timestamp()
+                else:
+                    # No timezone: use the decoder, like MariaDB times
+                    self._metrics['timestamp'] = self._timestamp_decoder.decode(
+                        date_time.year, date_time.month, date_time.day,
+                        date_time.hour, date_time.minute, date_time.second,
+                        date_time.microsecond
+                    )
+        except (ValueError, OverflowError):
+            pass
+
+    def _parse_user_host(self, line: str) -> None:
+        """ Get user, client host and IP from a # User@Host: line. """
+        match = self._RE_USER_HOST.match(line)
+        if match is None:
+            return
+        self._metrics['user'] = match.group(1)
+        if match.group(2):
+            self._metrics['client_hostname'] = match.group(2)
+        if match.group(3):
+            self._metrics['ip'] = match.group(3)
+        if match.group(4):
+            self._metrics['thread_id'] = int(match.group(4))
+
+    def _parse_meta_line(self, line: str) -> None:
+        """ Get the metrics from a META line. """
+        if line.startswith('# Time:'):
+            self._parse_time(line)
+        elif line.startswith('# User@Host:'):
+            self._parse_user_host(line)
+        elif not line.startswith('# explain:'):
+            for name, value in self._RE_PAIR.findall(line):
+                if not value:
+                    # An empty Schema can be set by a later use statement
+                    continue
+                key, value_type = self._METRICS.get(name, (None, None))
+                if key is None:
+                    key = name.lower()
+                self._metrics[key] = self._convert(value, value_type)
+
+    def _parse_sql_line(self, line: str) -> None:
+        """ Add a line to the query, unless it's a statement added by
+            the server before the query.
+        """
+        if not self._query_lines:
+            if self._RE_USE.match(line):
+                if 'schema' not in self._metrics:
+                    self._metrics['schema'] = line[4:-1].strip().strip('`')
+                return
+            match = self._RE_SET_TIMESTAMP.match(line)
+            if match:
+                # Use this timestamp, as it doesn't depend on the timezone
+                timestamp = int(match.group(1))
+                if match.group(2):
+                    timestamp = float(match.group(1) + '.' + match.group(2))
+                self._metrics['timestamp'] = timestamp
+                return
+        self._query_lines.append(line)
+
+    def _get_entry(self) -> Optional[Slow_Log_Entry]:
+        """ Return the current entry, or None if it's empty. """
+        if not self._metrics and not self._query_lines:
+            return None
+        return Slow_Log_Entry(self._metrics, '\n'.join(self._query_lines))
+
+    def feed(self, line: str) -> Optional[Slow_Log_Entry]:
+        """ Process a line, without the trailing newline.
+            Return the previous entry if this line starts a new entry,
+            otherwise None.
+        """
+        entry = None
+        if line[:2] == '# ' and (
+                self._prev_line_type == self._META
+                or line.startswith('# Time:')
+                or line.startswith('# User@Host:')
+            ):
+            if self._prev_line_type != self._META:
+                # The first META line starts a new entry
+                entry = self._get_entry()
+                self._start_entry()
+            self._parse_meta_line(line)
+            line_type = self._META
+        elif self._RE_HEADER.match(line):
+            line_type = None
+        elif self._prev_line_type is None:
+            # Headers, or a file that starts in the middle of an entry
+            line_type = None
+        elif self._query_lines or line:
+            # Empty lines are only skipped before the query
+            self._parse_sql_line(line)
+            line_type = self._SQL
+        else:
+            line_type = self._SQL
+        self._prev_line_type = line_type
+        return entry
+
+    def flush(self) -> Optional[Slow_Log_Entry]:
+        """ Return the current entry, or None if it's empty, and
+            forget it. Call this when the entry is known to be complete,
+            for example at the end of the file.
+        """
+        entry = self._get_entry()
+        self._start_entry()
+        return entry
+
+#EOF
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+
+""" Identify a sourcelog file across renames and replacements.
+"""
+
+
+import os
+import zlib
+from typing import List, NamedTuple, Optional
+
+
+class Source_Identity(NamedTuple):
+    """ The device and inode of a file, and a checksum of its first
+        bytes.
+
+        The device and inode follow the file when it's renamed by
+        logrotate or by FLUSH LOGS. The checksum tells a file from a
+        new file that reuses the inode of a deleted one, or from the
+        same file after it was truncated and written again.
+    """
+
+    #: Number of bytes covered by the checksum
+    HEAD_SIZE = 1024
+
+    #: Device that contains the file
+    device: int
+    #: Inode of the file
+    inode: int
+    #: Number of bytes covered by head_checksum. It is smaller than
+    #: HEAD_SIZE if the file was smaller when it was identified.
+    head_size: int
+    #: CRC32 of the first head_size bytes
+    head_checksum: int
+
+    @staticmethod
+    def get_head_checksum(file_descriptor: int, size: int) -> int:
+        """ Return the CRC32 of the first size bytes of a file,
+            or -1 if the file is shorter.
+        """
+        head = os.pread(file_descriptor, size, 0)
+        if len(head) < size:
+            return -1
+        return zlib.crc32(head)
+
+    @classmethod
+    def of_file(cls, file_descriptor: int) -> 'Source_Identity':
+        """ Return the identity of an open file. """
+        stat = os.fstat(file_descriptor)
+        head_size = min(stat.st_size, cls.HEAD_SIZE)
+        return cls(
+            stat.st_dev,
+            stat.st_ino,
+            head_size,
+            cls.get_head_checksum(file_descriptor, head_size)
+        )
+
+    @classmethod
+    def from_fields(cls, fields: List[str]) -> 'Source_Identity':
+        """ Return the identity written as fields by to_fields().
+            Raise ValueError if the fields are not valid.
+        """
+        if len(fields) != 4:
+            raise ValueError('An identity has 4 fields')
+        return cls(int(fields[0]), int(fields[1]), int(fields[2]), int(fields[3], 16))
+
+    def to_fields(self) -> List[str]:
+        """ Return the identity as a list of strings. """
+        return [
+            str(self.device),
+            str(self.inode),
+            str(self.head_size),
+            format(self.head_checksum, '08x')
+        ]
+
+    def is_complete(self) -> bool:
+        """ Return whether the checksum covers HEAD_SIZE bytes,
+            so it won't change if the file grows.
+        """
+        return self.head_size >= self.HEAD_SIZE
+
+    def matches(self, file_descriptor: int) -> bool:
+        """ Return whether an open file is the identified file. """
+        stat = os.fstat(file_descriptor)
+        if stat.st_dev != self.device or stat.st_ino != self.inode:
+            return False
+        return self.get_head_checksum(file_descriptor, self.head_size) == self.head_checksum
+
+    def find_file(self, directory: str) -> Optional[str]:
+        """ Return the path of the identified file if it's in the
+            specified directory, or None. Use this to find a sourcelog
+            after it was rotated.
+        """
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return None
+        for entry in entries:
+            try:
+                if entry.inode() != self.inode or not entry.is_file(follow_symlinks=False):
+                    continue
+                with open(entry.path, 'rb') as candidate:
+                    if self.matches(candidate.fileno()):
+                        return entry.path
+            except OSError:
+                pass
+        return None
+
+
+class Source_Position(NamedTuple):
+    """ A position in a sourcelog file.
+    """
+    #: Byte offset
+    offset: int
+    #: Identity of the file, or None if unknown
+    identity: Optional[Source_Identity]
+
+#EOF
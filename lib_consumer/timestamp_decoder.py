@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+
+""" Convert the dates and times written in logs to UNIX timestamps.
+"""
+
+
+class Timestamp_Decoder:
+    """ Convert dates and times to UNIX timestamps.
+
+        Consecutive log lines are written in the same hour, most of
+        the time. So the timestamp of the beginning of the last hour is
+        cached, and minutes and seconds are added to it. The full
+        conversion only happens when the hour changes. Caching hours
+        rather than days keeps the result correct when daylight saving
+        time starts or ends.
+
+        By default dates and times are considered local, as mktime()
+        does. If a timezone is specified (for example, UTC or
+        Europe/Rome), they are considered in that timezone.
+    """
+
+
+    import time
+    import datetime
+
+
+    ##  Variables
+    ##  =========
+
+    #: tzinfo of the source log, or None for local time
+    _timezone = None
+    #: (year, month, day, hour) of the cached timestamp
+    _cached_hour = None
+    #: UNIX timestamp of the beginning of the cached hour
+    _cached_timestamp = None
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, timezone: str = None):
+        """ Load the specified timezone.
+            Raise an exception if it does not exist.
+        """
+        if timezone is not None:
+            try:
+                import zoneinfo
+                self._timezone = zoneinfo.ZoneInfo(timezone)
+            except ImportError:
+                raise Exception('Timezones require Python 3.9 or newer')
+            except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+                raise Exception('Unknown timezone: ' + timezone)
+
+    def _get_hour_timestamp(self, year: int, month: int, day: int, hour: int) -> int:
+        """ Return the UNIX timestamp of the beginning of an hour.
+            Raise ValueError if the date or hour is not valid.
+        """
+        date_time = self.datetime.datetime(year, month, day, hour)
+        if self._timezone is None:
+            return int(self.time.mktime(date_time.timetuple()))
+        return int(date_time.replace(tzinfo=self._timezone).timestamp())
+
+    def decode(self, year: int, month: int, day: int, hour: int, minute: int, second: int, microsecond: int = 0):
+        """ Return the UNIX timestamp of the specified date and time.
+            If microsecond is not zero, the timestamp is a float.
+            Raise ValueError if the date or time is not valid.
+        """
+        if minute < 0 or minute > 59 or second < 0 or second > 59:
+            raise ValueError('Invalid time')
+        key = (year, month, day, hour)
+        if key != self._cached_hour:
+            self._cached_timestamp = self._get_hour_timestamp(year, month, day, hour)
+            self._cached_hour = key
+        timestamp = self._cached_timestamp + minute * 60 + second
+        if microsecond:
+            return timestamp + microsecond / 1000000
+        return timestamp
+
+#EOF
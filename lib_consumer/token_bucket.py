@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+
+""" Limit the rate of an action, allowing bursts.
+"""
+
+
+class Token_Bucket:
+    """ A bucket that holds up to capacity tokens, and is refilled
+        at rate tokens per second. An action takes some tokens, for
+        example one per message or one per byte. If there aren't
+        enough tokens, the caller waits until the bucket is refilled.
+
+        A full bucket allows a burst of actions without waiting. Tokens
+        are reserved before waiting, so an action bigger than the
+        bucket still happens, and concurrent threads wait in turn.
+        It's thread-safe.
+    """
+
+
+    import time
+    import threading
+
+
+    ##  Variables
+    ##  =========
+
+    #: Tokens added per second
+    _rate = None
+    #: Maximum number of tokens
+    _capacity = None
+    #: Available tokens. Negative when actions reserved tokens that
+    #: will be refilled later.
+    _tokens = None
+    #: time.monotonic() of the last refill
+    _last_refill = None
+    #: Protects the variables
+    _lock = None
+    #: Number of actions that waited
+    _throttled_actions = 0
+    #: Total seconds waited
+    _throttled_seconds = 0.0
+
+
+    ##  Methods
+    ##  =======
+
+    def __init__(self, rate: float, capacity: float):
+        """ Create a full bucket.
+            Raise an exception if rate or capacity are not positive.
+        """
+        if rate <= 0 or capacity <= 0:
+            raise Exception('The rate and capacity of a Token_Bucket must be positive')
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._last_refill = self.time.monotonic()
+        self._lock = self.threading.Lock()
+
+    def _refill(self) -> None:
+        """ Add the tokens for the time passed since the last refill.
+            Must be called with the lock held.
+        """
+        now = self.time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def reserve(self, tokens: float) -> float:
+        """ Take the specified number of tokens, and return the number
+            of seconds to wait before they are available.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = self._tokens - tokens
+            if self._tokens >= 0:
+                return 0.0
+            wait = -self._tokens / self._rate
+            self._throttled_actions = self._throttled_actions + 1
+            self._throttled_seconds = self._throttled_seconds + wait
+            return wait
+
+    def acquire(self, tokens: float) -> float:
+        """ Take the specified number of tokens, waiting until they
+            are available. Return the number of seconds waited.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.time.sleep(wait)
+        return wait
+
+    def get_fill_level(self) -> float:
+        """ Return the available tokens as a fraction of the capacity,
+            from 0 (actions wait) to 1 (a full burst is allowed).
+        """
+        with self._lock:
+            self._refill()
+            return max(self._tokens, 0) / self._capacity
+
+    def get_stats(self) -> dict:
+        """ Return the fill level, the number of actions that waited
+            and the total seconds waited.
+        """
+        fill_level = self.get_fill_level()
+        with self._lock:
+            return {
+                'fill_level': round(fill_level, 3),
+                'throttled_actions': self._throttled_actions,
+                'throttled_seconds': round(self._throttled_seconds, 3)
+            }
+
+#EOF
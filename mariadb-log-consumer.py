@@ -22,7 +22,7 @@ class Consumer:
     import time
     import os
     #import pidfile
-    import datetime
+    import re
 
 
     ##  Members
@@ -30,6 +30,9 @@ class Consumer:
 
     # The lock file is stored here.
     _LOCK_FILE_PATH = '/tmp'
+    #: When the TCP buffer is fuller than this, the reader waits
+    #: for it to drain before queueing more messages.
+    _TCP_HIGH_WATERMARK = 0.75
     #: Identifies a run of this program.
     _label = 'default'
     #: If True, checks on the lock file are disabled.
@@ -50,63 +53,69 @@ class Consumer:
     #: we'll wait this number of milliseconds before checking
     #: for new lines.
     _eof_wait = -1
+    #: Inotify_Watcher that wakes us up when a sourcelog changes,
+    #: or None to check them every _eof_wait milliseconds
+    _sourcelog_watcher = None
+    #: Maximum number of seconds to wait for inotify events when
+    #: nothing else needs to be done, in case an event is missed
+    _INOTIFY_IDLE_WAIT = 60
+    #: Minimum number of bytes left to read on start to use the
+    #: catch-up mode. Zero disables it.
+    _catch_up_threshold = None
+    #: In catch-up mode, Slow Log entries are formatted in batches of
+    #: this size, so their queries are fingerprinted together
+    _FINGERPRINT_BATCH_SIZE = 256
     #: If set to False, signals cannot interrupt the program.
     _can_be_interrupted = True
     #: Requests from signals that cannot be accomplished immediately
     #: are stored here.
     _requests: Request_Counters = Request_Counters(('STOP', 'ROTATE'))
 
-    _message_wait = None
-
-    #: Eventlog instance
-    _eventlog = None
+    #: Token_Bucket that limits the messages sent per second, or None
+    _message_rate_limit = None
+    #: Token_Bucket that limits the bytes sent per second, or None
+    _byte_rate_limit = None
+    #: Whether the last message waited for a rate limit
+    _throttled = False
+
+    #: Send_Pipeline instance.
+    #: Sends messages and logs their coordinates in the Eventlog.
+    _send_pipeline = None
+    #: Async_Runtime instance, with --runtime=asyncio
+    _async_runtime = None
+    #: Async Graylog clients by protocol, with --runtime=asyncio
+    _async_clients = None
     #! Eventlog options distionary, to be passed to Eventlog
     _event_log_options = {
         # Path of the logs
         'path': None,
         # Truncate the Eventlog before starting
-        'truncate': False
+        'truncate': False,
+        # Checkpoint policy
+        'checkpoint_messages': Eventlog.DEFAULT_CHECKPOINT_MESSAGES,
+        'checkpoint_interval': Eventlog.DEFAULT_CHECKPOINT_INTERVAL,
+        'sync': 'none'
     }
 
-    #: Type of log to consume, uppercase. Allowed values: ERROR, SLOW
+    #: Log_Source objects: the sources of the --config file, or the
+    #: sourcelog specified with --log
+    _sources = None
+
+    #: Type of log to consume, uppercase. Allowed values: ERROR, SLOW.
+    #: None with --config.
     _sourcelog_type = None
     #: Path and name of the log to consume
     _sourcelog_path = None
-    #: Past read line
-    _sourcelog_last_position = None
     #: How many sourcelog entries will be processed as a maximum.
     #: Zero or a negative value means process them all
     _sourcelog_limit = None
     #: How many sourcelog entries will be skipped at the beginning.
     _sourcelog_offset = None
-    #: Information remembered by the sourcelog parsers
-    #: after processing each line.
-    _sourcelog_parser_state = { }
-    # All information that will go into the GELF_Message instance
-    _metrics = {
-        "timestamp": None
-        , "user": None
-        , "ip": None
-        , "thread_id": None
-        , "schema": None
-        , "query_cache_hit": None
-        , "query_time": None
-        , "lock_time": None
-        , "rows_sent": None
-        , "rows_examined": None
-        , "rows_affected": None
-        , "bytes_sent": None
-        , "tmp_tables": None
-        , "tmp_disk_tables": None
-        , "tmp_table_sizes": None
-        , "full_scan": None
-        , "full_join": None
-        , "merge_passes": None
-        , "query_text": None
-    }
-
-    #: GELF message we're composing and then sending to Graylog
-    _message = None
+    #: Object used to fingerprint Slow Log queries.
+    #: Can be wrapped by a Fingerprint_Cache.
+    _fingerprinter = Query_Fingerprint()
+    #: pt-fingerprint process, if used
+    _pt_fingerprint = None
 
     #: Necessary information to send messages to work with Graylog.
     _GRAYLOG = {
@@ -122,6 +131,26 @@ class Consumer:
     # Misc
 
     _hostname = None
+    #: GELF_Template with the fields that are the same for all messages
+    _gelf_template = None
+    #: Parses Error Log lines, in the catch-up mode
+    _error_log_parser = None
+    #: Composes GELF messages from Error Log entries
+    _error_log_formatter = None
+    #: Collects the continuation lines of the Error Log entries
+    #: found by the catch-up mode
+    _multiline = None
+    #: Parses Slow Log lines, in the catch-up mode
+    _slow_log_parser = None
+    #: Composes GELF messages from Slow Log entries
+    _slow_log_formatter = None
+    #: Number of processes used by the Slow Log backfill.
+    #: Zero disables it.
+    _backfill_processes = None
+    #: Settings passed to the Slow_Log_Backfill processes
+    _backfill_settings = None
+    #: Slow_Log_Backfill, while it's running
+    _slow_log_backfill = None
 
 
     ##  Methods
@@ -158,15 +187,24 @@ class Consumer:
         arg_parser.add_argument(
             '-t',
             '--log-type',
-            required=True,
+            default=None,
             help='Type of log to consume. Permitted values: error, slow.\n' +
-                'Permitted aliases: errorlog, errorlog. Case-insensitive.'
+                'Permitted aliases: errorlog, errorlog. Case-insensitive.\n' +
+                'Required, unless --config is specified.'
         )
         arg_parser.add_argument(
             '-l',
             '--log',
-            required=True,
-            help='Path and name of the log file to consume.'
+            default=None,
+            help='Path and name of the log file to consume.\n' +
+                'Required, unless --config is specified.'
+        )
+        arg_parser.add_argument(
+            '--config',
+            default=None,
+            help='Consume all the sourcelogs listed in this file, in a\n' +
+                'single process. Every sourcelog has its own Eventlog.\n' +
+                'Cannot be used with --log-type, --log, --limit, --offset.'
         )
         # --limit recalls SQL LIMIT
         arg_parser.add_argument(
@@ -203,23 +241,89 @@ class Consumer:
             type=int,
             default=1000,
             help='Number of milliseconds to wait after reaching the sourcelog\n' +
-                'end, before checking if there are new contents.'
+                'end, before checking if there are new contents.\n' +
+                'With --tail-mode=inotify, this is how often queued messages\n' +
+                'are sent and a rotated sourcelog is looked for.'
+        )
+        arg_parser.add_argument(
+            '--flush-idle',
+            type=int,
+            default=50,
+            help='When following the Error Log, send the last entry when\n' +
+                'no continuation line was written for this number of\n' +
+                'milliseconds. Zero sends it as soon as the end of the\n' +
+                'sourcelog is reached.'
+        )
+        arg_parser.add_argument(
+            '--tail-mode',
+            default='auto',
+            help='How to wait for new contents at the sourcelog end.\n' +
+                'Allowed values:\n' +
+                '    inotify:  Wake up when the sourcelog changes.\n' +
+                '              Linux only.\n' +
+                '    poll:     Check the sourcelog every --eof-wait\n' +
+                '              milliseconds.\n' +
+                '    auto:     inotify if available, otherwise poll.\n' +
+                'In both modes, truncated, moved and deleted sourcelogs\n' +
+                'are detected, and the new file is followed.'
+        )
+        arg_parser.add_argument(
+            '--catch-up-threshold',
+            type=int,
+            default=16 * 1024 * 1024,
+            help='If at least this number of bytes are left to read on\n' +
+                'start, read them through a memory map and find the entries\n' +
+                'without reading lines one by one. Then follow the\n' +
+                'sourcelog as usual. Not used with --offset or --limit.\n' +
+                'Zero disables the catch-up mode.'
+        )
+        arg_parser.add_argument(
+            '--backfill-processes',
+            type=int,
+            default=0,
+            help='Number of processes that parse and fingerprint the Slow Log\n' +
+                'in the catch-up mode. Zero disables the parallel backfill.\n' +
+                'Not used with --fingerprint=pt-fingerprint.'
+        )
+        arg_parser.add_argument(
+            '--rate-limit-messages',
+            type=float,
+            default=0,
+            help='Maximum number of messages sent per second, to avoid\n' +
+                'overloading Graylog. Zero means no limit.'
+        )
+        arg_parser.add_argument(
+            '--rate-limit-bytes',
+            type=float,
+            default=0,
+            help='Maximum number of bytes sent per second, before\n' +
+                'compression. Zero means no limit.'
+        )
+        arg_parser.add_argument(
+            '--rate-limit-burst',
+            type=int,
+            default=1000,
+            help='Messages and bytes that were not sent when allowed are\n' +
+                'saved for bursts, up to this number of milliseconds\n' +
+                'of the rate limits.'
         )
         # --*-wait is MariaDB style
         arg_parser.add_argument(
             '--message-wait',
             type=int,
             default=0,
-            help='Number of milliseconds to wait before processing the\n' +
-                'next message, as a trivial mechanism to avoid overloading\n' +
-                'the server.'
+            help='Number of milliseconds to wait between messages, without\n' +
+                'bursts. Kept for compatibility: it means\n' +
+                '--rate-limit-messages=1000/MESSAGE_WAIT --rate-limit-burst=0.\n' +
+                'Ignored if --rate-limit-messages is specified.'
         )
         arg_parser.add_argument(
             '--label',
             default='',
             help='ID for the program execution. To calls with different\n' +
                 'IDs are allowed to run simultaneously.\n' +
-                'Default: same value as --log-type.'
+                'Default: same value as --log-type, or the name of the\n' +
+                '--config file.'
         )
         arg_parser.add_argument(
             '-f',
@@ -252,6 +356,14 @@ class Consumer:
             type=int,
             help='Graylog HTTP port.'
         )
+        # UDP options
+        arg_parser.add_argument(
+            '--graylog-udp-chunk-size',
+            type=int,
+            default=Graylog_Client_UDP.DEFAULT_CHUNK_SIZE,
+            help='Maximum size of a UDP datagram, in bytes.\n' +
+                'Longer messages are split into GELF chunks.'
+        )
         # TCP options
         arg_parser.add_argument(
             '--graylog-tcp-timeout',
@@ -259,18 +371,27 @@ class Consumer:
             default=2,
             help='Timeout for TCP calls.'
         )
+        arg_parser.add_argument(
+            '--graylog-tcp-buffer-size',
+            type=int,
+            default=Graylog_Client_TCP.DEFAULT_BUFFER_SIZE,
+            help='Maximum size of the messages waiting to be sent via TCP,\n' +
+                'in bytes.'
+        )
         # HTTP options
         arg_parser.add_argument(
             '--graylog-http-timeout-idle',
             type=int,
             default=5,
-            help='Timeout for the HTTP call when no data is received.'
+            help='Timeout for the HTTP call when no data is received,\n' +
+                'and to connect.'
         )
         arg_parser.add_argument(
             '--graylog-http-timeout',
             type=int,
             default=10,
-            help='Timeout for the HTTP call. This is a hard limit.'
+            help='Timeout for the HTTP call. This is a hard limit for\n' +
+                'every attempt, if the call is retried.'
         )
         arg_parser.add_argument(
             '--graylog-http-max-retries',
@@ -278,6 +399,79 @@ class Consumer:
             default=None,
             help='Max attempts for HTTP requests.'
         )
+        arg_parser.add_argument(
+            '--graylog-http-batch-size',
+            type=int,
+            default=1,
+            help='Maximum number of messages sent in a single HTTP request,\n' +
+                'separated by newlines. Requires a GELF HTTP input with\n' +
+                'bulk receiving enabled. 1 disables batching.'
+        )
+        arg_parser.add_argument(
+            '--graylog-http-batch-bytes',
+            type=int,
+            default=1048576,
+            help='Send a batch of HTTP messages when it reaches this size\n' +
+                'in bytes.'
+        )
+        arg_parser.add_argument(
+            '--graylog-http-batch-age',
+            type=int,
+            default=1000,
+            help='Send a batch of HTTP messages when its oldest message\n' +
+                'waited this number of milliseconds.'
+        )
+        arg_parser.add_argument(
+            '--graylog-compression',
+            default='none',
+            help='Compress GELF messages sent via UDP and HTTP.\n' +
+                'Allowed values:\n' +
+                '    none:  Do not compress messages.\n' +
+                '    zlib:  zlib for UDP, gzip for HTTP.\n' +
+                '    gzip:  gzip for UDP and HTTP.'
+        )
+        arg_parser.add_argument(
+            '--graylog-compression-level',
+            type=int,
+            default=GELF_Compressor.DEFAULT_LEVEL,
+            help='Compression level, from 1 (fastest) to 9 (smallest).'
+        )
+        arg_parser.add_argument(
+            '--graylog-compression-threshold',
+            type=int,
+            default=GELF_Compressor.DEFAULT_THRESHOLD,
+            help='Messages (or HTTP batches) shorter than this number\n' +
+                'of bytes are sent uncompressed.'
+        )
+        arg_parser.add_argument(
+            '--sender-threads',
+            type=int,
+            default=0,
+            help='Number of threads that send messages to Graylog.\n' +
+                'Zero means that messages are sent by the thread that\n' +
+                'reads the sourcelog.'
+        )
+        arg_parser.add_argument(
+            '--send-queue-size',
+            type=int,
+            default=1000,
+            help='Maximum number of messages waiting for a sender thread.\n' +
+                'When the queue is full, reading the sourcelog pauses.'
+        )
+        arg_parser.add_argument(
+            '--runtime',
+            default='sync',
+            help='How sourcelogs are read and messages are sent.\n' +
+                'Allowed values:\n' +
+                '    sync:     Blocking reads, and --sender-threads\n' +
+                '              threads.\n' +
+                '    asyncio:  A single asyncio event loop. Up to\n' +
+                '              --send-queue-size messages are sent at\n' +
+                '              the same time. HTTP batches, the TCP\n' +
+                '              buffer, the catch-up mode and the Slow Log\n' +
+                '              backfill are not used. Cannot be used with\n' +
+                '              --limit, --offset.'
+        )
         # Advertised name of the local host.
         # Shortened as -n because -h is already taken
         arg_parser.add_argument(
@@ -285,6 +479,60 @@ class Consumer:
             '--hostname',
             help='Hostname as it will be sent to Graylog.'
         )
+        arg_parser.add_argument(
+            '--source-timezone',
+            default=None,
+            help='Timezone of the dates written in the sourcelog,\n' +
+                'for example UTC or Europe/Rome. Default: local timezone.'
+        )
+        arg_parser.add_argument(
+            '--gelf-field',
+            action='append',
+            default=[ ],
+            metavar='KEY=VALUE',
+            help='Custom field added to all GELF messages, for example\n' +
+                'environment=production. Can be specified multiple times.\n' +
+                'Fields with the same name sent by the consumer, like user,\n' +
+                'replace it in the messages that contain them.'
+        )
+        arg_parser.add_argument(
+            '--fingerprint',
+            default='native',
+            help='How Slow Log queries are fingerprinted. Allowed values:\n' +
+                '    native:          Built-in implementation.\n' +
+                '    pt-fingerprint:  A long-running pt-fingerprint process.\n' +
+                '                     In catch-up mode, several queries are sent\n' +
+                '                     before reading their fingerprints.'
+        )
+        arg_parser.add_argument(
+            '--pt-fingerprint-path',
+            default='./pt-fingerprint',
+            help='Path of pt-fingerprint, used with --fingerprint=pt-fingerprint.'
+        )
+        arg_parser.add_argument(
+            '--pt-fingerprint-timeout',
+            type=int,
+            default=1000,
+            help='Milliseconds to wait for pt-fingerprint to return a\n' +
+                'fingerprint. After this timeout pt-fingerprint is restarted\n' +
+                'and the query is fingerprinted by the native implementation.'
+        )
+        arg_parser.add_argument(
+            '--fingerprint-cache-size',
+            type=int,
+            default=1000,
+            help='Maximum number of query fingerprints kept in memory, to\n' +
+                'avoid fingerprinting the same Slow Log queries again.\n' +
+                'Zero disables the cache.'
+        )
+        arg_parser.add_argument(
+            '--multiline-max-size',
+            type=int,
+            default=Multiline_Assembler.DEFAULT_MAX_SIZE,
+            help='Maximum number of characters of continuation lines\n' +
+                'kept for an Error Log entry, like a stack trace. Further\n' +
+                'lines are dropped and counted in the truncated_lines field.'
+        )
         arg_parser.add_argument(
             '--eventlog-file',
             default=None,
@@ -299,12 +547,46 @@ class Consumer:
             help='Truncate the eventlog before starting. Useful if the\n' +
                 'sourcelog was replaced.'
         )
+        arg_parser.add_argument(
+            '--checkpoint-messages',
+            type=int,
+            default=Eventlog.DEFAULT_CHECKPOINT_MESSAGES,
+            help='Write the position of the last sent message in the\n' +
+                'Eventlog after this number of messages. After a crash,\n' +
+                'up to this number of messages are sent again.'
+        )
+        arg_parser.add_argument(
+            '--checkpoint-interval',
+            type=int,
+            default=int(Eventlog.DEFAULT_CHECKPOINT_INTERVAL * 1000),
+            help='Write the position of the last sent message in the\n' +
+                'Eventlog when the oldest message that is not written is\n' +
+                'older than this number of milliseconds.'
+        )
+        arg_parser.add_argument(
+            '--eventlog-sync',
+            default='none',
+            help='How to make Eventlog checkpoints durable. Allowed values:\n' +
+                '    none:       Leave it to the OS.\n' +
+                '    fsync:      Call fsync() after every checkpoint.\n' +
+                '    fdatasync:  Call fdatasync() after every checkpoint.'
+        )
         args = arg_parser.parse_args()
 
         # validate arguments
 
-        if args.log.find(Eventlog.FIELD_SEPARATOR) > -1:
-            abort(2, 'The sourcelog name and path cannot contain the character: "' + Eventlog.FIELD_SEPARATOR + '"')
+        source_configs = None
+        if args.config is None:
+            if args.log_type is None or args.log is None:
+                abort(2, '--log-type and --log are required, unless --config is specified')
+            if args.log.find(Eventlog.FIELD_SEPARATOR) > -1:
+                abort(2, 'The sourcelog name and path cannot contain the character: "' + Eventlog.FIELD_SEPARATOR + '"')
+        else:
+            if args.log_type is not None or args.log is not None:
+                abort(2, '--config cannot be used with --log-type or --log')
+            if args.limit > -1 or args.offset > -1:
+                abort(2, '--config cannot be used with --limit or --offset')
+            source_configs = self._read_config(args.config)
 
         if args.stop is not None:
             args.stop = args.stop.upper()
@@ -325,18 +607,88 @@ class Consumer:
         if args.graylog_http_max_retries is not None and args.graylog_http_max_retries < 0:
             abort(2, '--graylog-http-max-retries can only be a non-negative integer')
 
+        args.fingerprint = args.fingerprint.lower()
+        if args.fingerprint not in ('native', 'pt-fingerprint'):
+            abort(2, 'Invalid value for --fingerprint: ' + args.fingerprint)
+
+        if args.pt_fingerprint_timeout < 1:
+            abort(2, '--pt-fingerprint-timeout can only be a positive integer')
+
+        if args.graylog_http_batch_size < 1:
+            abort(2, '--graylog-http-batch-size can only be a positive integer')
+        if args.graylog_http_batch_bytes < 1:
+            abort(2, '--graylog-http-batch-bytes can only be a positive integer')
+        if args.graylog_http_batch_age < 0:
+            abort(2, '--graylog-http-batch-age can only be a non-negative integer')
+
+        if args.graylog_udp_chunk_size <= Graylog_Client_UDP.CHUNK_HEADER_LENGTH:
+            abort(2, '--graylog-udp-chunk-size must be greater than ' + str(Graylog_Client_UDP.CHUNK_HEADER_LENGTH))
+        args.graylog_compression = args.graylog_compression.lower()
+        if args.graylog_compression not in ('none', ) + GELF_Compressor.METHODS:
+            abort(2, 'Invalid value for --graylog-compression: ' + args.graylog_compression)
+        if args.graylog_compression_level < 1 or args.graylog_compression_level > 9:
+            abort(2, '--graylog-compression-level must be between 1 and 9')
+        if args.graylog_compression_threshold < 0:
+            abort(2, '--graylog-compression-threshold can only be a non-negative integer')
+        gelf_fields = { }
+        for gelf_field in args.gelf_field:
+            key, separator, value = gelf_field.partition('=')
+            if not separator or not self.re.fullmatch(r'[\w\.\-]+', key) or key == 'id':
+                abort(2, 'Invalid value for --gelf-field: ' + gelf_field)
+            gelf_fields[key] = value
+        args.tail_mode = args.tail_mode.lower()
+        if args.tail_mode not in ('auto', 'inotify', 'poll'):
+            abort(2, 'Invalid value for --tail-mode: ' + args.tail_mode)
+        if args.tail_mode == 'inotify' and not Inotify_Watcher.is_supported():
+            abort(2, '--tail-mode=inotify is not supported on this system')
+        if args.rate_limit_messages < 0:
+            abort(2, '--rate-limit-messages can only be a non-negative number')
+        if args.rate_limit_bytes < 0:
+            abort(2, '--rate-limit-bytes can only be a non-negative number')
+        if args.rate_limit_burst < 0:
+            abort(2, '--rate-limit-burst can only be a non-negative integer')
+        if args.message_wait < 0:
+            abort(2, '--message-wait can only be a non-negative integer')
+        if args.flush_idle < 0:
+            abort(2, '--flush-idle can only be a non-negative integer')
+        if args.catch_up_threshold < 0:
+            abort(2, '--catch-up-threshold can only be a non-negative integer')
+        if args.multiline_max_size < 1:
+            abort(2, '--multiline-max-size can only be a positive integer')
+        if args.checkpoint_messages < 1:
+            abort(2, '--checkpoint-messages can only be a positive integer')
+        if args.checkpoint_interval < 0:
+            abort(2, '--checkpoint-interval can only be a non-negative integer')
+        args.eventlog_sync = args.eventlog_sync.lower()
+        if args.eventlog_sync not in Eventlog.SYNC_METHODS:
+            abort(2, 'Invalid value for --eventlog-sync: ' + args.eventlog_sync)
+        if args.eventlog_sync == 'fdatasync' and not hasattr(self.os, 'fdatasync'):
+            abort(2, '--eventlog-sync=fdatasync is not supported on this system')
+        if args.backfill_processes < 0:
+            abort(2, '--backfill-processes can only be a non-negative integer')
+        if args.graylog_tcp_buffer_size < 1:
+            abort(2, '--graylog-tcp-buffer-size can only be a positive integer')
+        if args.sender_threads < 0:
+            abort(2, '--sender-threads can only be a non-negative integer')
+        if args.send_queue_size < 1:
+            abort(2, '--send-queue-size can only be a positive integer')
+        args.runtime = args.runtime.lower()
+        if args.runtime not in ('sync', 'asyncio'):
+            abort(2, 'Invalid value for --runtime: ' + args.runtime)
+        if args.runtime == 'asyncio' and (args.limit > -1 or args.offset > -1):
+            abort(2, '--runtime=asyncio cannot be used with --limit or --offset')
+
+        if args.fingerprint_cache_size < 0:
+            abort(2, '--fingerprint-cache-size can only be a non-negative integer')
+
         # copy arguments into object members
 
-        log_type = args.log_type.upper()
-        if log_type == 'ERROR' or log_type == 'ERRORLOG':
-            self._sourcelog_type = 'ERROR'
-        elif log_type == 'SLOW' or log_type == 'SLOWLOG':
-            self._sourcelog_type = 'SLOW'
-        else:
-            abort(2, 'Invalid value for --log-type')
-        del log_type
-        self._message_wait = args.message_wait
-        self._sourcelog_path = str(args.log)
+        if source_configs is None:
+            self._sourcelog_type = self._get_log_type(args.log_type)
+            if self._sourcelog_type is None:
+                abort(2, 'Invalid value for --log-type')
+            self._sourcelog_path = str(args.log)
+        self._set_rate_limits(args)
         self._sourcelog_limit = args.limit - 1
         self._sourcelog_offset = args.offset - 1
         # --limit implies a program stop
@@ -348,59 +700,207 @@ class Consumer:
             # default when --limit is absent
             self._stop = 'NEVER'
         self._eof_wait = args.eof_wait
+        self._catch_up_threshold = args.catch_up_threshold
         if args.force_run:
             self._force_run = True
         if args.label:
             self._label = args.label
+        elif args.config is not None:
+            self._label = self.os.path.basename(args.config)
         else:
             self._label = args.log_type
 
+        if source_configs is None:
+            # The sourcelog is consumed as the only source
+            source_configs = [ {
+                'name': self._label,
+                'type': self._sourcelog_type,
+                'log': self._sourcelog_path,
+                'eventlog': args.eventlog_file
+            } ]
+
+        # Graylog only accepts gzip over HTTP
+        compressor_udp = None
+        compressor_http = None
+        if args.graylog_compression != 'none':
+            compressor_udp = GELF_Compressor(
+                args.graylog_compression,
+                args.graylog_compression_level,
+                args.graylog_compression_threshold
+            )
+            compressor_http = GELF_Compressor(
+                'gzip',
+                args.graylog_compression_level,
+                args.graylog_compression_threshold
+            )
+
         # host and port information will only be stored in Graylog client
-        if args.graylog_port_udp:
+        if args.graylog_port_udp and args.runtime == 'sync':
             self._GRAYLOG['client_udp'] = Graylog_Client_UDP(
                 args.graylog_host,
-                args.graylog_port_udp
+                args.graylog_port_udp,
+                args.graylog_udp_chunk_size,
+                compressor_udp
             )
-        if args.graylog_port_tcp:
+        if args.graylog_port_tcp and args.runtime == 'sync':
             self._GRAYLOG['client_tcp'] = Graylog_Client_TCP(
                 args.graylog_host,
                 args.graylog_port_tcp,
-                args.graylog_tcp_timeout
+                args.graylog_tcp_timeout,
+                args.graylog_tcp_buffer_size
             )
-        if args.graylog_port_http:
+        if args.graylog_port_http and args.runtime == 'sync':
             self._GRAYLOG['client_http'] = Graylog_Client_HTTP(
                 args.graylog_host,
                 args.graylog_port_http,
                 args.graylog_http_timeout_idle,
                 args.graylog_http_timeout,
-                args.graylog_http_max_retries
+                args.graylog_http_max_retries,
+                batch_max_messages=args.graylog_http_batch_size,
+                batch_max_bytes=args.graylog_http_batch_bytes,
+                batch_max_age=args.graylog_http_batch_age / 1000,
+                compressor=compressor_http
             )
-
-        try:
-            self.log_handler = open(self._sourcelog_path, 'r')
-        except:
-            abort(2, 'Could not open sourcelog: ' + self._sourcelog_path)
+        if args.runtime == 'asyncio':
+            # Clients are opened by the event loop
+            self._async_clients = {
+                'udp': None,
+                'tcp': None,
+                'http': None
+            }
+            if args.graylog_port_udp:
+                self._async_clients['udp'] = Graylog_Client_Async_UDP(
+                    args.graylog_host,
+                    args.graylog_port_udp,
+                    args.graylog_udp_chunk_size,
+                    compressor_udp
+                )
+            if args.graylog_port_tcp:
+                self._async_clients['tcp'] = Graylog_Client_Async_TCP(
+                    args.graylog_host,
+                    args.graylog_port_tcp,
+                    args.graylog_tcp_timeout
+                )
+            if args.graylog_port_http:
+                self._async_clients['http'] = Graylog_Client_Async_HTTP(
+                    args.graylog_host,
+                    args.graylog_port_http,
+                    args.graylog_http_timeout_idle,
+                    args.graylog_http_timeout,
+                    3 if args.graylog_http_max_retries is None else args.graylog_http_max_retries,
+                    compressor=compressor_http
+                )
 
         if args.hostname:
             self._hostname = args.hostname
         else:
             self._hostname = self._get_hostname()
+        try:
+            timestamp_decoder = Timestamp_Decoder(args.source_timezone)
+        except Exception as e:
+            abort(2, str(e))
+        self._error_log_parser = Error_Log_Parser(timestamp_decoder)
+        self._multiline = Multiline_Assembler(args.multiline_max_size)
+        self._slow_log_parser = Slow_Log_Parser(timestamp_decoder)
+
+        self._gelf_template = GELF_Template(
+            self._GRAYLOG['GELF_version'],
+            self._hostname,
+            gelf_fields
+        )
+
+        self._error_log_formatter = Error_Log_Formatter(
+            self._gelf_template,
+            Registry.SHORT_MESSAGE_LENGTH
+        )
+
+        log_types = [ source_config['type'] for source_config in source_configs ]
+        if args.fingerprint == 'pt-fingerprint' and 'SLOW' in log_types:
+            try:
+                self._pt_fingerprint = PT_Fingerprint_Coprocess(
+                    self._fingerprinter,
+                    args.pt_fingerprint_path,
+                    args.pt_fingerprint_timeout / 1000
+                )
+            except Exception as e:
+                abort(3, str(e))
+            self._fingerprinter = self._pt_fingerprint
+        if args.fingerprint_cache_size > 0:
+            self._fingerprinter = Fingerprint_Cache(self._fingerprinter, args.fingerprint_cache_size)
+        self._slow_log_formatter = Slow_Log_Formatter(
+            self._gelf_template,
+            self._fingerprinter,
+            Registry.SHORT_MESSAGE_LENGTH
+        )
+
+        if args.fingerprint == 'native':
+            self._backfill_processes = args.backfill_processes
+        else:
+            self._backfill_processes = 0
+        self._backfill_settings = {
+            'timezone': args.source_timezone,
+            'gelf_version': self._GRAYLOG['GELF_version'],
+            'hostname': self._hostname,
+            'gelf_fields': gelf_fields,
+            'fingerprint_cache_size': args.fingerprint_cache_size,
+            'short_message_length': Registry.SHORT_MESSAGE_LENGTH,
+            'debug': Registry.DEBUG
+        }
 
         if args.eventlog_file is not None:
             self._event_log_options['path'] = args.eventlog_file
 
         if args.truncate_eventlog:
             self._event_log_options['truncate'] = True
+        self._event_log_options['checkpoint_messages'] = args.checkpoint_messages
+        self._event_log_options['checkpoint_interval'] = args.checkpoint_interval / 1000
+        self._event_log_options['sync'] = args.eventlog_sync
+
+        sender_threads = args.sender_threads
+        send_queue_size = args.send_queue_size
+        tail_mode = args.tail_mode
+        runtime = args.runtime
+        source_settings = {
+            'timestamp_decoder': timestamp_decoder,
+            'error_log_formatter': self._error_log_formatter,
+            'slow_log_formatter': self._slow_log_formatter,
+            'multiline_max_size': args.multiline_max_size,
+            'flush_idle': args.flush_idle / 1000,
+            'debug': Registry.DEBUG
+        }
 
         # cleanup the CLI parser
 
         del args
         del arg_parser
 
-        try:
-            self._eventlog = Eventlog(self._event_log_options, self._event_log_options['path'])
-        except Exception as e:
-            abort(3, str(e))
+        self._open_sources(source_configs, source_settings, tail_mode)
+
+        if runtime == 'asyncio':
+            self._async_runtime = Async_Runtime(
+                self._sources,
+                self._sourcelog_watcher,
+                self._async_clients,
+                self._log_source_coordinates,
+                {
+                    'follow': self._stop == 'NEVER',
+                    'eof_wait': self._eof_wait / 1000,
+                    'max_in_flight': send_queue_size,
+                    'message_rate_limit': self._message_rate_limit,
+                    'byte_rate_limit': self._byte_rate_limit,
+                    'debug': Registry.DEBUG,
+                    'on_rotate': self._rotate_eventlogs
+                }
+            )
+        else:
+            # Positions are (Log_Source, Source_Position) tuples
+            self._send_pipeline = Send_Pipeline(
+                self._send_message,
+                self._log_source_coordinates,
+                sender_threads,
+                send_queue_size,
+                commit_key=lambda position: position[0]
+            )
 
         # Note: we want to start handling signals before creating the lock file
         signal.signal(signal.SIGINT, self.handle_signal)
@@ -427,26 +927,193 @@ class Consumer:
         import socket
         return socket.gethostname()
 
-    def _get_current_position(self) -> str:
-        """ Get the position that we're currently reading """
-        return str(self.log_handler.tell())
+    def _get_log_type(self, log_type: str) -> Optional[str]:
+        """ Return the sourcelog type for a --log-type value,
+            or None if it's not valid.
+        """
+        log_type = log_type.upper()
+        if log_type == 'ERROR' or log_type == 'ERRORLOG':
+            return 'ERROR'
+        elif log_type == 'SLOW' or log_type == 'SLOWLOG':
+            return 'SLOW'
+        return None
+
+    def _read_config(self, config_path: str) -> list:
+        """ Return the sources listed in a --config file, as
+            dictionaries with these keys: name, type, log, eventlog.
+            Every section of the file is a source, for example:
+
+            [db1-error]
+            type = error
+            log = /var/log/mysql/db1-error.log
+            eventlog = /var/lib/mariadb-log-consumer/db1-error.log
+
+            Abort if the file is not valid.
+        """
+        import configparser
+        config = configparser.ConfigParser(interpolation=None)
+        try:
+            with open(config_path, 'r') as config_file:
+                config.read_file(config_file)
+        except (OSError, configparser.Error) as e:
+            abort(2, 'Could not read --config file: ' + str(e))
+
+        source_configs = [ ]
+        eventlog_paths = [ ]
+        for name in config.sections():
+            section = config[name]
+            log_type = self._get_log_type(section.get('type', ''))
+            if log_type is None:
+                abort(2, 'Invalid type for source [' + name + '] in ' + config_path)
+            for key in ('log', 'eventlog'):
+                if not section.get(key):
+                    abort(2, 'Missing ' + key + ' for source [' + name + '] in ' + config_path)
+            if section['log'].find(Eventlog.FIELD_SEPARATOR) > -1:
+                abort(2, 'The sourcelog name and path cannot contain the character: "' + Eventlog.FIELD_SEPARATOR + '"')
+            eventlog_path = self.os.path.abspath(section['eventlog'])
+            if eventlog_path in eventlog_paths:
+                abort(2, 'Sources cannot share an Eventlog: ' + eventlog_path)
+            eventlog_paths.append(eventlog_path)
+            source_configs.append({
+                'name': name,
+                'type': log_type,
+                'log': section['log'],
+                'eventlog': eventlog_path
+            })
+        if not source_configs:
+            abort(2, 'No sources in ' + config_path)
+        return source_configs
+
+    def _open_sources(self, source_configs: list, settings: dict, tail_mode: str) -> None:
+        """ Create a Log_Source and its Eventlog for every source
+            of the --config file, and watch them with inotify, unless
+            polling is used.
+        """
+        self._sources = [ ]
+        for source_config in source_configs:
+            options = dict(self._event_log_options, path=source_config['eventlog'])
+            try:
+                eventlog = Eventlog(options, source_config['eventlog'])
+            except Exception as e:
+                abort(3, str(e))
+            try:
+                source = Log_Source(
+                    source_config['name'],
+                    source_config['type'],
+                    source_config['log'],
+                    eventlog,
+                    settings
+                )
+            except Exception as e:
+                eventlog.close()
+                abort(2, str(e))
+            self._sources.append(source)
+
+        if self._stop != 'NEVER' or tail_mode == 'poll' or not Inotify_Watcher.is_supported():
+            return
+        try:
+            self._sourcelog_watcher = Inotify_Watcher()
+            for source in self._sources:
+                source.watch(self._sourcelog_watcher)
+        except Exception as e:
+            if tail_mode == 'inotify':
+                abort(3, str(e))
+            # Fall back to polling
+            for source in self._sources:
+                source.watch(None)
+            self._sourcelog_watcher.close()
+            self._sourcelog_watcher = None
+
+    def _get_eventlogs(self) -> list:
+        """ Return the Eventlogs of all the sources. """
+        if self._sources is None:
+            return [ ]
+        return [ source.get_eventlog() for source in self._sources ]
+
+    def _rotate_eventlogs(self) -> None:
+        """ Rotate the Eventlogs of all the sources. """
+        for eventlog in self._get_eventlogs():
+            eventlog.rotate()
+
+    def _checkpoint_eventlogs(self) -> None:
+        """ Write the checkpoints that are old enough.
+            A SIGHUP must not rotate an Eventlog while it's writing
+            a checkpoint.
+        """
+        self._disallow_interruptions()
+        for eventlog in self._get_eventlogs():
+            eventlog.checkpoint_if_old()
+        self._allow_interruptions()
 
-    def _log_coordinates(self) -> bool:
-        """ Log last consumed coordinates and return success """
+    def _log_source_coordinates(self, position: tuple, messages: int = 1) -> bool:
+        """ Log the coordinates of a source, and return success.
+            position is a (Log_Source, Source_Position) tuple.
+        """
+        source, source_position = position
         try:
-            self._sourcelog_last_position = self._get_current_position()
-            if not isinstance(self._eventlog, Eventlog):
-                return False
-            self._eventlog.append(self._get_current_position(), self._sourcelog_path)
+            source.get_eventlog().append(str(source_position.offset), source.get_path(), source_position.identity, messages)
             return True
         except Exception as e:
             return False
 
+    def _flush_clients(self, force: bool = False) -> None:
+        """ Send the messages queued by the Graylog clients.
+            Unless force is True, only send them if they are old enough.
+        """
+        if not self._GRAYLOG['client_tcp'] and not self._GRAYLOG['client_http']:
+            return
+        self._disallow_interruptions()
+        try:
+            if self._GRAYLOG['client_tcp']:
+                if force:
+                    self._GRAYLOG['client_tcp'].flush()
+                else:
+                    self._GRAYLOG['client_tcp'].write_pending()
+            if self._GRAYLOG['client_http']:
+                if force:
+                    self._GRAYLOG['client_http'].flush()
+                else:
+                    self._GRAYLOG['client_http'].flush_if_old()
+        except Exception as e:
+            # Messages remain queued, we'll retry later
+            if Registry.DEBUG['GELF_MESSAGES']:
+                print(str(e))
+        self._allow_interruptions()
+
     def cleanup(self, exit_program: bool = True) -> None:
         """ Do the cleanup and terminate program execution """
-        if isinstance(self._eventlog, Eventlog):
+        if isinstance(self._send_pipeline, Send_Pipeline):
+            self._send_pipeline.close()
+        for client in ('client_tcp', 'client_http'):
+            if self._GRAYLOG[client]:
+                try:
+                    self._GRAYLOG[client].flush()
+                except Exception as e:
+                    # The Eventlog was not updated, so the messages
+                    # will be sent again on restart
+                    pass
+        if self._GRAYLOG['client_udp']:
+            self._GRAYLOG['client_udp'].close()
+        if self._slow_log_backfill is not None:
+            self._slow_log_backfill.close()
+        if self._sources is not None:
+            for source in self._sources:
+                source.close()
+        if self._sourcelog_watcher is not None:
+            self._sourcelog_watcher.close()
+        if Registry.DEBUG['FINGERPRINT_CACHE'] and isinstance(self._fingerprinter, Fingerprint_Cache):
+            print('Fingerprint cache: ' + str(self._fingerprinter.get_stats()))
+        if self._pt_fingerprint is not None:
+            if Registry.DEBUG['FINGERPRINT_CACHE']:
+                print('pt-fingerprint: ' + str(self._pt_fingerprint.get_stats()))
+            self._pt_fingerprint.close()
+        if Registry.DEBUG['RATE_LIMIT'] and (self._message_rate_limit or self._byte_rate_limit):
+            print('Rate limit: ' + str(self._get_rate_limit_stats()))
+        for eventlog in self._get_eventlogs():
+            if Registry.DEBUG['CHECKPOINTS']:
+                print('Eventlog checkpoints: ' + str(eventlog.get_stats()))
             try:
-                self._eventlog.close()
+                eventlog.close()
             except Exception as e:
                 # If for some reason the file is already closed,
                 # ignore the anomaly
@@ -477,7 +1144,7 @@ class Consumer:
         """ Handle signals to avoid that the program is interrupted when it shouldn't be. """
         if self._can_be_interrupted:
             if signum == signal.SIGHUP:
-                self._eventlog.rotate()
+                self._rotate_eventlogs()
             else:
                 self.cleanup()
         else:
@@ -490,41 +1157,6 @@ class Consumer:
     ##  Consumer Loop
     ##  =============
 
-    def _get_next_word(self, line, offset=0, to_end=False):
-        """ Generic method to get the next word from a line, or None """
-        index = 0
-        word = ''
-        word_started = False
-
-        for char in line:
-            index += 1
-
-            # do nothing til we consume the offset
-            if index < offset:
-                continue
-
-            if char.isspace() and to_end == False:
-                # Space characters are separators, so
-                # ignore them before the word starts
-                # and end the loop if word was started.
-                # Also, ignore them if to_end==True, the loop
-                # will continue til the end of the line.
-                if word_started:
-                    break
-                else:
-                    continue
-
-            word_started = True
-            word += char
-
-        if to_end == True:
-            word = word.strip()
-
-        return {
-            "word": word,
-            "index": index
-        }
-
     def _disallow_interruptions(self):
         """ Prevent the program from being interrupted
             until _allow_interruptions() is called.
@@ -542,75 +1174,174 @@ class Consumer:
         if self._requests.was_requested('STOP'):
             self.cleanup()
         elif self._requests.was_requested('ROTATE'):
-            self._eventlog.rotate()
+            self._requests.reset('ROTATE')
+            self._rotate_eventlogs()
 
-    def _maybe_wait(self):
-        """ If _message_wait is specified, wait.
+    def _set_rate_limits(self, args) -> None:
+        """ Create the token buckets for the rate limit options.
+            A bucket holds at least one message or one byte, so with
+            no burst, messages are evenly spaced.
         """
-        if self._message_wait:
-                self.time.sleep(self._message_wait / 1000)
+        messages_per_second = args.rate_limit_messages
+        burst = args.rate_limit_burst / 1000
+        if not messages_per_second and args.message_wait > 0:
+            messages_per_second = 1000 / args.message_wait
+            burst = 0
+        if messages_per_second:
+            self._message_rate_limit = Token_Bucket(
+                messages_per_second,
+                max(messages_per_second * burst, 1)
+            )
+        if args.rate_limit_bytes:
+            self._byte_rate_limit = Token_Bucket(
+                args.rate_limit_bytes,
+                max(args.rate_limit_bytes * burst, 1)
+            )
 
-    def _process_message(self):
-        """ Send the message and log the coordinates.
-            Prevent the program to be interrupted just before sending
-            the message and release the protection after logging.
+    def _limit_rate(self, size: int) -> None:
+        """ Wait until a message of size bytes can be sent without
+            exceeding the rate limits.
+        """
+        waited = 0.0
+        if self._message_rate_limit:
+            waited = waited + self._message_rate_limit.acquire(1)
+        if self._byte_rate_limit:
+            waited = waited + self._byte_rate_limit.acquire(size)
+        throttled = waited > 0
+        if throttled != self._throttled:
+            self._throttled = throttled
+            if Registry.DEBUG['RATE_LIMIT']:
+                print('Rate limit: ' + ('throttling' if throttled else 'not throttling') + ', ' + str(self._get_rate_limit_stats()))
+
+    def _get_rate_limit_stats(self) -> dict:
+        """ Return the stats of the rate limit token buckets. """
+        stats = { }
+        if self._message_rate_limit:
+            stats['messages'] = self._message_rate_limit.get_stats()
+        if self._byte_rate_limit:
+            stats['bytes'] = self._byte_rate_limit.get_stats()
+        return stats
+
+    def _queue_message(self, message, position) -> None:
+        """ Queue a message for sending, with the position to log
+            after it is sent.
+            Prevent the program to be interrupted while the message is
+            queued, because the queue may be full and we may need to wait.
         """
-        message_string = self._message.to_string()
+        self._disallow_interruptions()
+        client_tcp = self._GRAYLOG['client_tcp']
+        if client_tcp and client_tcp.get_pressure() > self._TCP_HIGH_WATERMARK:
+            try:
+                client_tcp.flush()
+            except Exception as e:
+                # Graylog is not reachable. The message will
+                # fall back to HTTP, if possible
+                pass
+        self._send_pipeline.put(message, position)
+        self._allow_interruptions()
 
-        if Registry.DEBUG['GELF_MESSAGES']:
-            print(message_string)
+    def _send_message(self, message, on_sent):
+        """ Send a message to Graylog, trying UDP, TCP and HTTP in this
+            order. Call on_sent when the message is sent, or when no
+            client could send it. In that case the message is skipped,
+            so the Eventlog can move forward.
+            Called by the send pipeline, possibly in a sender thread.
+        """
+        if isinstance(message, bytes):
+            # Composed and serialized by the Slow Log backfill
+            message_bytes = message
+        else:
+            message_bytes = message.to_bytes()
 
-        self._disallow_interruptions()
+        self._limit_rate(len(message_bytes))
 
-        sent = False
+        if Registry.DEBUG['GELF_MESSAGES']:
+            print(message_bytes.decode('utf-8'))
 
         if self._GRAYLOG['client_udp']:
             try:
-                self._GRAYLOG['client_udp'].send(
-                    bytearray(message_string, 'us-ascii')
-                )
-                sent = True
+                self._GRAYLOG['client_udp'].send(message_bytes)
+                on_sent()
+                return
             except:
                 pass
-        
-        if sent == False and self._GRAYLOG['client_tcp']:
+
+        if self._GRAYLOG['client_tcp']:
             try:
-                self._GRAYLOG['client_tcp'].send(
-                    bytearray(message_string, 'us-ascii')
-                )
-                sent = True
+                # on_sent is called when the message is written
+                # to the socket, which may happen later
+                self._GRAYLOG['client_tcp'].send(message_bytes, on_sent)
+                return
             except:
                 pass
 
-        if sent == False and 'client_http' in self._GRAYLOG:
+        if self._GRAYLOG['client_http']:
             try:
-                self._GRAYLOG['client_http'].send(
-                    message_string
-                )
+                # on_sent is called when Graylog accepts the message,
+                # which may happen later if messages are sent in batches
+                self._GRAYLOG['client_http'].send(message_bytes, on_sent)
+                return
             except:
                 pass
 
-        self._message = None
-        self._log_coordinates()
+        on_sent()
 
-        self._allow_interruptions()
 
+    def _catch_up(self, source: Log_Source, process_scanner) -> None:
+        """ If a large part of the sourcelog is left to read, process
+            it with a Catch_Up_Scanner, calling
+            process_scanner(source, scanner). Then move the source
+            reader to the end of the scanned region, so the consuming
+            loop can follow the sourcelog.
+            --offset and --limit count lines, so they need the
+            line by line reading.
+        """
+        if self._catch_up_threshold == 0 or self._sourcelog_offset > -1 or self._sourcelog_limit > -1:
+            return
+        reader = source.get_reader()
+        start = reader.tell()
+        path = reader.get_path()
+        if self.os.path.getsize(path) - start < self._catch_up_threshold:
+            return
+        scanner = Catch_Up_Scanner(path, start)
+        try:
+            if Registry.DEBUG['LOG_PARSER']:
+                print('Catching up: ' + str(scanner.get_size()) + ' bytes')
+            process_scanner(source, scanner)
+        finally:
+            scanner.close()
+        reader.seek(scanner.get_end())
+
+    def _has_pending_messages(self) -> bool:
+        """ Return whether some messages were not sent yet,
+            or their position was not written in the Eventlog.
+        """
+        if self._send_pipeline.get_pending() > 0:
+            return True
+        for eventlog in self._get_eventlogs():
+            lag_messages, lag_seconds = eventlog.get_lag()
+            if lag_messages > 0:
+                return True
+        for client in ('client_tcp', 'client_http'):
+            if self._GRAYLOG[client] and self._GRAYLOG[client].has_pending():
+                return True
+        return False
 
     def _consuming_loop(self):
         """ Consumer's main loop, in which we read next lines if available, or wait for more lines to be written.
-            Calls a specific method based on _sourcelog_type.
+            Calls the sources loop, or the asyncio runtime.
         """
         if Registry.DEBUG['DODGE_EXCEPTIONS'] == True:
-            if self._sourcelog_type == 'ERROR':
-                self._error_log_consuming_loop()
+            if self._async_runtime is not None:
+                self._async_consuming_loop()
             else:
-                self._slow_log_consuming_loop()
+                self._sources_consuming_loop()
         else:
             try:
-                if self._sourcelog_type == 'ERROR':
-                    self._error_log_consuming_loop()
+                if self._async_runtime is not None:
+                    self._async_consuming_loop()
                 else:
-                    self._slow_log_consuming_loop()
+                    self._sources_consuming_loop()
             except Exception as x:
                 self.cleanup(False)
                 raise x
@@ -619,387 +1350,198 @@ class Consumer:
     ##  Error Log
     ##  =========
 
-    def _error_log_process_line(self, line):
-        """ Process a line from the Error Log, extract information, compose a GELF message if necessary """
-        well_formed = True
-
-        next_word = self._get_next_word(line)
-        date_part = next_word['word']
-
-        next_word = self._get_next_word(line, next_word['index'])
-        time_part = next_word['word']
-
-        # We need to support the following line formats.
-        # Format 1:
-        # 2019-11-01 16:10:48 0 [Note] WSREP: Read nil XID from storage engines, skipping position init
-        # Format 2:
-        # 201030 12:40:21 [ERROR] mysqld got signal 6 ;
-
-        # Assigning meaningful values to these variables will fail if
-        # no known format is detected
-        time_list = None
-        date_time = None
-        timestamp = None
-
-        try:
-            # First we'll try to get date and time, to find out if the row is well-formed.
-            # If it is not, it is a continuation of the previous line, so we merge it
-            # to its message.
-            # If it is, we can consider the previous line complete, so we send a GELF message
-            # (if a message is prepared; otherwise, it is the first line and we have nothing to send).
-
-            # Format 1
-            # We are doing this to zeropad the "hour" part.
-            # We could just zeropad time_part, but we want to be flexible in case we need to add
-            # a microsecond part.
-            time_list = time_part.split(':')
-            date_time = date_part + ' ' + time_list[0].zfill(2) + ':' + time_list[1].zfill(2) + ':' + time_list[2].zfill(2)
-
-            date_time = self.datetime.datetime.strptime(date_time, "%Y-%m-%d %H:%M:%S").timetuple()
-            timestamp = int(self.time.mktime(date_time))
-
-            next_word = self._get_next_word(line, next_word['index'])
-            thread = next_word['word']
-
-            next_word = self._get_next_word(line, next_word['index'])
-            level = next_word['word']
-
-            next_word = self._get_next_word(line, next_word['index'], True)
-            message = next_word['word']
-        except (ValueError, IndexError) as e:
-            try:
-                # Format 2
-                time_list = time_part.split(':')
-                date_time = date_part + ' ' + time_list[0].zfill(2) + ':' + time_list[1].zfill(2) + ':' + time_list[2].zfill(2)
-
-                date_time = self.datetime.datetime.strptime(date_time, "%y%m%d %H:%M:%S").timetuple()
-                timestamp = int(self.time.mktime(date_time))
-
-                next_word = self._get_next_word(line, next_word['index'])
-                level = next_word['word']
-
-                next_word = self._get_next_word(line, next_word['index'], True)
-                message = next_word['word']
-            except (ValueError, IndexError) as e:
-                # No known format was detected
-                well_formed = False
-                next_word = self._get_next_word(line, offset=0, to_end=True)
-                message = next_word['word']
-
-        del time_list
-        del date_time
-
-        if well_formed:
-            # A new message starts with this line.
-            # If it is not the first message (IE, a message was already composed)
-            # send the last composed message.
-            if self._message:
-                self._process_message()
-
-            # Start to compose the new message
-
-            short_message = level + ' ' + message[:Registry.SHORT_MESSAGE_LENGTH]
-
-            # to increase format changes resilience, remove brackets and make uppercase
-            level = level          \
-                .replace('[', '')  \
-                .replace(']', '')  \
-                .upper()
-
-            custom = {
-                "text": message
-            }
-
-            self._message = GELF_Message(
-                    Registry.DEBUG,
-                    self._GRAYLOG['GELF_version'],
-                    timestamp,
-                    self._hostname,
-                    short_message,
-                    level,
-                    custom
-                )
-
+    def _error_log_catch_up(self, source: Log_Source, scanner: Catch_Up_Scanner) -> None:
+        """ Process the Error Log entries found by the catch-up mode.
+            The first line of an entry is parsed, and the following
+            lines are its continuation lines. Messages are sent
+            immediately because the entries are complete.
+        """
+        for start, end in scanner.get_entries(Catch_Up_Scanner.ERROR_LOG_ENTRY_START):
+            first_line = scanner.get_first_line(start, end)
             if Registry.DEBUG['LOG_LINES']:
-                print(line)
-            if Registry.DEBUG['LOG_PARSER']:
-                print(str(next_word))
-
-        # Not well-formed. Append the line to the existing message
-        # _text property.
-        else:
+                print(first_line)
+            record = self._error_log_parser.parse(first_line)
+            if record is None:
+                # Lines that precede the first entry are dropped
+                continue
             if Registry.DEBUG['LOG_PARSER']:
-                print('Processing multiline message')
-            #self._message.append_to_field(True, 'text', message)
-
-    def _get_source_line(self, is_first=False):
-        """ Return processed next line from the sourcelog.
-        """
-        if not is_first:
-            self._maybe_wait()
-        return self.log_handler.readline().rstrip()
-
-    def _error_log_consuming_loop(self):
-        """ Consumer's main loop for the Error Log """
-
-        # if an offset was read from the Eventlog on start,
-        # skip to the offset
-        if self._eventlog.get_offset():
-            self.log_handler.seek(self._eventlog.get_offset())
-
-        first_line=True
-        while True:
-            source_line = self._get_source_line(is_first=first_line)
-            first_line=False
-            while source_line:
-                # if _sourcelog_offset is not negative, skip this line,
-                # read the next and decrement
-                if self._sourcelog_offset > -1:
-                    self._sourcelog_offset = self._sourcelog_offset - 1
-                    source_line = self._get_source_line()
-                    continue
-
-                self._error_log_process_line(source_line)
-                source_line = self._get_source_line()
-
-                # enforce --limit if it is > -1
-                if self._sourcelog_limit == 0:
-                    break
-                elif self._sourcelog_limit > 0:
-                    self._sourcelog_limit = self._sourcelog_limit - 1
-
-            if self._message:
-                self._process_message()
-
-            # We reached sourcelog EOF.
-            # Depening on _stop, we exit the loop (and then the program)
-            # or we wait a given interval and repeat the loop.
-            if self._stop == 'LIMIT' or self._stop == 'EOF':
-                break
-            if self._eof_wait > 0:
-                self.time.sleep(self._eof_wait / 1000)
-
-        self.cleanup()
+                print(str(record))
+            message = self._error_log_formatter.format(record, Registry.DEBUG)
+            self._multiline.start()
+            # Most entries have a single line, and are not decoded again
+            if end - start > len(first_line) + 1:
+                for line in scanner.get_lines(start, end)[1:]:
+                    self._multiline.append(line.rstrip())
+            self._error_log_formatter.add_continuation(message, self._multiline)
+            self._multiline.reset()
+            self._queue_source_message(source, message, source.get_position(end))
 
 
     ##  Slow Log
     ##  ========
 
-    #  The parser has the following states:
-    #  None:    Initial file headers
-    #  META:    Metrics about the query that is written next
-    #  SQL:     Query text
-
-    def _slow_log_parser_init(self):
-        """ Initialise _sourcelog_parser_state attributes.
-        """
-        # State of the previous line. It's useful to find out
-        # when the new line has a different type
-        # (so, for example, a new query is starting here).
-        # See the parser states explanation above.
-        self._sourcelog_parser_state['prev_line_type'] = None
-        # Text of the query we are reading.
-        # Includes the "fake" statements generated for the
-        # Slow Log.
-        self._sourcelog_parser_state['query_text'] = None
-        # Number of the current query line, starting from 1.
-        self._sourcelog_parser_state['query_line'] = None
-
-    def _slow_log_query_text_unset(self):
-        """ Empty query_text and reset query_line attributes.
-        """
-        self._sourcelog_parser_state['query_text'] = ''
-        self._sourcelog_parser_state['query_line'] = 0
-
-    def _slow_log_query_text_set(self, line):
-        """ Assign a new value to query_text attribute,
-            set query_line to 1.
+    def _slow_log_catch_up(self, source: Log_Source, scanner: Catch_Up_Scanner) -> None:
+        """ Process the Slow Log entries found by the catch-up mode.
+            If --backfill-processes is set, they are parsed and
+            fingerprinted by a Slow_Log_Backfill. Otherwise they are
+            parsed here, and their queries are fingerprinted in
+            batches of _FINGERPRINT_BATCH_SIZE entries.
         """
-        self._sourcelog_parser_state['query_text'] = line
-        self._sourcelog_parser_state['query_line'] = 1
-
-    def _slow_log_query_text_append(self, line):
-        """ Append a string to query_text attribute,
-            increment query_line.
-        """
-        self._sourcelog_parser_state['query_text'] = self._sourcelog_parser_state['query_text'] + "\n" + line
-        self._sourcelog_parser_state['query_line'] = self._sourcelog_parser_state['query_line'] + 1
+        if self._backfill_processes > 0:
+            settings = dict(self._backfill_settings, path=scanner.get_path())
+            self._slow_log_backfill = Slow_Log_Backfill(self._backfill_processes, settings)
+            ranges = scanner.get_ranges(Catch_Up_Scanner.SLOW_LOG_ENTRY_START, Slow_Log_Backfill.RANGE_SIZE)
+            for messages in self._slow_log_backfill.process(ranges):
+                for message, position in messages:
+                    self._queue_source_message(source, message, source.get_position(position))
+            self._slow_log_backfill.close()
+            self._slow_log_backfill = None
+            return
 
-    def _slow_log_query_text_skip(self):
-        """ Skip an SQL line.
-            To do so, increment query_line without changing query_text.
+        # (entry, offset) tuples, formatted together
+        batch = [ ]
+        for start, end in scanner.get_entries(Catch_Up_Scanner.SLOW_LOG_ENTRY_START):
+            for line in scanner.get_lines(start, end):
+                if Registry.DEBUG['LOG_LINES']:
+                    print(line)
+                entry = self._slow_log_parser.feed(line)
+                if entry is not None:
+                    # The entry ends where this one starts
+                    batch.append((entry, start))
+            entry = self._slow_log_parser.flush()
+            if entry is not None:
+                batch.append((entry, end))
+            if len(batch) >= self._FINGERPRINT_BATCH_SIZE:
+                self._slow_log_queue_entries(source, batch)
+                batch = [ ]
+        self._slow_log_queue_entries(source, batch)
+
+    def _slow_log_queue_entries(self, source: Log_Source, batch: list) -> None:
+        """ Compose the GELF messages for a list of (entry, offset)
+            tuples found by the catch-up mode, and queue them. Every
+            entry ends at its offset.
+            The queries are fingerprinted together, so pt-fingerprint
+            receives several queries before its results are read.
         """
-        self._sourcelog_parser_state['query_line'] = self._sourcelog_parser_state['query_line'] + 1
+        if not batch:
+            return
+        entries = [ entry for entry, offset in batch ]
+        if Registry.DEBUG['LOG_PARSER']:
+            for entry in entries:
+                print(str(entry))
+        messages = self._slow_log_formatter.format_many(entries, Registry.DEBUG)
+        for message, (entry, offset) in zip(messages, batch):
+            self._queue_source_message(source, message, source.get_position(offset))
 
-    def _is_metadata_first_line(self, line):
-        """ Return wether the passed line seems to be the first line
-            of a metadata section.
-        """
-        return (line[1:7] == ' Time:')
 
-    def _meybe_meta_line(self, line):
-        """ From the first characters, it looks like a line with metrics
-            about a query.
-        """
-        return (line[0:2] == '# ')
+    ##  Sources
+    ##  =======
 
-    def _capitalize_first_word(self, phrase: str) -> str:
-        """ Return the input string with the first word in uppercase.
-            Assume that words are separated by spaces and there are
-            no trailing spaces.
-        """
-        first_word: str = ''
-        i: int = 0
-        for char in phrase:
-            if char == ' ':
-                break;
-            i = i + 1
-            first_word = first_word + char.upper()
-        return first_word + phrase[i:]
-
-    def _slow_log_process_entry(self):
-        """ Supposed to be called when a Slow Log entry is complete.
-            Fingerprint the query, compose a GELF message, and send it.
+    def _queue_source_message(self, source: Log_Source, message, position: Source_Position) -> None:
+        """ Queue a message read from a source. """
+        self._queue_message(message, (source, position))
+
+    def _wait_for_sources(self) -> list:
+        """ Wait until some sources may have new contents, and return
+            them.
+            With inotify, the sources that changed are returned. Every
+            --eof-wait milliseconds all sources are returned, if a
+            sourcelog is missing or messages must be sent; otherwise,
+            every _INOTIFY_IDLE_WAIT seconds. Without inotify, all
+            sources are returned every --eof-wait milliseconds.
+            Sources with an Error Log entry that must be sent are
+            returned when it's time to send it.
         """
-        import subprocess
-        parametrized_query = subprocess.getoutput('./pt-fingerprint --query "' + self._sourcelog_parser_state['query_text'] + '"')
-        parametrized_query = self._capitalize_first_word(parametrized_query)
-        self._slow_log_query_text_set(
-            parametrized_query
-        )
-        print(self._sourcelog_parser_state['query_text'])
-        self._reset_metrics()
-
-    def _slow_log_process_sql_line(self, line):
-        """ Process a line of an SQL section.
-            Skip the artificially prepended "USE" and "SET timestamp"
-            commands. Those commands are written into the slow log to make
-            the query deterministic, but are not run by the user and don't
-            only contain information that can be found in the meta section.
-        """
-        # Note that the line number has not incremented yet
-        if (
-                self._sourcelog_parser_state['query_line'] == 0
-                and line[0:4] == 'use '
-            ):
-            self._slow_log_query_text_skip()
-        elif (
-                self._sourcelog_parser_state['query_line'] == 1
-                and line[0:14] == 'SET timestamp='
-            ):
-            # We get the timestamp from here because it's in the
-            # format we need
-            self._metrics['timestamp'] = int(line[14:len(line) - 1])
-            self._slow_log_query_text_skip()
+        timeout = self._INOTIFY_IDLE_WAIT
+        if self._sourcelog_watcher is None or self._has_pending_messages():
+            timeout = max(self._eof_wait, 0) / 1000
+        for source in self._sources:
+            if source.is_missing():
+                # Events about the old file don't tell us when the new
+                # file is created
+                timeout = max(self._eof_wait, 0) / 1000
+        full_timeout = timeout
+        for source in self._sources:
+            flush_wait = source.get_flush_wait()
+            if flush_wait is not None:
+                timeout = max(min(timeout, flush_wait), 0)
+
+        if self._sourcelog_watcher is None:
+            if timeout > 0:
+                self.time.sleep(timeout)
+            if timeout >= full_timeout:
+                return self._sources
+            events = { }
         else:
-            self._slow_log_query_text_append(line)
-
-    def _slow_log_process_log_line(self, line):
-        """ Process a line from the Slow Log, extract information,
-            compose a GELF message if we reached the beginning of a new entry.
+            events = self._sourcelog_watcher.wait_for_events(timeout)
+            if not events and timeout >= full_timeout:
+                return self._sources
+
+        ready = [ ]
+        for source in self._sources:
+            flush_wait = source.get_flush_wait()
+            if source.get_watch() in events or (flush_wait is not None and flush_wait <= 0):
+                ready.append(source)
+        return ready
+
+    def _consume_source(self, source: Log_Source, follow: bool) -> None:
+        """ Read the new lines of a source and queue its messages.
+            The first --offset lines are skipped. If --limit is set,
+            we don't follow the sourcelog: after --limit lines, the
+            last entry is sent.
         """
-        if not line:
-            return
-
-        # Wether this line seems to start a new entry
-        # (a new query metadata)
-        is_new_entry = False
-        # The type of contents of this line
-        line_type = None
-
-        # This block serves as easily readable documentation,
-        # so let's toleate verbosity.
-        if self._meybe_meta_line(line):
-            # most probably metadata (could be an SQL comment tho)
-            if self._sourcelog_parser_state['prev_line_type'] is None:
-                if self._is_metadata_first_line(line):
-                    # first metadata in this file
-                    is_new_entry = True
-                    line_type = 'META'
-                else:
-                    # not metadata. it's an SQL comment line
-                    line_type = 'SQL'
-            elif self._sourcelog_parser_state['prev_line_type'] == 'META':
-                # continuing metadata section
-                line_type = 'META'
-            elif self._sourcelog_parser_state['prev_line_type'] == 'SQL':
-                # most probably metadata (could be an SQL comment tho)
-                if self._is_metadata_first_line(line):
-                    # beginning metadata section
-                    is_new_entry = True
-                    line_type = 'META'
-                else:
-                    # not metadata. it's an SQL comment line
-                    line_type = 'SQL'
-        else:
-            # not metadata, nor a comment line.
-            # could be file headers or SQL
-            if self._sourcelog_parser_state['prev_line_type'] is None:
-                # headers (first line or not)
-                line_type = None
-            elif self._sourcelog_parser_state['prev_line_type'] == 'META':
-                # beginning SQL section
-                line_type = 'SQL'
-            elif self._sourcelog_parser_state['prev_line_type'] == 'SQL':
-                # continuing SQL section
-                line_type = 'SQL'
-
-        if is_new_entry:
-            if self._sourcelog_parser_state['query_line']:
-                self._slow_log_process_entry()
-            self._slow_log_query_text_unset()
-        elif line_type == 'SQL':
-            self._slow_log_process_sql_line(line)
-
-        self._sourcelog_parser_state['prev_line_type'] = line_type
-
-    def _reset_metrics(self):
-        """ Set all metrics dictionary to None, without knowing the
-            exact list of metrics.
+        put = lambda message, position: self._queue_source_message(source, message, position)
+        if self._sourcelog_offset > -1:
+            self._sourcelog_offset = self._sourcelog_offset - source.skip_lines(self._sourcelog_offset + 1, follow)
+            if self._sourcelog_offset > -1:
+                return
+        if self._sourcelog_limit < 0:
+            source.consume(put, follow)
+        elif source.consume(put, follow, self._sourcelog_limit + 1):
+            source.flush(put)
+
+    def _sources_consuming_loop(self):
+        """ Consumer's main loop with --runtime=sync.
+            All the sources are read until their end, then only the
+            sources that may have new contents are read again.
+            A sourcelog specified with --log is read with the catch-up
+            mode first, if it's big enough.
         """
-        for key in self._metrics:
-            self._metrics[key] = None
+        for source in self._sources:
+            source.resume()
+        if self._sourcelog_type == 'ERROR':
+            self._catch_up(self._sources[0], self._error_log_catch_up)
+        elif self._sourcelog_type == 'SLOW':
+            self._catch_up(self._sources[0], self._slow_log_catch_up)
+
+        follow = self._stop == 'NEVER'
+        ready = self._sources
+        while True:
+            for source in ready:
+                self._consume_source(source, follow)
 
-    def _slow_log_consuming_loop(self):
-        """ Consumer's main loop for the Slow log """
+            if not follow:
+                self._flush_clients(force=True)
+                break
+            self._flush_clients()
+            self._checkpoint_eventlogs()
+            ready = self._wait_for_sources()
 
-        first_line=True
-        self._slow_log_parser_init()
-        while True:
-            source_line = self._get_source_line(is_first=first_line)
-            first_line=False
-            try:
-                while True:
-                    # if _sourcelog_offset is not negative, skip this line,
-                    # read the next and decrement
-                    if self._sourcelog_offset > -1:
-                        self._sourcelog_offset = self._sourcelog_offset - 1
-                        source_line = self._get_source_line()
-                        continue
-
-                    self._slow_log_process_log_line(source_line)
-                    source_line = self._get_source_line()
-
-                    # enforce --limit if it is > -1
-                    if self._sourcelog_limit == 0:
-                        break
-                    elif self._sourcelog_limit > 0:
-                        self._sourcelog_limit = self._sourcelog_limit - 1
-
-            except EOFError as e:
-                pass
+        self.cleanup()
 
-            if self._message:
-                self._process_message()
 
-            # We reached sourcelog EOF.
-            # Depening on _stop, we exit the loop (and then the program)
-            # or we wait a given interval and repeat the loop.
-            if self._stop == 'LIMIT' or self._stop == 'EOF':
-                break
-            if self._eof_wait > 0:
-                self.time.sleep(self._eof_wait / 1000)
+    ##  asyncio Runtime
+    ##  ===============
 
+    def _async_consuming_loop(self):
+        """ Consume the sources with the asyncio runtime, which handles
+            the signals until it returns.
+        """
+        self._async_runtime.run()
+        # The event loop restored the default handlers
+        signal.signal(signal.SIGINT, self.handle_signal)
+        signal.signal(signal.SIGTERM, self.handle_signal)
+        signal.signal(signal.SIGHUP, self.handle_signal)
         self.cleanup()
 
 
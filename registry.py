@@ -41,7 +41,15 @@ class Registry:
         # Print read log lines
         'LOG_LINES': False,
         # Print info about parsed log lines
-        'LOG_PARSER': False
+        'LOG_PARSER': False,
+        # Print the fingerprint cache size, hits, misses and evictions
+        # on exit, and pt-fingerprint restarts if it is used
+        'FINGERPRINT_CACHE': False,
+        # Print the number of Eventlog checkpoints and their lag on exit
+        'CHECKPOINTS': False,
+        # Print the fill level of the rate limits when throttling starts
+        # or stops, and the time spent waiting on exit
+        'RATE_LIMIT': False
     }
 
 